@@ -1,9 +1,94 @@
-from PyQt5 import QtGui
-
+import array
+import functools
+import itertools
 import math
+import mmap
+import operator
 import os
 import random
+import struct
 import sys
+import time
+
+import CGOL_Engines
+import CGOL_History
+import CGOL_Patterns
+import CGOL_Render
+import CGOL_Stats
+
+# The default memory budget for the history of a CGOL_grid, in bytes. The grid keeps as many frames as fit.
+HISTORY_BUDGET = 4 * 1024 * 1024
+
+# However small the budget, at least this many frames are kept. Stepping reads the current frame while writing the one after it, and one more leaves something to rewind to.
+MIN_DEPTH = 3
+
+# The generation of a frame in the history ring that has never been written to. dec_current() doesn't rewind onto such frames.
+UNWRITTEN = CGOL_History.UNWRITTEN
+
+# Counts the set bits of an integer. int.bit_count() is only available from Python 3.10.
+popcount = int.bit_count if hasattr(int, "bit_count") else lambda n: bin(n).count("1")
+
+# When a grid outgrows the storage of its history ring, the storage is reallocated with this many times the room, up to the largest grid allowed. See CGOL_grid.reserve()
+STORAGE_GROWTH = 1.5
+MAX_SIZE = 512
+
+# A resize that has to touch every frame does so this many bytes of storage at a time, to bound the memory it needs.
+RESIZE_CHUNK = 1024 * 1024
+
+# The fraction of cells that randomize() brings to life by default, and the number of binary places of a density that are honoured. See random_bits()
+RANDOM_DENSITY = 1 / 3
+DENSITY_BITS = 16
+
+# Snapshots hold the whole state of a grid in a binary file. See CGOL_grid.save_snapshot()
+# The header is the magic, the format version, flags, width, height, depth, current, latest, history budget and the offset of the frames.
+SNAPSHOT_MAGIC = b"CGOLSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sIIIIIIIQQ")
+
+# Flags in the snapshot header.
+SNAPSHOT_PERIODIC = 1
+SNAPSHOT_UNBOUNDED = 2
+
+# The frames of a snapshot start on a multiple of this many bytes, which suits mmap on every platform, so they can be mapped straight from the file.
+SNAPSHOT_ALIGNMENT = 65536
+
+# Returns an integer of n random bits drawn from rng, each set with the given probability.
+# Each binary place of the density costs one draw of n bits. Working up from the last place, a 1 ORs the draw in and a 0 ANDs it in, which halves the probability so far and adds the place to it.
+def random_bits(n, density, rng=random):
+	places = round(min(max(density, 0), 1) * (1 << DENSITY_BITS))
+	
+	if n <= 0 or places == 0:
+		return 0
+	
+	if places >> DENSITY_BITS:
+		return (1 << n) - 1
+	
+	# Trailing zeros would only AND into nothing.
+	bits = 0
+	for i in range((places & -places).bit_length() - 1, DENSITY_BITS):
+		draw = rng.getrandbits(n)
+		bits = bits | draw if places >> i & 1 else bits & draw
+	
+	return bits
+
+# Returns a hash of column x of a frame, given as an integer. Frame hashes combine these with XOR.
+# The column is hashed as bytes, with SipHash. Integers would be reduced modulo 2^61-1, so a board and the same board shifted by 61 rows would collide.
+def column_hash(x, column):
+	return hash((x, column.to_bytes((column.bit_length() + 7) // 8, "little")))
+
+# Returns a hash of a live cell of an unbounded grid. See column_hash()
+def cell_hash(cell):
+	return hash(struct.pack("<qq", *cell))
+
+# Returns a copy of data, which holds columns of col_bytes each, with every column cut or padded with zeros to new_col_bytes.
+def repad_columns(data, col_bytes, new_col_bytes):
+	padded = bytearray(len(data) // col_bytes * new_col_bytes)
+	
+	# One strided copy for each byte of a column
+	for i in range(min(col_bytes, new_col_bytes)):
+		padded[i::new_col_bytes] = data[i::col_bytes]
+	
+	return padded
 
 class camera:
 	def __init__(self, x, y, s):
@@ -11,16 +96,23 @@ class camera:
 		self.y = y
 		self.s = s
 
+# Stands in for CGOL_Window when simulating without a GUI. The engines only ever use is_halting.
+class headless_window:
+	def __init__(self):
+		# Set to True to halt an ongoing simulation. The simulation will set it back to False
+		self.is_halting = False
+
 class CGOL_grid:
-	def __init__(self, width, height, history):
-		# This hard-coded constant gives the number of cgols frames that can be stored in each grid.
-		# It can be adjusted and the program benchmarked for speed and memory usage.
-		# For memory usage, it should pretty much always be a multiple of 30 because of how Python integers work.
-		self.BIT_WIDTH = 30
-		
+	# Whether cells exist beyond the width and height of the grid. See CGOL_sparse_grid.
+	is_unbounded = False
+	
+	def __init__(self, width, height, budget=None, engine=None):
 		self.width = width
 		self.height = height
 		
+		# The number of bytes the history may take up. It can be benchmarked for speed and memory usage with benchmark.py --suite --history-budget N
+		self.budget = HISTORY_BUDGET if budget is None else budget
+		
 		# If True, the mainloop should step the simulation once.
 		self.step_queued = False
 		
@@ -30,12 +122,72 @@ class CGOL_grid:
 		# If true, the mainloop will place the currently loaded pattern at the next opportunity.
 		self.place_queued = None
 		
+		# If set to a generation, the mainloop will fast-forward the simulation to it at the next opportunity. See fast_forward()
+		self.fast_forward_queued = None
+		
+		# If set to a number of generations, the mainloop will run that many steps at the next opportunity.
+		self.step_n_queued = None
+		
+		# If set to a generation, the mainloop will go to it at the next opportunity. See seek()
+		self.seek_queued = None
+		
+		# If set to the name of an engine, the mainloop will switch to it at the next opportunity. See set_engine()
+		self.engine_queued = None
+		
+		# While step_n() is running, this is (generations done, generations requested). Otherwise None.
+		self.progress = None
+		
 		# If true, the user has opened a pattern file and is placing the pattern currently.
 		self.is_placing = False
 		
 		# If set to true, a new frame has been generated and the GUI should advance one step.
 		self.frame_ready = False
 		
+		# If set to true, the grid has changed and the mainloop should render it.
+		self.render_queued = False
+		
+		# Incremented whenever the grid is modified by anything other than the engine, so engines know to discard any cached state.
+		self.revision = 0
+		
+		# Incremented whenever a new frame is written into the history ring by step(), step_n() or fast_forward().
+		# The renderer compares it between renders to tell whether the frame it last drew may since have been overwritten.
+		self.frames_written = 0
+		
+		# Maps each frame index in the history ring to (revision, columns), where columns is the set of columns that the engine reported as differing from the frame before, or None if it didn't say.
+		# The revision is the grid's revision when the frame was written. Records from an older revision may not describe the frames as they are now.
+		self.frame_changes = {}
+		
+		# Maps each frame index in the history ring to (population, box), its number of live cells and the (left, top, right, bottom) of the smallest rectangle holding them, with right and bottom exclusive, or None if there are none.
+		# Kept up to date by everything that writes to a frame. A frame with no entry is measured when it's next asked about. See get_population() and bounding_box()
+		self.frame_stats = {}
+		
+		# Maps each frame index in the history ring to (revision, hash) of the frame's cells, recorded at the given revision of the grid. See get_hash()
+		self.hashes = {}
+		
+		# Watches the hashes of the frames that are stepped into for a board that repeats.
+		self.cycles = CGOL_History.cycle_detector()
+		
+		# If set to true, a step has found that the board repeats, and the GUI may pause playback.
+		self.cycle_found = False
+		
+		# The engine used to generate each step. See CGOL_Engines.py
+		self.engine = CGOL_Engines.create_engine(engine)
+		
+		# Timings and counts for the performance overlay. Disabled by default. See CGOL_Stats.py
+		self.stats = CGOL_Stats.instrumentation()
+		
+		# When the stats are enabled, the time at which the last frame became ready, for measuring how long it waits to be shown.
+		self.frame_ready_time = None
+		
+		# Draws each frame. If None, render_cells() is used, which draws each live cell individually. See CGOL_Render.py
+		self.renderer = CGOL_Render.image_renderer()
+		
+		# The HashLife engine used to fast-forward. Created on first use and kept so that its cache carries over between fast-forwards.
+		self.hashlife = None
+		
+		# Keeps the frames that fall out of the history ring as deltas, so they can still be rewound to, or None. See set_long_history()
+		self.long_history = None
+		
 		# Stores patterns that are opened for writing to the grid.
 		self.pattern = None
 		
@@ -43,24 +195,398 @@ class CGOL_grid:
 		self.history = []
 		self.history_cur = 0
 		
-		# Holds all of the grids currently in use.
-		self.grids = []
-		for h in range(history):
-			self.grids.append([])
-			
-			for x in range(width):
-				self.grids[h].append([])
-				
-				for y in range(height):
-					self.grids[h][x].append(0)
+		# The history ring. Holds depth frames one after another, each frame_stride long. The grid's columns start origin bytes into each, and take up frame_bytes.
+		# Each frame holds its columns one after another, each col_bytes long, with one bit per cell: cell y of a column is bit y % 8 of byte y // 8.
+		# So reading a column with int.from_bytes(..., "little") gives an integer with bit y set if cell y is alive. See get_column()
+		# Every bit outside the grid is 0. The room around it lets resize() add rows and columns without moving any frames. See reserve()
+		self.col_bytes, self.frame_bytes, self.depth = self.layout(width, height)
+		self.frame_stride = self.frame_bytes
+		self.origin = 0
+		self.frames = bytearray(self.depth * self.frame_stride)
 		
-		# Points to the grid that should be used to generate the next step.
-		# THIS DOES NOT SIMPLY INDEX THE GRIDS ARRAY.
-		# self.latest % len(grids) is the grid that should be used. self.latest // len(grids) is how many times the indexed grid should be rshifted before use.
+		# The frame that should be used to generate the next step. Frames are numbered by their place in the ring, from 0 to depth-1.
 		self.latest = 0
 		
-		# Points to the grid that is currently being rendered. This is used the same way as self.latest.
+		# The frame that is currently being rendered.
 		self.current = 0
+		
+		# The generation of each frame in the history ring, counted from the last randomize() or clear(), or UNWRITTEN.
+		self.generations = [UNWRITTEN] * self.depth
+		self.generations[self.current] = 0
+		
+		# Snapshots of every so many generations, for seek().
+		self.checkpoints = CGOL_History.checkpoint_store()
+	
+	# Returns the (col_bytes, frame_bytes, depth) of a history ring for a grid of the given size that fits in the budget.
+	def layout(self, width, height):
+		col_bytes = (height + 7) // 8
+		frame_bytes = width * col_bytes
+		
+		return col_bytes, frame_bytes, max(self.budget // max(frame_bytes, 1), MIN_DEPTH)
+	
+	# Returns the position in the storage of the first column of a frame.
+	def frame_offset(self, frame):
+		return frame * self.frame_stride + self.origin
+	
+	# Returns the slice of the storage that holds the columns of a frame.
+	def frame_slice(self, frame):
+		offset = frame * self.frame_stride + self.origin
+		
+		return slice(offset, offset + self.frame_bytes)
+	
+	# Read column x of a frame as an integer, with bit y set if cell y is alive.
+	def get_column(self, frame, x):
+		offset = self.frame_offset(frame) + x * self.col_bytes
+		
+		return int.from_bytes(self.frames[offset:offset + self.col_bytes], "little")
+	
+	def set_column(self, frame, x, column):
+		offset = self.frame_offset(frame) + x * self.col_bytes
+		
+		self.frames[offset:offset + self.col_bytes] = column.to_bytes(self.col_bytes, "little")
+	
+	# Read every column of a frame, as get_column() does.
+	def get_columns(self, frame):
+		data = self.frames[self.frame_slice(frame)]
+		
+		return [int.from_bytes(data[i:i + self.col_bytes], "little") for i in range(0, self.frame_bytes, self.col_bytes)]
+	
+	# Write columns into a frame, starting at column x0.
+	def set_columns(self, frame, columns, x0=0):
+		offset = self.frame_offset(frame) + x0 * self.col_bytes
+		
+		self.frames[offset:offset + len(columns) * self.col_bytes] = b"".join([c.to_bytes(self.col_bytes, "little") for c in columns])
+	
+	# Read rows y0 to y1 of column x of a frame, as bytes holding one cell each: 1 if alive and 0 if not.
+	def get_cells(self, frame, x, y0=0, y1=None):
+		if y1 is None:
+			y1 = self.height
+		
+		offset = self.frame_offset(frame) + x * self.col_bytes
+		
+		# Unpack whole bytes, then trim off the cells outside the range.
+		cells = b"".join(map(CGOL_Engines.BYTE_TO_CELLS.__getitem__, self.frames[offset + (y0 >> 3):offset + ((y1 + 7) >> 3)]))
+		
+		return cells[y0 & 7:(y0 & 7) + y1 - y0]
+	
+	# Write a whole column of a frame, given as bytes holding one cell each.
+	def set_cells(self, frame, x, cells):
+		self.set_column(frame, x, int(bytes(cells).translate(CGOL_Engines.CELLS_TO_DIGITS)[::-1], 2))
+	
+	# Read a whole frame as one integer, with the bit of cell (x, y) at x * col_bytes * 8 + y.
+	def get_frame_bits(self, frame):
+		return int.from_bytes(self.frames[self.frame_slice(frame)], "little")
+	
+	def set_frame_bits(self, frame, bits):
+		self.frames[self.frame_slice(frame)] = bits.to_bytes(self.frame_bytes, "little")
+	
+	# Returns the bits of the cells in columns x0 to x1 and rows y0 to y1, laid out as get_frame_bits() does.
+	def region_mask(self, x0, y0, x1, y1):
+		column = (((1 << (y1 - y0)) - 1) << y0).to_bytes(self.col_bytes, "little")
+		
+		return int.from_bytes(column * (x1 - x0), "little") << (x0 * self.col_bytes * 8)
+	
+	# Returns the part of the rectangle from (x0, y0) to (x1, y1) that lies on the grid, or None if none of it does.
+	def clip_region(self, x0, y0, x1, y1):
+		x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, self.width), min(y1, self.height)
+		
+		if x0 >= x1 or y0 >= y1:
+			return None
+		
+		return x0, y0, x1, y1
+	
+	# The region operations below each change the rectangle of a frame from (x0, y0) to (x1, y1), exclusive, in a handful of operations on whole frames or columns rather than a loop over its cells.
+	# They leave the generation of the frame alone, and forget its population and bounding box unless they can tell what they became.
+	
+	# Copy a region of frame src into the same region of frame dst.
+	def copy_region(self, src, dst, x0, y0, x1, y1):
+		region = self.clip_region(x0, y0, x1, y1)
+		if region is None:
+			return
+		
+		x0, y0, x1, y1 = region
+		
+		# Whole columns are one slice.
+		if y0 == 0 and y1 == self.height:
+			source = self.frame_offset(src)
+			target = self.frame_offset(dst)
+			
+			self.frames[target + x0 * self.col_bytes:target + x1 * self.col_bytes] = self.frames[source + x0 * self.col_bytes:source + x1 * self.col_bytes]
+		else:
+			mask = self.region_mask(x0, y0, x1, y1)
+			self.set_frame_bits(dst, self.get_frame_bits(dst) & ~mask | self.get_frame_bits(src) & mask)
+		
+		if region == (0, 0, self.width, self.height):
+			self.copy_stats(src, dst)
+		else:
+			self.frame_stats.pop(dst, None)
+		
+		self.revision += 1
+	
+	# Bring every cell in a region of a frame to life, or kill them all.
+	def fill_region(self, frame, x0, y0, x1, y1, alive):
+		region = self.clip_region(x0, y0, x1, y1)
+		if region is None:
+			return
+		
+		x0, y0, x1, y1 = region
+		
+		if y0 == 0 and y1 == self.height and not alive:
+			offset = self.frame_offset(frame)
+			self.frames[offset + x0 * self.col_bytes:offset + x1 * self.col_bytes] = bytes((x1 - x0) * self.col_bytes)
+		else:
+			mask = self.region_mask(x0, y0, x1, y1)
+			bits = self.get_frame_bits(frame)
+			self.set_frame_bits(frame, bits | mask if alive else bits & ~mask)
+		
+		if region == (0, 0, self.width, self.height):
+			self.frame_stats[frame] = (self.width * self.height, region) if alive else (0, None)
+		else:
+			self.frame_stats.pop(frame, None)
+		
+		self.revision += 1
+	
+	# Fill a region of a frame with random cells, each alive with the given probability, drawn from rng. See random_bits()
+	def randomize_region(self, frame, x0, y0, x1, y1, density=RANDOM_DENSITY, rng=random):
+		region = self.clip_region(x0, y0, x1, y1)
+		if region is None:
+			return
+		
+		x0, y0, x1, y1 = region
+		
+		# One bit per cell, column by column, so a seed gives the same cells however the columns are padded.
+		height = y1 - y0
+		bits = format(random_bits((x1 - x0) * height, density, rng), "0%db" % ((x1 - x0) * height))[::-1]
+		columns = [int(bits[i:i + height][::-1], 2) << y0 for i in range(0, len(bits), height)]
+		
+		mask = self.region_mask(x0, y0, x1, y1)
+		noise = int.from_bytes(b"".join(column.to_bytes(self.col_bytes, "little") for column in columns), "little") << (x0 * self.col_bytes * 8)
+		
+		self.set_frame_bits(frame, self.get_frame_bits(frame) & ~mask | noise & mask)
+		self.frame_stats.pop(frame, None)
+		
+		self.revision += 1
+	
+	# Draw a pattern, given as columns of cells like self.pattern, onto a frame with its top left corner at (x, y).
+	# Its live cells are brought to life, and if do_erase is True, the cells under its dead ones are killed. Returns the columns that changed, as column_changes() does.
+	def blit_pattern(self, frame, pattern, x, y, do_erase):
+		changes = []
+		if not pattern or not pattern[0]:
+			return changes
+		
+		# The rows the pattern covers, within the grid
+		rows = (1 << len(pattern[0])) - 1
+		rows = (rows << y if y >= 0 else rows >> -y) & ((1 << self.height) - 1)
+		
+		for a in range(max(-x, 0), min(len(pattern), self.width - x)):
+			cells = int(bytes(pattern[a]).translate(CGOL_Engines.CELLS_TO_DIGITS)[::-1], 2)
+			cells = (cells << y if y >= 0 else cells >> -y) & rows
+			
+			old = self.get_column(frame, x + a)
+			new = old & ~rows | cells if do_erase else old | cells
+			
+			if new != old:
+				self.set_column(frame, x + a, new)
+				changes.append((x + a, old, new))
+		
+		self.update_stats(frame, frame, changes)
+		
+		self.revision += 1
+		
+		return changes
+	
+	# Returns the difference between two frames, compactly. See CGOL_History.py
+	def frame_delta(self, a, b):
+		a = int.from_bytes(self.frames[self.frame_slice(a)], "little")
+		b = int.from_bytes(self.frames[self.frame_slice(b)], "little")
+		
+		return CGOL_History.encode_runs((a ^ b).to_bytes(self.frame_bytes, "little"))
+	
+	# Rebuild frame dst from frame src and the delta between them.
+	def apply_delta(self, src, dst, delta):
+		src = int.from_bytes(self.frames[self.frame_slice(src)], "little")
+		delta = int.from_bytes(CGOL_History.decode_runs(delta, self.frame_bytes), "little")
+		
+		self.frames[self.frame_slice(dst)] = (src ^ delta).to_bytes(self.frame_bytes, "little")
+		self.frame_stats.pop(dst, None)
+		
+		# Engines may have cached what used to be in the frame.
+		self.frames_written += 1
+		self.revision += 1
+	
+	# Returns a copy of a frame, compactly, for the checkpoint store.
+	def snapshot_frame(self, frame):
+		return CGOL_History.encode_runs(self.frames[self.frame_slice(frame)])
+	
+	# Overwrite a frame with a snapshot of one.
+	def restore_frame(self, frame, snapshot):
+		self.frames[self.frame_slice(frame)] = CGOL_History.decode_runs(snapshot, self.frame_bytes)
+		self.frame_stats.pop(frame, None)
+		
+		# Engines may have cached what used to be in the frame.
+		self.frames_written += 1
+		self.revision += 1
+	
+	# Returns a hash of a frame's cells, which combines a hash of each column and its x with XOR.
+	# Anything that modifies the grid changes its revision, after which the hash is recomputed from scratch. See update_hash()
+	def get_hash(self, frame):
+		cached = self.hashes.get(frame)
+		if cached is not None and cached[0] == self.revision:
+			return cached[1]
+		
+		h = functools.reduce(operator.xor, itertools.starmap(column_hash, enumerate(self.get_columns(frame))), 0)
+		self.hashes[frame] = (self.revision, h)
+		
+		return h
+	
+	# Returns (x, old column, new column) for each of the given columns that differ between two frames, or None if changed is None.
+	def column_changes(self, source, target, changed):
+		if changed is None:
+			return None
+		
+		return [(x, self.get_column(source, x), self.get_column(target, x)) for x in changed]
+	
+	# Work out the hash of frame target from that of frame source, which it was just stepped from, by rehashing only the columns that changed. See column_changes()
+	# If either is unknown, the hash is left to get_hash() to compute when it's needed.
+	def update_hash(self, source, target, changes):
+		cached = self.hashes.get(source)
+		if cached is None or cached[0] != self.revision or changes is None:
+			return
+		
+		h = cached[1]
+		for x, old, new in changes:
+			h ^= column_hash(x, old) ^ column_hash(x, new)
+		
+		self.hashes[target] = (self.revision, h)
+	
+	# Count the live cells of a frame and find their bounding box from scratch, and remember them. Returns (population, box).
+	def measure_frame(self, frame):
+		data = bytes(self.frames[self.frame_slice(frame)])
+		
+		population = popcount(int.from_bytes(data, "little"))
+		box = None
+		
+		if population:
+			# The first and last columns with a nonzero byte
+			left = (len(data) - len(data.lstrip(b"\x00"))) // self.col_bytes
+			right = (len(data.rstrip(b"\x00")) - 1) // self.col_bytes + 1
+			
+			rows = functools.reduce(operator.or_, self.get_columns(frame)[left:right])
+			box = (left, (rows & -rows).bit_length() - 1, right, rows.bit_length())
+		
+		self.frame_stats[frame] = (population, box)
+		
+		return population, box
+	
+	# Work out the population and bounding box of frame target from those of frame source, which it was just stepped from, using only the columns that changed. See column_changes()
+	# The box can only grow from the new cells. If a cell on its edge died, it may have shrunk, and the frame is measured again.
+	# If either is unknown, the frame is left to get_stats() to measure when it's needed.
+	def update_stats(self, source, target, changes):
+		old = self.frame_stats.get(source)
+		if old is None or changes is None:
+			self.frame_stats.pop(target, None)
+			return
+		
+		population, box = old
+		
+		left, top, right, bottom = box if box is not None else (self.width, self.height, 0, 0)
+		rows = 0
+		for x, before, after in changes:
+			population += popcount(after) - popcount(before)
+			
+			if before & ~after and (x == left or x == right - 1 or (before & ~after) >> top & 1 or (before & ~after) >> (bottom - 1) & 1):
+				self.measure_frame(target)
+				return
+			
+			if after:
+				left = min(left, x)
+				right = max(right, x + 1)
+				rows |= after
+		
+		if rows:
+			top = min(top, (rows & -rows).bit_length() - 1)
+			bottom = max(bottom, rows.bit_length())
+		
+		self.frame_stats[target] = (population, (left, top, right, bottom) if population else None)
+	
+	# Update the population and bounding box of the current frame after cell (x, y) was set or reset.
+	def update_cell_stats(self, x, y, alive):
+		stats = self.frame_stats.get(self.current)
+		if stats is None:
+			return
+		
+		population, box = stats
+		
+		if alive:
+			if box is None:
+				box = (x, y, x + 1, y + 1)
+			else:
+				box = (min(box[0], x), min(box[1], y), max(box[2], x + 1), max(box[3], y + 1))
+			
+			self.frame_stats[self.current] = (population + 1, box)
+		
+		# A cell on the edge of the box may have been the last one in its row or column.
+		elif x in (box[0], box[2] - 1) or y in (box[1], box[3] - 1):
+			del self.frame_stats[self.current]
+		
+		else:
+			self.frame_stats[self.current] = (population - 1, box)
+	
+	# Called when frame target is made a copy of frame source.
+	def copy_stats(self, source, target):
+		if source in self.frame_stats:
+			self.frame_stats[target] = self.frame_stats[source]
+		else:
+			self.frame_stats.pop(target, None)
+	
+	# Returns (population, box) of a frame, measuring it only if it isn't already known.
+	def get_stats(self, frame):
+		stats = self.frame_stats.get(frame)
+		if stats is None:
+			stats = self.measure_frame(frame)
+		
+		return stats
+	
+	# The number of live cells in the current frame.
+	def get_population(self):
+		return self.get_stats(self.current)[0]
+	
+	# Returns the (left, top, right, bottom) of the smallest rectangle containing every live cell of the current frame, with right and bottom exclusive, or None if there are none.
+	def bounding_box(self):
+		return self.get_stats(self.current)[1]
+	
+	def frames_equal(self, a, b):
+		return self.frames[self.frame_slice(a)] == self.frames[self.frame_slice(b)]
+	
+	# Returns True if a frame holds the same cells as a snapshot. See snapshot_frame()
+	def frame_equals_snapshot(self, frame, snapshot):
+		return self.snapshot_frame(frame) == snapshot
+	
+	# Called after each step from frame source into frame target, to update the population, bounding box and hash of the new frame, and look for a repeat.
+	def check_cycle(self, source, target, is_periodic):
+		changes = self.column_changes(source, target, self.engine.changed_columns)
+		
+		self.update_stats(source, target, changes)
+		self.update_hash(source, target, changes)
+		
+		found = self.cycles.after_step(self, source, target, is_periodic)
+		if found is not None:
+			start, period = found
+			
+			self.cycle_found = True
+			print("Generation %d repeats generation %d; the pattern has period %d." % (start + period, start, period))
+	
+	# Keep up to budget bytes of frames beyond the history ring, as deltas. If budget is None, only the ring is kept.
+	def set_long_history(self, budget):
+		if budget is None:
+			self.long_history = None
+		else:
+			self.long_history = CGOL_History.delta_history(budget)
+	
+	# Called before a new frame is written into the frame after the current one, so the long history can keep the frame that was there.
+	def begin_write(self):
+		if self.long_history is not None:
+			self.long_history.before_write(self)
 	
 	# Appends an event to the history
 	def append_event(self, e):
@@ -74,73 +600,74 @@ class CGOL_grid:
 	
 	# Get the pixel at these coordinates for the current frame
 	def get(self, x, y):
-		ind, bit = self.get_current()
-		mask = 1 << bit
-		
-		return self.grids[ind][x][y] & mask
+		return self.frames[self.frame_offset(self.current) + x * self.col_bytes + (y >> 3)] & (1 << (y & 7))
 	
 	# Set the pixel at these coordinates for the current frame
 	def set(self, x, y, record=True):
-		ind, bit = self.get_current()
-		mask = 1 << bit
-		
-		if record:
-			val = self.get(x, y)
-			if not val:
+		if not self.get(x, y):
+			if record:
 				self.append_event(("PIX", x, y, False, True))
+			
+			self.update_cell_stats(x, y, True)
 		
-		self.grids[ind][x][y] |= mask
+		self.frames[self.frame_offset(self.current) + x * self.col_bytes + (y >> 3)] |= 1 << (y & 7)
+		self.revision += 1
 	
 	# Reset the pixel at these coordinates for the current frame
 	def reset(self, x, y, record=True):
-		ind, bit = self.get_current()
-		mask = 1 << bit
-		
-		if record:
-			val = self.get(x, y)
-			if val:
+		if self.get(x, y):
+			if record:
 				self.append_event(("PIX", x, y, True, False))
+			
+			self.update_cell_stats(x, y, False)
 		
-		self.grids[ind][x][y] &= ~mask
+		self.frames[self.frame_offset(self.current) + x * self.col_bytes + (y >> 3)] &= ~(1 << (y & 7))
+		self.revision += 1
 	
 	# Flip the pixel at these coordinates for the current frame
 	def flip(self, x, y, record=True):
-		ind, bit = self.get_current()
-		mask = 1 << bit
+		offset = self.frame_offset(self.current) + x * self.col_bytes + (y >> 3)
+		mask = 1 << (y & 7)
 		
-		if self.grids[ind][x][y] & mask:
-			self.grids[ind][x][y] &= ~mask
-			
-			if record:
+		if record:
+			if self.frames[offset] & mask:
 				self.append_event(("PIX", x, y, True, False))
-		else:
-			self.grids[ind][x][y] |= mask
-			
-			if record:
+			else:
 				self.append_event(("PIX", x, y, False, True))
+		
+		self.update_cell_stats(x, y, not self.frames[offset] & mask)
+		self.frames[offset] ^= mask
+		
+		self.revision += 1
 	
-	# Get the latest indexes
+	# Get the latest frame
 	def get_latest(self):
-		return self.latest % len(self.grids), self.latest // len(self.grids)
+		return self.latest
 	
-	# Get the currently rendered indexes
+	# Get the currently rendered frame
 	def get_current(self):
-		return self.current % len(self.grids), self.current // len(self.grids)
+		return self.current
 	
-	# Get the indexes of the grid we should render to.
+	# Get the frame we should render to.
 	def get_target(self):
-		next = (self.current + 1) % (len(self.grids) * self.BIT_WIDTH)
-		return next % len(self.grids), next // len(self.grids)
+		return (self.current + 1) % self.depth
 	
 	# Show the next grid
 	def inc_current(self, record=True):
-		# If we're already showing the latest frame, step the simulation.
+		# If we're already showing the latest frame, step the simulation, unless there are frames after it in the long history.
 		if (self.current == self.latest):
-			self.step_queued = True
+			if self.long_history is not None and self.long_history.advance(self):
+				self.render_queued = True
+				
+				if record:
+					self.append_event(("ADVANCE",))
+			
+			else:
+				self.step_queued = True
 		
 		# Otherwise, show the next frame.
 		else:
-			self.current = (self.current + 1) % (len(self.grids) * self.BIT_WIDTH)
+			self.current = (self.current + 1) % self.depth
 			self.render_queued = True
 		
 			if record:
@@ -148,13 +675,18 @@ class CGOL_grid:
 	
 	# Show the previous grid.
 	def dec_current(self, record=True):
-		prev = (self.current - 1) % (len(self.grids) * self.BIT_WIDTH)
+		prev = (self.current - 1) % self.depth
 		
-		# If showing the previous grid would loop back around to showing the latest grid, don't do anything.
-		if (prev == self.latest):
-			return False
+		# Rewinding past the oldest frame in the ring restores it from the long history, if there is one.
+		rewound = self.long_history is not None and self.long_history.rewind(self)
+		
+		if not rewound:
+			# If showing the previous grid would loop back around to showing the latest grid, or the ring hasn't filled up that far yet, don't do anything.
+			if (prev == self.latest or self.generations[prev] == UNWRITTEN):
+				return False
+			
+			self.current = prev
 		
-		self.current = prev
 		self.render_queued = True
 		
 		if record:
@@ -162,22 +694,69 @@ class CGOL_grid:
 		
 		return True
 	
+	# Get the generation of the currently rendered frame
+	def get_generation(self):
+		return self.generations[self.current]
+	
+	# Go to any generation since the last randomize() or clear(), forwards or backwards.
+	# The nearest checkpoint before it is restored as the next frame, and the generations after it are simulated with the fastest engine.
+	def seek(self, window, generation):
+		found = self.checkpoints.find(generation)
+		if found is None:
+			print("Can't go to generation %d; there is no checkpoint before it." % generation)
+			return
+		
+		start, snapshot, is_periodic = found
+		
+		self.begin_write()
+		
+		target = self.get_target()
+		self.restore_frame(target, snapshot)
+		self.generations[target] = start
+		
+		# Steps from the checkpoint continue the run it belongs to.
+		self.checkpoints.last = (start, self.revision, is_periodic)
+		
+		print("Restored generation %d" % start)
+		
+		if generation == start:
+			self.set_next_to_latest()
+			self.frame_ready = True
+			return
+		
+		# Move onto the restored frame, without queueing a render.
+		self.current = target
+		self.latest = target
+		self.append_event(("ADVANCE",))
+		
+		# Unbounded grids always use the sparse engine.
+		engine = self.engine
+		if not self.is_unbounded and engine.name != CGOL_Engines.available_engines()[0]:
+			self.engine = CGOL_Engines.create_engine()
+		
+		try:
+			self.step_n(window, generation - start, is_periodic)
+		
+		finally:
+			if self.engine is not engine:
+				self.engine = engine
+				
+				# The selected engine may have cached a frame that has since been overwritten.
+				self.revision += 1
+				self.checkpoints.last = (self.checkpoints.last[0], self.revision, self.checkpoints.last[2])
+	
 	# Undo
 	def undo(self):
-		print("Undo")
 		if self.history_cur == 0:
 			return
 		
 		e = self.history[self.history_cur-1]
 		
 		if e[0] == "PIX":
-			ind, bit = self.get_current()
-			mask = 1 << bit
-			
 			if e[3]:
-				self.grids[ind][e[1]][e[2]] |= mask
+				self.set(e[1], e[2], False)
 			else:
-				self.grids[ind][e[1]][e[2]] &= ~mask
+				self.reset(e[1], e[2], False)
 		
 		elif e[0] == "ADVANCE":
 			if not self.dec_current(False):
@@ -194,22 +773,21 @@ class CGOL_grid:
 		self.history_cur-=1
 	
 	def redo(self):
-		print("Redo")
 		if self.history_cur == len(self.history):
+			# The frames after this one are discarded, and will be overwritten by new ones.
 			self.latest = self.current
+			self.revision += 1
+			
 			self.inc_current()
 			return
 		
 		e = self.history[self.history_cur]
 		
 		if e[0] == "PIX":
-			ind, bit = self.get_current()
-			mask = 1 << bit
-			
 			if e[4]:
-				self.grids[ind][e[1]][e[2]] |= mask
+				self.set(e[1], e[2], False)
 			else:
-				self.grids[ind][e[1]][e[2]] &= ~mask
+				self.reset(e[1], e[2], False)
 		
 		elif e[0] == "ADVANCE":
 			self.inc_current(False)
@@ -227,207 +805,539 @@ class CGOL_grid:
 	
 	# Set the grid that follows the currently rendered one as the latest.
 	def set_next_to_latest(self):
-		self.latest = (self.current + 1) % (len(self.grids) * self.BIT_WIDTH)
+		self.latest = (self.current + 1) % self.depth
 	
-	# Add or remove rows and columns to the sides of the grid.
-	# Also adjusts the position of the passed camera accordingly.
-	def resize(self, left, top, right, bottom, record=True):
-		# Error checking
-		if self.width + left + right < 4 or self.height + top + bottom < 4:
-			print("Aborting resize; resulting grid too small! (The limit is 4x4)")
-			return
-		
-		if self.width + left + right > 512 or self.height + top + bottom > 512:
-			print("Aborting resize; resulting grid too big! (The limit is 512x512)")
-			return
-		
-		# Modify columns
-		if left < 0:
-			for g in range(len(self.grids)):
-				self.grids[g] = self.grids[g][-left:]
+	# Returns the set of columns that may differ between the given frame and the current one, or None if that isn't known.
+	# Only the changes recorded for the frames in between are looked at, so this is cheap, but the given frame must not have been overwritten since.
+	def changed_columns_since(self, frame):
+		ring = self.depth
+		latest = self.latest
+		
+		# How many frames older than the latest frame each one is.
+		age_a = (latest - frame) % ring
+		age_b = (latest - self.current) % ring
+		
+		# Each record covers the step into its frame, so combine the records of every frame after the older one, up to the newer one.
+		columns = set()
+		for age in range(min(age_a, age_b), max(age_a, age_b)):
+			revision, changed = self.frame_changes.get((latest - age) % ring, (None, None))
+			if revision != self.revision or changed is None:
+				return None
+			
+			columns |= changed
 		
-		elif left > 0:
-			for g in range(len(self.grids)):
-				for i in range(left):
-					self.grids[g].insert(0, [])
-					
-					for y in range(self.height):
-						self.grids[g][0].append(0)
+		return columns
+	
+	# Write the whole state of the grid to a file: its size, the boundary mode, every frame of the history ring and the generation of each, and which is current and latest.
+	# The ring is written as it is in memory, without any room left around the grid by resize(), so load_snapshot() can map it straight back in. The long history, checkpoints and undo history aren't saved.
+	def save_snapshot(self, fn, is_periodic):
+		if os.name == "nt" and fn[0] == "/":
+			fn = fn[1:]
 		
-		if right < 0:
-			for g in range(len(self.grids)):
-				self.grids[g] = self.grids[g][:right+1]
+		flags = SNAPSHOT_PERIODIC if is_periodic else 0
 		
-		elif right > 0:
-			for g in range(len(self.grids)):
-				for i in range(right):
-					self.grids[g].append([])
-					
-					for y in range(self.height):
-						self.grids[g][-1].append(0)
-		
-		self.width += left + right
-		
-		# Modify rows
-		if top < 0:
-			for g in range(len(self.grids)):
-				for x in range(self.width):
-					self.grids[g][x] = self.grids[g][x][-top:]
-		
-		elif top > 0:
-			for g in range(len(self.grids)):
-				for x in range(self.width):
-					for i in range(top):
-						self.grids[g][x].insert(0, 0)
-		if bottom < 0:
-			for g in range(len(self.grids)):
-				for x in range(self.width):
-					self.grids[g][x] = self.grids[g][x][:bottom+1]
-		
-		elif bottom > 0:
-			for g in range(len(self.grids)):
-				for x in range(self.width):
-					for i in range(bottom):
-						self.grids[g][x].append(0)
+		frames = self.frames
+		if self.frame_stride != self.frame_bytes or self.col_bytes != (self.height + 7) // 8:
+			frames = repad_columns(b"".join([self.frames[self.frame_slice(frame)] for frame in range(self.depth)]), self.col_bytes, (self.height + 7) // 8)
 		
-		# Modify stored width and height
-		self.height += top + bottom
+		# Written to a new file first, so a snapshot that's mapped in elsewhere is never changed underneath it.
+		with open(fn + ".tmp", "wb") as fout:
+			fout.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, self.width, self.height, self.depth, self.current, self.latest, self.budget, SNAPSHOT_ALIGNMENT))
+			fout.write(bytes(SNAPSHOT_ALIGNMENT - SNAPSHOT_HEADER.size))
+			fout.write(frames)
+			fout.write(array.array("q", self.generations).tobytes())
 		
-		if record:
-			self.append_event(("RESIZE", left, top, right, bottom))
+		os.replace(fn + ".tmp", fn)
 		
-		# Queue render
-		self.render_queued = True
+		print("Saved snapshot of %d frames to %s" % (self.depth, fn))
 	
-	# Fill the next grid with random data.
-	def randomize(self):
-		ind, bit = self.get_target()
-		mask = 1 << bit
+	# Returns the header of a snapshot file as a tuple, after checking that it's one this grid can load. Otherwise prints why and returns None.
+	def read_snapshot_header(self, mm, fn):
+		if len(mm) < SNAPSHOT_HEADER.size:
+			print("Aborting Load: %s is not a snapshot." % fn)
+			return None
 		
-		for x in range(self.width):
-			for y in range(self.height):
-				if random.randint(0, 2) == 0:
-					self.grids[ind][x][y] |= mask
-		
-		self.set_next_to_latest()
-		self.frame_ready = True
+		header = SNAPSHOT_HEADER.unpack_from(mm)
+		magic, version, flags = header[:3]
 		
-#		print("Randomized %d (%d, %d)" % (self.latest, *self.get_latest()))
-	
-	# Fill the next grid with dead cells.
-	def clear(self):
-		ind, bit = self.get_target()
-		mask = 1 << bit
+		if magic != SNAPSHOT_MAGIC:
+			print("Aborting Load: %s is not a snapshot." % fn)
+			return None
 		
-		for x in range(len(self.grids[ind])):
-			for y in range(len(self.grids[ind][0])):
-				self.grids[ind][x][y] &= ~mask
+		if version != SNAPSHOT_VERSION:
+			print("Aborting Load: %s has snapshot version %d, but only version %d is supported." % (fn, version, SNAPSHOT_VERSION))
+			return None
 		
-		self.set_next_to_latest()
-		self.frame_ready = True
+		if bool(flags & SNAPSHOT_UNBOUNDED) != self.is_unbounded:
+			print("Aborting Load: %s is a snapshot of %s grid." % (fn, "an unbounded" if flags & SNAPSHOT_UNBOUNDED else "a bounded"))
+			return None
 		
-#		print("Cleared %d (%d, %d)" % (self.latest, *self.get_latest()))
+		return header
 	
-	# Simulates one step into the next grid. Gets a copy of is_periodic so we can change it from another thread without affecting the render.
-	def step(self, window, is_periodic):
-		s_ind, s_bit = self.get_current()
-		d_ind, d_bit = self.get_target()
-		
-		s_mask = 1 << s_bit
-		d_mask = 1 << d_bit
-		
-		d_mask_inv = ~d_mask
+	# Replace the state of the grid with a snapshot written by save_snapshot(). Returns the boundary mode it was saved with, as is_periodic, or None if it couldn't be loaded.
+	# The frames are mapped into memory copy-on-write rather than read, so only the parts of the ring that are used are ever read from disk.
+	def load_snapshot(self, fn):
+		if os.name == "nt" and fn[0] == "/":
+			fn = fn[1:]
 		
-		# Separate loops for periodic vs finite grids helps performance
-		# This is the only part of the code where performance is a serious concern.
-		if is_periodic:
-			# For each tile...
-			for x in range(self.width):
-				
-				# In between columns, check if we should abort
-				if window.is_halting:
-					print("Halting simulation thread.")
-					window.is_halting = False
-					return
-				
-				for y in range(self.height):
-					neighbors = 0
+		try:
+			with open(fn, "rb") as fin:
+				with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+					header = self.read_snapshot_header(mm, fn)
+					if header is None:
+						return None
 					
-					# For each neighbor of this tile...
-					for a in range(x-1, x+2):
-						for b in range(y-1, y+2):
-							# Don't count this cell as its own neighbor.
-							if (a == x and b == y):
-								continue
-							
-							# Count the neighbors
-							if self.grids[s_ind][a % self.width][b % self.height] & s_mask:
-								neighbors+=1
-								
-								if neighbors > 3:
-									break
+					magic, version, flags, width, height, depth, current, latest, budget, offset = header
 					
-					# Apply CGoL rules
-					if neighbors < 2 or neighbors > 3 or (neighbors == 2 and not self.grids[s_ind][x][y] & s_mask):
-						self.grids[d_ind][x][y] &= d_mask_inv
-						
-					else:
-						self.grids[d_ind][x][y] |= d_mask
-			
-		else:
-			# For each tile...
-			for x in range(self.width):
-				
-				# In between columns, check if we should abort
-				if not window.is_halting:
-					print("Halting simulation thread.")
-					window.is_halting = False
-					return
-				
-				for y in range(self.height):
-					neighbors = 0
+					col_bytes = (height + 7) // 8
+					size = depth * width * col_bytes
 					
-					# For each neighbor of this tile...
-					for a in range(max(x-1, 0), min(x+2, self.width)):
-						for b in range(max(y-1, 0), min(y+2, self.height-1)):
-							# Don't count this cell as its own neighbor.
-							if (a == x and b == y):
-								continue
-							
-							# Count the neighbors
-							if self.grids[s_ind][a % self.width][b % self.height] & s_mask:
-								neighbors+=1
-								
-								if neighbors > 3:
-									break
-								
-						if neighbors > 3:
-							break
+					if len(mm) != offset + size + depth * 8 or current >= depth or latest >= depth:
+						print("Aborting Load: %s is truncated or corrupt." % fn)
+						return None
 					
-					# Apply CGoL rules
-					if neighbors < 2 or neighbors > 3 or (neighbors == 2 and not self.grids[s_ind][x][y] & s_mask):
-						self.grids[d_ind][x][y] &= d_mask_inv
-						
+					generations = array.array("q")
+					generations.frombytes(mm[offset + size:])
+					
+					# The frames can only be mapped from an offset the platform allows. Otherwise they're copied.
+					if offset % mmap.ALLOCATIONGRANULARITY == 0:
+						frames = mmap.mmap(fin.fileno(), size, access=mmap.ACCESS_COPY, offset=offset)
 					else:
-						self.grids[d_ind][x][y] |= d_mask
+						frames = bytearray(mm[offset:offset + size])
 		
-		# Ready to render next frame
-		self.set_next_to_latest()
-		self.frame_ready = True
+		except (OSError, ValueError, struct.error) as e:
+			print("Aborting Load: %s could not be read (%s)." % (fn, e))
+			return None
 		
-		print("Next ready at %d (%d, %d), generated from %d (%d, %d)" % (self.latest, d_ind, d_bit, self.current, s_ind, s_bit))
+		self.width = width
+		self.height = height
+		self.budget = budget
+		self.col_bytes, self.frame_bytes, self.depth = col_bytes, width * col_bytes, depth
+		self.frame_stride = self.frame_bytes
+		self.origin = 0
+		self.frames = frames
+		self.generations = generations.tolist()
 		
-	# Renders using the passed camera, to the passed QPixmap
-	def render(self, window, cam, elem):
-		ind, bit = self.get_current()
+		self.current = current
+		self.latest = latest
 		
-		pix = elem.pixmap()
+		self.forget_history()
 		
-		print("Rendering frame %d... (%d, %d)" % (self.current, ind, bit))
+		print("Loaded snapshot of %d frames from %s" % (depth, fn))
 		
-		rect = pix.rect()
-		w2 = rect.width() / 2 / cam.s
-		h2 = rect.height() / 2 / cam.s
+		return bool(flags & SNAPSHOT_PERIODIC)
+	
+	# After the grid has been replaced wholesale, forget everything that described the old one: the undo history, the long history, checkpoints, hashes and cached engine state.
+	def forget_history(self):
+		self.history = []
+		self.history_cur = 0
+		
+		self.frame_changes = {}
+		self.frame_stats = {}
+		self.hashes = {}
+		
+		if self.long_history is not None:
+			self.long_history.reset()
+		
+		self.checkpoints.reset()
+		self.cycles.reset()
+		self.cycles.last = None
+		
+		self.frames_written += 1
+		self.revision += 1
+		
+		self.render_queued = True
+	
+	# Add or remove rows and columns to the sides of the grid.
+	# Most resizes only move the origin of the grid within the storage, and change its size. Removing rows or columns clears them, and adding or removing rows at the top shifts every column, in one pass over the storage. See resize_frames()
+	# Returns False if the resize was aborted.
+	def resize(self, left, top, right, bottom, record=True):
+		# Error checking
+		if self.width + left + right < 4 or self.height + top + bottom < 4:
+			print("Aborting resize; resulting grid too small! (The limit is 4x4)")
+			return False
+		
+		if self.width + left + right > MAX_SIZE or self.height + top + bottom > MAX_SIZE:
+			print("Aborting resize; resulting grid too big! (The limit is %dx%d)" % (MAX_SIZE, MAX_SIZE))
+			return False
+		
+		width = self.width + left + right
+		height = self.height + top + bottom
+		
+		if not self.fits(left, top, right, bottom):
+			self.reserve(left, top, right, bottom)
+		
+		self.resize_frames(left, top, right, bottom)
+		
+		# A bounding box that's still inside the grid only moves. Otherwise the frame is measured again when needed.
+		frame_stats = {}
+		for frame, (population, box) in self.frame_stats.items():
+			if box is None:
+				frame_stats[frame] = (population, box)
+			elif box[0] + left >= 0 and box[1] + top >= 0 and box[2] + left <= width and box[3] + top <= height:
+				frame_stats[frame] = (population, (box[0] + left, box[1] + top, box[2] + left, box[3] + top))
+		
+		# Modify stored width and height
+		self.origin -= left * self.col_bytes
+		self.width = width
+		self.height = height
+		self.frame_bytes = width * self.col_bytes
+		
+		self.frame_changes = {}
+		self.frame_stats = frame_stats
+		self.hashes = {}
+		
+		# The long history and checkpoints hold frames of the old size.
+		if self.long_history is not None:
+			self.long_history.reset()
+		
+		self.checkpoints.reset()
+		
+		self.revision += 1
+		
+		if record:
+			self.append_event(("RESIZE", left, top, right, bottom))
+		
+		# Queue render
+		self.render_queued = True
+		
+		return True
+	
+	# Whether a resize fits in the storage as it is, with the old and new grid both inside it.
+	def fits(self, left, top, right, bottom):
+		x = self.origin // self.col_bytes - left
+		
+		return x >= 0 and x + self.width + left + right <= self.frame_stride // self.col_bytes and self.height + top + bottom <= self.col_bytes * 8
+	
+	# Whether a resize can happen while another thread renders the grid. It must fit, and must not move the origin right, or the renderer could read columns beyond the end of the storage.
+	def can_resize_during_render(self, left, top, right, bottom):
+		return left >= 0 and self.fits(left, top, right, bottom)
+	
+	# Reallocate the storage so that a resize fits, with STORAGE_GROWTH times as much room as before where it's needed, shared evenly between both sides.
+	# The ring is rebuilt to hold as many frames as fit in the budget, counting back from the latest one, or from the current one if it's too far behind. The grid itself doesn't change.
+	# Anything else that refers to frames by their place in the ring is left for resize() to forget.
+	def reserve(self, left, top, right, bottom):
+		col_bytes = self.col_bytes
+		if self.height + top + bottom > col_bytes * 8:
+			col_bytes = max((self.height + top + bottom + 7) // 8, min(int(col_bytes * STORAGE_GROWTH), (MAX_SIZE + 7) // 8))
+		
+		# The columns of the old and new grid, relative to the old one
+		x0 = min(0, -left)
+		x1 = max(self.width, self.width + right)
+		
+		columns = self.frame_stride // self.col_bytes
+		if x1 - x0 > columns:
+			columns = max(x1 - x0, min(int(columns * STORAGE_GROWTH), MAX_SIZE))
+		
+		origin = ((columns - (x1 - x0)) // 2 - x0) * col_bytes
+		col_bytes, frame_stride, depth = self.layout(columns, col_bytes * 8)
+		
+		n = min(self.depth, depth)
+		
+		end = self.latest
+		if (self.latest - self.current) % self.depth >= n:
+			end = (self.current + n - 1) % self.depth
+		
+		age = (end - self.current) % self.depth
+		
+		size = self.width * col_bytes
+		
+		frames = bytearray(depth * frame_stride)
+		generations = [UNWRITTEN] * depth
+		frame_stats = {}
+		for i in range(n):
+			frame = (end - n + 1 + i) % self.depth
+			generations[i] = self.generations[frame]
+			
+			if frame in self.frame_stats:
+				frame_stats[i] = self.frame_stats[frame]
+			
+			# Frames that have never been written to are left empty, which saves most of the work on small grids with deep histories.
+			data = self.frames[self.frame_slice(frame)]
+			if data.count(0) == len(data):
+				continue
+			
+			if col_bytes != self.col_bytes:
+				data = repad_columns(data, self.col_bytes, col_bytes)
+			
+			frames[i * frame_stride + origin:i * frame_stride + origin + size] = data
+		
+		self.col_bytes, self.frame_bytes, self.depth = col_bytes, size, depth
+		self.frame_stride = frame_stride
+		self.origin = origin
+		self.frames = frames
+		
+		self.latest = n - 1
+		self.current = n - 1 - age
+		self.generations = generations
+		self.frame_stats = frame_stats
+	
+	# Clear the rows and columns that a resize removes from every frame, and shift the rows down or up by the number removed or added at the top.
+	# The whole storage is worked on as integers of up to RESIZE_CHUNK bytes. Since every bit outside the grid is 0, and the storage has room for the new rows, no column spills into the next.
+	def resize_frames(self, left, top, right, bottom):
+		if min(left, top, right, bottom) >= 0 and top == 0:
+			return
+		
+		# The part of the old grid that's kept
+		x0, y0, x1, y1 = max(0, -left), max(0, -top), min(self.width, self.width + right), min(self.height, self.height + bottom)
+		
+		count = max(RESIZE_CHUNK // self.frame_stride, 1)
+		chunk = count * self.frame_stride
+		
+		mask = 0
+		if x0 < x1 and y0 < y1:
+			column = (((1 << (y1 - y0)) - 1) << y0).to_bytes(self.col_bytes, "little")
+			
+			kept = bytearray(self.frame_stride)
+			kept[self.origin + x0 * self.col_bytes:self.origin + x1 * self.col_bytes] = column * (x1 - x0)
+			
+			mask = int.from_bytes(kept * count, "little")
+		
+		for start in range(0, self.depth * self.frame_stride, chunk):
+			end = min(start + chunk, self.depth * self.frame_stride)
+			
+			# Frames that have never been written to are all 0.
+			data = self.frames[start:end]
+			if data.count(0) == len(data):
+				continue
+			
+			bits = int.from_bytes(data, "little") & mask
+			bits = bits << top if top >= 0 else bits >> -top
+			
+			self.frames[start:end] = bits.to_bytes(end - start, "little")
+	
+	# Fill the next grid with random data, each cell alive with the given probability. If a seed is given, the same seed always gives the same grid.
+	def randomize(self, density=RANDOM_DENSITY, seed=None):
+		self.begin_write()
+		
+		target = self.get_target()
+		self.generations[target] = 0
+		
+		self.randomize_region(target, 0, 0, self.width, self.height, density, random if seed is None else random.Random(seed))
+		self.measure_frame(target)
+		
+		self.set_next_to_latest()
+		self.frame_ready = True
+		
+#		print("Randomized %d" % self.get_latest())
+	
+	# Fill the next grid with dead cells.
+	def clear(self):
+		self.begin_write()
+		
+		target = self.get_target()
+		self.generations[target] = 0
+		
+		self.fill_region(target, 0, 0, self.width, self.height, False)
+		
+		self.set_next_to_latest()
+		self.frame_ready = True
+		
+#		print("Cleared %d" % self.get_latest())
+	
+	# Simulates one step into the next grid using the selected engine. Gets a copy of is_periodic so we can change it from another thread without affecting the render.
+	def step(self, window, is_periodic):
+		stats = self.stats
+		if stats.enabled:
+			start = time.perf_counter()
+		
+		self.begin_write()
+		
+		# This is the only part of the code where performance is a serious concern, so it's handled by a swappable engine.
+		if not self.engine.step(self, window, is_periodic):
+			return
+		
+		self.frames_written += 1
+		self.frame_changes[(self.current + 1) % self.depth] = (self.revision, self.engine.changed_columns)
+		
+		self.generations[(self.current + 1) % self.depth] = self.generations[self.current] + 1
+		self.checkpoints.after_step(self, self.current, (self.current + 1) % self.depth, is_periodic)
+		self.check_cycle(self.current, (self.current + 1) % self.depth, is_periodic)
+		
+		# Ready to render next frame
+		self.set_next_to_latest()
+		
+		if stats.enabled:
+			stats.record("step", time.perf_counter() - start, frame=self.latest, population=self.get_stats(self.latest)[0])
+			self.frame_ready_time = time.perf_counter()
+		
+		self.frame_ready = True
+	
+	# Runs n steps in a tight loop, skipping the per-frame round trip through the mainloop.
+	# Only the last frames that fit in the history ring are kept, and only those get ADVANCE events.
+	# If the board is known to repeat, whole periods are skipped, and only the remainder is simulated.
+	def step_n(self, window, n, is_periodic):
+		ring = self.depth
+		requested = n
+		skipped = 0
+		
+		self.progress = (0, n)
+		
+		stats = self.stats
+		
+		for i in range(n):
+			if stats.enabled:
+				start = time.perf_counter()
+			
+			self.begin_write()
+			
+			if not self.engine.step(self, window, is_periodic):
+				# Show whatever was finished before the halt.
+				self.progress = None
+				self.render_queued = True
+				return
+			
+			self.frames_written += 1
+			self.frame_changes[(self.current + 1) % ring] = (self.revision, self.engine.changed_columns)
+			
+			self.generations[(self.current + 1) % ring] = self.generations[self.current] + 1
+			self.checkpoints.after_step(self, self.current, (self.current + 1) % ring, is_periodic)
+			self.check_cycle(self.current, (self.current + 1) % ring, is_periodic)
+			
+			if stats.enabled:
+				stats.record("step", time.perf_counter() - start, frame=(self.current + 1) % ring, population=self.get_stats((self.current + 1) % ring)[0])
+			
+			# Once the board is known to repeat, the rest of the run can skip whole periods.
+			period = self.cycles.period(self.generations[(self.current + 1) % ring], self.revision, is_periodic)
+			if not skipped and period is not None and n-1 - i > period:
+				skipped = (n-2 - i) // period * period
+				n -= skipped
+				
+				print("Skipping %d generations, %d periods of %d" % (skipped, skipped // period, period))
+			
+			if i == n-1:
+				break
+			
+			# Move onto the new frame, without queueing a render.
+			self.current = (self.current + 1) % ring
+			self.latest = self.current
+			
+			# Frames that will survive to the end of the run can be rewound to, which is all of them with a long history.
+			if n-1 - i < ring - 1 or self.long_history is not None:
+				self.append_event(("ADVANCE",))
+			
+			self.progress = (i+1, n)
+		
+		self.progress = None
+		
+		# The last frame is as many generations on as were asked for, which starts a new run of checkpoints from it.
+		if skipped:
+			self.generations[(self.current + 1) % ring] += skipped
+			self.cycles.skip(skipped)
+		
+		# The last frame is shown by the mainloop, just like a single step.
+		self.set_next_to_latest()
+		
+		if stats.enabled:
+			self.frame_ready_time = time.perf_counter()
+		
+		self.frame_ready = True
+		
+		print("Ran %d generations, next ready at %d" % (requested, self.latest))
+	
+	# Advances the simulation to the given generation at once using HashLife, and stores the result in the next grid.
+	# HashLife simulates an unbounded universe, and cells that leave a bounded grid are discarded. That can't stand in for cells wrapping around its edges, so periodic grids are refused.
+	def fast_forward(self, window, generation, is_periodic):
+		n = generation - self.generations[self.current]
+		if n < 1:
+			print("Can't fast-forward to generation %d; it isn't after the current generation, %d." % (generation, self.generations[self.current]))
+			return
+		
+		if is_periodic and not self.is_unbounded:
+			print("Can't fast-forward a periodic grid; HashLife doesn't wrap cells around the edges. Run the generations instead.")
+			return
+		
+		if self.hashlife is None:
+			self.hashlife = CGOL_Engines.hashlife_engine()
+		
+		self.begin_write()
+		
+		if not self.advance_hashlife(window, n):
+			return
+		
+		# Engines may have cached what used to be in the frame.
+		self.frames_written += 1
+		self.revision += 1
+		
+		self.frame_changes[(self.current + 1) % self.depth] = (self.revision, None)
+		self.frame_stats.pop((self.current + 1) % self.depth, None)
+		
+		self.generations[(self.current + 1) % self.depth] = generation
+		
+		self.set_next_to_latest()
+		self.frame_ready = True
+		
+		print("Fast-forwarded %d generations, next ready at %d" % (n, self.latest))
+	
+	# Write the frame n generations after the current one into the next frame, with HashLife. Returns False if it was aborted.
+	def advance_hashlife(self, window, n):
+		return self.hashlife.advance(self, window, n)
+	
+	# Select the engine used by step(). Takes effect at the next step.
+	# The old engine is closed, so this must not be called while a step is running. The GUI queues it instead. See engine_queued
+	def set_engine(self, name, **options):
+		if hasattr(self.engine, "close"):
+			self.engine.close()
+		
+		self.engine = CGOL_Engines.create_engine(name, **options)
+		self.revision += 1
+		
+		print("Using the %s engine." % self.engine.name)
+		
+	# Renders using the passed camera, to the passed QPixmap
+	def render(self, window, cam, elem):
+		stats = self.stats
+		if stats.enabled:
+			start = time.perf_counter()
+		
+		if self.renderer is not None:
+			self.renderer.render(self, window, cam, elem)
+		else:
+			self.render_cells(window, cam, elem)
+		
+		if stats.enabled:
+			stats.record("render", time.perf_counter() - start, frame=self.current)
+	
+	# Returns the squares in columns x0 to x1 and rows y0 to y1 of the current frame, one byte per square, for CGOL_Render.image_renderer.
+	# The columns are laid out one after another, each stride bytes long. Live squares are CGOL_Render.LIVE and everything else is CGOL_Render.DEAD.
+	def cell_buffer(self, x0, y0, x1, y1, stride):
+		current = self.get_current()
+		
+		# get_cells() already gives one byte per square, in the same form.
+		padding = bytes(stride - (y1 - y0))
+		
+		return bytearray(b"".join([self.get_cells(current, x, y0, y1) + padding for x in range(x0, x1)]))
+	
+	# Returns the number of live squares in each k x k block from block columns bx0 to bx1 and block rows by0 to by1 of the current frame, laid out like cell_buffer().
+	# Blocks that hang over the edge of the grid only count the squares inside it. Counts are capped at CGOL_Render.MAX_COUNT.
+	def block_counts(self, k, bx0, by0, bx1, by1, stride):
+		current = self.get_current()
+		
+		y0 = by0 * k
+		y1 = min(by1 * k, self.height)
+		
+		buf = bytearray(stride * (bx1 - bx0))
+		for bx in range(bx0, bx1):
+			# Add up the columns of the block, then add up every k rows of the sums.
+			sums = [0] * (y1 - y0)
+			for x in range(bx * k, min((bx+1) * k, self.width)):
+				sums = list(map(operator.add, sums, self.get_cells(current, x, y0, y1)))
+			
+			offset = (bx - bx0) * stride
+			buf[offset:offset + by1 - by0] = bytes([min(sum(sums[i:i+k]), CGOL_Render.MAX_COUNT) for i in range(0, by1 * k - y0, k)])
+		
+		return buf
+	
+	# The original renderer. Makes one Qt call for each visible live square.
+	def render_cells(self, window, cam, elem):
+		# Qt is only imported when rendering, so the grid can be used without a GUI. See headless.py
+		from PyQt5 import QtGui
+		
+		pix = elem.pixmap()
+		
+		rect = pix.rect()
+		w2 = rect.width() / 2 / cam.s
+		h2 = rect.height() / 2 / cam.s
 		
 		# Get the range of grid squares that should be rendered
 		left = cam.x - w2
@@ -435,36 +1345,44 @@ class CGOL_grid:
 		right = cam.x + w2 + 1
 		bottom = cam.y + h2 + 1
 		
-		painter = QtGui.QPainter(pix)
+		# Zoomed out, several squares share a pixel, but each live one is still drawn.
+		size = max(1, int(cam.s))
 		
-		# Clear the pixmap
-		painter.fillRect(0, 0, rect.width(), rect.height(), QtGui.QColor.fromRgb(10, 10, 10))
+		painter = QtGui.QPainter(pix)
 		
-		# Draw the grid background
-		grid_l = int(0 - cam.x * cam.s + rect.width() / 2)
-		grid_t = int(0 - cam.y * cam.s + rect.height() / 2)
-		painter.fillRect(grid_l, grid_t, int(self.width * cam.s), int(self.height * cam.s), QtGui.QColor.fromRgb(25, 25, 25))
+		# Clear the pixmap, and draw the grid background. An unbounded grid covers the whole view.
+		if self.is_unbounded:
+			painter.fillRect(0, 0, rect.width(), rect.height(), QtGui.QColor.fromRgb(25, 25, 25))
 		
-		# Iterate over all the squares in this range
-		mask = 1 << bit
-		for x in range(max(math.floor(left), 0), min(math.ceil(right), self.width)):
-			for y in range(max(math.floor(top), 0), min(math.ceil(bottom), self.height)):
-				if self.grids[ind][x][y] & mask:
-					painter.fillRect(int((x - left) * cam.s), int((y - top) * cam.s), int(cam.s), int(cam.s), QtGui.QColor.fromRgb(230, 230, 230))
+		else:
+			painter.fillRect(0, 0, rect.width(), rect.height(), QtGui.QColor.fromRgb(10, 10, 10))
+			
+			grid_l = int(0 - cam.x * cam.s + rect.width() / 2)
+			grid_t = int(0 - cam.y * cam.s + rect.height() / 2)
+			painter.fillRect(grid_l, grid_t, int(self.width * cam.s), int(self.height * cam.s), QtGui.QColor.fromRgb(25, 25, 25))
+		
+		# Draw the live squares in this range
+		region = self.clip_region(math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom))
+		if region is not None:
+			x0, y0, x1, y1 = region
+			
+			for y, xs in self.live_rows(x0, y0, x1, y1):
+				for x in xs:
+					painter.fillRect(int((x0 + x - left) * cam.s), int((y0 + y - top) * cam.s), size, size, QtGui.QColor.fromRgb(230, 230, 230))
 		
-		# Render the preview
+		# Render the preview where the pattern would be placed, which is clamped to the edges of the grid like CGOL_Gui.click_labal.get_tile()
 		if self.is_placing:
-			pat_width = len(self.pattern)
-			pat_height = len(self.pattern[0])
+			x = math.floor(left + window.label.mouse_x / cam.s)
+			y = math.floor(top + (window.label.mouse_y + 10) / cam.s)
 			
-			x = max(math.floor(left + window.label.mouse_x / int(cam.s)), 0)
-			y = max(math.floor(top + (window.label.mouse_y + 10) / int(cam.s)), 0)
-			print(x, y)
+			if not self.is_unbounded:
+				x = min(max(x, 0), self.width - 1)
+				y = min(max(y, 0), self.height - 1)
 			
-			for a in range(max(-x, 0), min(min(pat_width, self.width-x), math.ceil(right)-x)):
-				for b in range(max(-y, 0), min(min(pat_height, self.height-y), math.ceil(bottom))):
-					if self.pattern[a][b]:
-						painter.fillRect(int((x + a - left) * cam.s), int((y + b - top) * cam.s), int(cam.s), int(cam.s), QtGui.QColor.fromRgb(210, 230, 210))
+			for a, column in enumerate(self.pattern):
+				for b, alive in enumerate(column):
+					if alive and (self.is_unbounded or (x + a < self.width and y + b < self.height)):
+						painter.fillRect(int((x + a - left) * cam.s), int((y + b - top) * cam.s), size, size, QtGui.QColor.fromRgb(210, 230, 210))
 		
 		elem.update()
 		painter.end()
@@ -473,132 +1391,459 @@ class CGOL_grid:
 	
 	# Copy this frame into the next frame
 	def clone(self):
-		s_ind, s_bit = self.get_current()
-		d_ind, d_bit = self.get_target()
-		
-		s_mask = 1 << s_bit
-		d_mask = 1 << d_bit
+		self.begin_write()
 		
-		for x in range(self.width):
-			for y in range(self.height):
-				if self.get(x, y):
-					self.grids[d_ind][x][y] |= d_mask
-				else:
-					self.grids[d_ind][x][y] &= ~d_mask
+		self.generations[self.get_target()] = self.generations[self.get_current()]
+		self.copy_region(self.get_current(), self.get_target(), 0, 0, self.width, self.height)
+	
+	# Returns the live cells of the current frame within a rectangle, a row at a time, as (y, xs) relative to its top left corner. Rows with no live cells are skipped.
+	def live_rows(self, left, top, right, bottom):
+		columns = self.get_columns(self.get_current())[left:right]
+		
+		for y in range(top, bottom):
+			xs = [x for x, column in enumerate(columns) if column >> y & 1]
+			if xs:
+				yield y - top, xs
 	
-	# Crops the pattern currently being displayed and saves it to a file.
+	# Crops the pattern currently being displayed and saves it to a file, in the format given by its extension. See CGOL_Patterns.py
 	def save(self, fn):
 		if os.name == "nt" and fn[0] == "/":
 			fn = fn[1:]
 		
 		# Find the bounding box of the current pattern
-		left = 0
-		for x in range(self.width):
-			has_bits = False
-			for y in range(self.height):
-				if self.get(x, y):
-					has_bits = True
-					left = x
-					break
-			
-			if has_bits:
-				break
+		box = self.bounding_box()
+		if box is None:
+			box = (0, 0, 1, 1)
+		
+		left, top, right, bottom = box
+		
+		print("Saving (%d, %d) - (%d, %d)" % (left, top, right - 1, bottom - 1))
 		
-		right = 0
-		for x in range(self.width-1, -1, -1):
-			has_bits = False
-			for y in range(self.height):
-				if self.get(x, y):
-					has_bits = True
-					right = x
-					break
+		CGOL_Patterns.write(fn, right - left, bottom - top, self.live_rows(left, top, right, bottom))
+	
+	# Opens a file and stores the pattern in this program's
+	# If a pattern library is given, the pattern is read through its cache. See CGOL_Patterns.pattern_library
+	def open(self, fn, library=None):
+		if os.name == "nt" and fn[0] == "/":
+			fn = fn[1:]
+		
+		try:
+			if library is None:
+				self.pattern = CGOL_Patterns.read(fn)
+			else:
+				self.pattern = library.load(fn)
+		
+		except (OSError, ValueError, KeyError):
+			print("Aborting Open: Invalid File.")
 			
-			if has_bits:
-				break
+			self.pattern = []
+			return
 		
-		top = 0
-		for y in range(self.height):
-			has_bits = False
-			for x in range(self.width):
-				if self.get(x, y):
-					has_bits = True
-					top = y
-					break
+		self.is_placing = True
+
+	# Place the opened pattern onto the next grid at the given position.
+	# If do_erase, this will overwrite live pixels in the grid with dead pixels in the pattern
+	def place(self, x, y, do_erase):
+		self.clone()
+		self.blit_pattern(self.get_target(), self.pattern, x, y, do_erase)
+		
+		self.set_next_to_latest()
+		self.frame_ready = True
+
+# A grid with no edges, which stores each frame as a set of live cell coordinates.
+# Memory use and step time scale with the population rather than the area, so patterns can travel as far as they like.
+# The width and height only give the region that randomize() fills, and coordinates may be negative.
+class CGOL_sparse_grid(CGOL_grid):
+	is_unbounded = True
+	
+	def __init__(self, width, height, depth=60):
+		super().__init__(width, height, 0)
+		
+		# Each frame is a set of its own, in place of the bit-packed history ring.
+		self.frames = None
+		self.depth = depth
+		self.grids = [set() for i in range(depth)]
+		self.generations = [UNWRITTEN] * depth
+		self.generations[self.current] = 0
+		
+		self.engine = CGOL_Engines.sparse_engine()
+	
+	def get(self, x, y):
+		ind = self.get_current()
+		
+		return (x, y) in self.grids[ind]
+	
+	def set(self, x, y, record=True):
+		ind = self.get_current()
+		
+		if (x, y) not in self.grids[ind]:
+			if record:
+				self.append_event(("PIX", x, y, False, True))
 			
-			if has_bits:
-				break
+			self.update_cell_stats(x, y, True)
 		
-		bottom = 0
-		for y in range(self.height-1, -1, -1):
-			has_bits = False
-			for x in range(self.width):
-				if self.get(x, y):
-					has_bits = True
-					bottom = y
-					break
+		self.grids[ind].add((x, y))
+		self.revision += 1
+	
+	def reset(self, x, y, record=True):
+		ind = self.get_current()
+		
+		if (x, y) in self.grids[ind]:
+			if record:
+				self.append_event(("PIX", x, y, True, False))
 			
-			if has_bits:
-				break
+			self.update_cell_stats(x, y, False)
+		
+		self.grids[ind].discard((x, y))
+		self.revision += 1
+	
+	def flip(self, x, y, record=True):
+		if self.get(x, y):
+			self.reset(x, y, record)
+		else:
+			self.set(x, y, record)
+	
+	# The cells that differ between two frames, as the x and y of each packed into an array of 64 bit integers.
+	def frame_delta(self, a, b):
+		return array.array("q", itertools.chain.from_iterable(self.grids[a] ^ self.grids[b])).tobytes()
+	
+	def apply_delta(self, src, dst, delta):
+		coords = array.array("q")
+		coords.frombytes(delta)
+		
+		self.grids[dst] = self.grids[src] ^ set(zip(coords[0::2], coords[1::2]))
+		self.frame_stats.pop(dst, None)
+		
+		self.frames_written += 1
+		self.revision += 1
+	
+	def snapshot_frame(self, frame):
+		return array.array("q", itertools.chain.from_iterable(self.grids[frame])).tobytes()
+	
+	def restore_frame(self, frame, snapshot):
+		coords = array.array("q")
+		coords.frombytes(snapshot)
 		
-		print("Saving (%d, %d) - (%d, %d)" % (left, top, right, bottom))
+		self.grids[frame] = set(zip(coords[0::2], coords[1::2]))
+		self.frame_stats.pop(frame, None)
+		
+		self.frames_written += 1
+		self.revision += 1
+	
+	# The region operations work as they do on a CGOL_grid, except that regions aren't clipped, and may be infinite where that makes sense.
+	def clip_region(self, x0, y0, x1, y1):
+		if x0 >= x1 or y0 >= y1:
+			return None
+		
+		return x0, y0, x1, y1
+	
+	# Returns the live cells of a frame outside a region.
+	def outside_region(self, frame, x0, y0, x1, y1):
+		return {(x, y) for x, y in self.grids[frame] if not (x0 <= x < x1 and y0 <= y < y1)}
+	
+	def copy_region(self, src, dst, x0, y0, x1, y1):
+		if (x0, y0, x1, y1) == (-math.inf, -math.inf, math.inf, math.inf):
+			self.grids[dst] = set(self.grids[src])
+			self.copy_stats(src, dst)
 		
-		with open(fn, "w") as fout:
-			fout.write(str(right - left + 1) + " ")
-			fout.write(str(bottom - top + 1) + " ")
+		else:
+			live = self.outside_region(dst, x0, y0, x1, y1)
+			live.update((x, y) for x, y in self.grids[src] if x0 <= x < x1 and y0 <= y < y1)
 			
-			for y in range(top, bottom+1):
-				for x in range(left, right+1):
-					fout.write("1" if self.get(x, y) else "0")
+			self.grids[dst] = live
+			self.frame_stats.pop(dst, None)
+		
+		self.revision += 1
 	
-	# Opens a file and stores the pattern in this program's
-	def open(self, fn):
-		if os.name == "nt" and fn[0] == "/":
-			fn = fn[1:]
+	def fill_region(self, frame, x0, y0, x1, y1, alive):
+		live = self.outside_region(frame, x0, y0, x1, y1)
+		
+		if alive:
+			live.update(itertools.product(range(x0, x1), range(y0, y1)))
+		
+		self.grids[frame] = live
+		self.frame_stats.pop(frame, None)
+		
+		self.revision += 1
+	
+	def randomize_region(self, frame, x0, y0, x1, y1, density=RANDOM_DENSITY, rng=random):
+		live = self.outside_region(frame, x0, y0, x1, y1)
+		
+		# One bit per cell, column by column. Only the live cells are visited.
+		height = max(y1 - y0, 0)
+		bits = bin(random_bits(max(x1 - x0, 0) * height, density, rng))[:1:-1]
 		
-		self.pattern = []
+		i = bits.find("1")
+		while i >= 0:
+			live.add((x0 + i // height, y0 + i % height))
+			i = bits.find("1", i + 1)
 		
-		with open(fn, "r") as fin:
-			# Get width and height
-			dat = fin.read().split(" ")
+		self.grids[frame] = live
+		self.frame_stats.pop(frame, None)
+		
+		self.revision += 1
+	
+	# Returns the cells that flipped, as column_changes() does.
+	def blit_pattern(self, frame, pattern, x, y, do_erase):
+		flipped = set()
+		if not pattern or not pattern[0]:
+			return flipped
+		
+		live = self.grids[frame]
+		
+		# Visit only the cells of the pattern that can change something: the live ones, and the dead ones if erasing.
+		for a, column in enumerate(pattern):
+			column = bytes(column)
 			
-			try:
-				pat_width = int(dat[0])
-				pat_height = int(dat[1])
+			b = column.find(1)
+			while b >= 0:
+				if (x + a, y + b) not in live:
+					live.add((x + a, y + b))
+					flipped.add((x + a, y + b))
 				
-			except ValueError:
-				print("Aborting Open: Invalid File.")
+				b = column.find(1, b + 1)
 			
-			try:
-				for x in range(pat_width):
-					self.pattern.append([])
+			b = column.find(0) if do_erase else -1
+			while b >= 0:
+				if (x + a, y + b) in live:
+					live.discard((x + a, y + b))
+					flipped.add((x + a, y + b))
+				
+				b = column.find(0, b + 1)
+		
+		self.update_stats(frame, frame, flipped)
+		
+		self.revision += 1
+		
+		return flipped
+	
+	# The cells that differ between two frames.
+	def column_changes(self, source, target, changed):
+		return self.grids[source] ^ self.grids[target]
+	
+	def measure_frame(self, frame):
+		live = self.grids[frame]
+		
+		box = None
+		if live:
+			xs = [x for x, y in live]
+			ys = [y for x, y in live]
+			
+			box = (min(xs), min(ys), max(xs) + 1, max(ys) + 1)
+		
+		self.frame_stats[frame] = (len(live), box)
+		
+		return len(live), box
+	
+	# The bounding box grows to hold the cells that were born, and is measured again if a cell on its edge died.
+	def update_stats(self, source, target, changes):
+		old = self.frame_stats.get(source)
+		if old is None:
+			self.frame_stats.pop(target, None)
+			return
+		
+		live = self.grids[target]
+		
+		box = old[1]
+		left, top, right, bottom = box if box is not None else (math.inf, math.inf, -math.inf, -math.inf)
+		for x, y in changes:
+			if (x, y) in live:
+				left, top, right, bottom = min(left, x), min(top, y), max(right, x + 1), max(bottom, y + 1)
+			
+			elif x in (left, right - 1) or y in (top, bottom - 1):
+				self.measure_frame(target)
+				return
+		
+		self.frame_stats[target] = (len(live), (left, top, right, bottom) if live else None)
+	
+	# The hash of a frame combines a hash of each live cell with XOR, so the hash of the next frame only needs the cells that flipped.
+	def get_hash(self, frame):
+		cached = self.hashes.get(frame)
+		if cached is not None and cached[0] == self.revision:
+			return cached[1]
+		
+		h = functools.reduce(operator.xor, map(cell_hash, self.grids[frame]), 0)
+		self.hashes[frame] = (self.revision, h)
+		
+		return h
+	
+	def update_hash(self, source, target, changes):
+		cached = self.hashes.get(source)
+		if cached is None or cached[0] != self.revision:
+			return
+		
+		self.hashes[target] = (self.revision, functools.reduce(operator.xor, map(cell_hash, changes), cached[1]))
+	
+	def frames_equal(self, a, b):
+		return self.grids[a] == self.grids[b]
+	
+	# Snapshots list the cells in no particular order.
+	def frame_equals_snapshot(self, frame, snapshot):
+		coords = array.array("q")
+		coords.frombytes(snapshot)
+		
+		return self.grids[frame] == set(zip(coords[0::2], coords[1::2]))
+	
+	# Each frame is written as the number of its live cells, after the generations, then the x and y of every cell of every frame follow. See CGOL_grid.save_snapshot()
+	def save_snapshot(self, fn, is_periodic):
+		if os.name == "nt" and fn[0] == "/":
+			fn = fn[1:]
+		
+		flags = SNAPSHOT_UNBOUNDED | (SNAPSHOT_PERIODIC if is_periodic else 0)
+		offset = SNAPSHOT_HEADER.size + 16 * self.depth
+		
+		with open(fn + ".tmp", "wb") as fout:
+			fout.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, self.width, self.height, self.depth, self.current, self.latest, self.budget, offset))
+			fout.write(array.array("q", self.generations).tobytes())
+			fout.write(array.array("q", map(len, self.grids)).tobytes())
+			
+			for grid in self.grids:
+				fout.write(array.array("q", itertools.chain.from_iterable(grid)).tobytes())
+		
+		os.replace(fn + ".tmp", fn)
+		
+		print("Saved snapshot of %d frames to %s" % (self.depth, fn))
+	
+	def load_snapshot(self, fn):
+		if os.name == "nt" and fn[0] == "/":
+			fn = fn[1:]
+		
+		try:
+			with open(fn, "rb") as fin:
+				with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+					header = self.read_snapshot_header(mm, fn)
+					if header is None:
+						return None
+					
+					magic, version, flags, width, height, depth, current, latest, budget, offset = header
+					
+					counts = array.array("q")
+					counts.frombytes(mm[SNAPSHOT_HEADER.size:offset])
+					
+					if len(counts) != 2 * depth or len(mm) != offset + 16 * sum(counts[depth:]) or current >= depth or latest >= depth:
+						print("Aborting Load: %s is truncated or corrupt." % fn)
+						return None
 					
-					for y in range(pat_height):
-						ind = y*pat_width + x
+					generations = counts[:depth].tolist()
+					
+					grids = []
+					for count in counts[depth:]:
+						coords = array.array("q")
+						coords.frombytes(mm[offset:offset + 16 * count])
+						offset += 16 * count
 						
-						self.pattern[x].append(1 if dat[2][ind] == "1"  else 0)
-				
-			except IndexError:
-				print("Aborting Open: Invalid File.")
+						grids.append(set(zip(coords[0::2], coords[1::2])))
 		
-		self.is_placing = True
-
-	# Place the opened pattern onto the next grid at the given position.
-	# If do_erase, this will overwrite live pixels in the grid with dead pixels in the pattern
-	def place(self, x, y, do_erase):
-		ind, bit = self.get_target()
-		mask = 1 << bit
+		except (OSError, ValueError, struct.error) as e:
+			print("Aborting Load: %s could not be read (%s)." % (fn, e))
+			return None
 		
-		pat_width = len(self.pattern)
-		pat_height = len(self.pattern[0])
+		self.width = width
+		self.height = height
+		self.depth = depth
+		self.grids = grids
+		self.generations = generations
 		
-		self.clone()
+		self.current = current
+		self.latest = latest
+		
+		self.forget_history()
+		
+		print("Loaded snapshot of %d frames from %s" % (depth, fn))
+		
+		return bool(flags & SNAPSHOT_PERIODIC)
+	
+	# The grid has no edges to move.
+	def resize(self, left, top, right, bottom, record=True):
+		print("Aborting resize; the grid is unbounded.")
+		return False
+	
+	def can_resize_during_render(self, left, top, right, bottom):
+		return True
+	
+	def set_engine(self, name, **options):
+		print("Unbounded grids always use the sparse engine.")
+	
+	# Only the region within the width and height is randomized. Cells beyond it are kept.
+	def randomize(self, density=RANDOM_DENSITY, seed=None):
+		self.begin_write()
+		
+		ind = self.get_target()
+		self.generations[ind] = 0
+		
+		self.grids[ind] = set(self.grids[self.get_current()])
+		self.randomize_region(ind, 0, 0, self.width, self.height, density, random if seed is None else random.Random(seed))
+		self.measure_frame(ind)
+		
+		self.set_next_to_latest()
+		self.frame_ready = True
+	
+	def clear(self):
+		self.begin_write()
+		
+		ind = self.get_target()
+		self.generations[ind] = 0
 		
-		for a in range(max(-x, 0), min(pat_width, self.width-x)):
-			for b in range(max(-y, 0), min(pat_height, self.height-y)):
-				if self.pattern[a][b]:
-					self.grids[ind][x+a][y+b] |= mask
-				elif do_erase:
-					self.grids[ind][x+a][y+b] &= ~mask
+		self.fill_region(ind, -math.inf, -math.inf, math.inf, math.inf, False)
+		self.frame_stats[ind] = (0, None)
 		
 		self.set_next_to_latest()
 		self.frame_ready = True
+	
+	def clone(self):
+		self.begin_write()
+		
+		self.generations[self.get_target()] = self.generations[self.get_current()]
+		self.copy_region(self.get_current(), self.get_target(), -math.inf, -math.inf, math.inf, math.inf)
+	
+	def advance_hashlife(self, window, n):
+		cells = self.hashlife.advance_cells(list(self.grids[self.get_current()]), n, window)
+		if cells is None:
+			return False
+		
+		self.grids[self.get_target()] = set(cells)
+		
+		return True
+	
+	def cell_buffer(self, x0, y0, x1, y1, stride):
+		live = self.grids[self.get_current()]
+		
+		buf = bytearray(stride * (x1 - x0))
+		
+		# Only visit the squares that are alive, or the squares that are visible, whichever is fewer.
+		if len(live) < (x1 - x0) * (y1 - y0):
+			for x, y in live:
+				if x0 <= x < x1 and y0 <= y < y1:
+					buf[(x - x0) * stride + y - y0] = CGOL_Render.LIVE
+		else:
+			for x in range(x0, x1):
+				offset = (x - x0) * stride - y0
+				for y in range(y0, y1):
+					if (x, y) in live:
+						buf[offset + y] = CGOL_Render.LIVE
+		
+		return buf
+	
+	def block_counts(self, k, bx0, by0, bx1, by1, stride):
+		live = self.grids[self.get_current()]
+		
+		counts = {}
+		for x, y in live:
+			bx, by = x // k, y // k
+			if bx0 <= bx < bx1 and by0 <= by < by1:
+				counts[(bx, by)] = counts.get((bx, by), 0) + 1
+		
+		buf = bytearray(stride * (bx1 - bx0))
+		for (bx, by), n in counts.items():
+			buf[(bx - bx0) * stride + by - by0] = min(n, CGOL_Render.MAX_COUNT)
+		
+		return buf
+	
+	def live_rows(self, left, top, right, bottom):
+		rows = {}
+		for x, y in self.grids[self.get_current()]:
+			if left <= x < right and top <= y < bottom:
+				rows.setdefault(y - top, []).append(x - left)
+		
+		for y in sorted(rows):
+			yield y, sorted(rows[y])
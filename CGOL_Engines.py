@@ -0,0 +1,919 @@
+import atexit
+import multiprocessing
+import os
+
+from multiprocessing import shared_memory
+
+# NumPy is optional. Engines that need it are only offered when it can be imported.
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+# Each engine reads the currently rendered frame of a CGOL_grid and writes the following generation into the frame returned by get_target().
+# step() returns True if the generation was completed, or False if it was aborted because window.is_halting was set.
+# The engine never touches latest/current/frame_ready. That bookkeeping is done by CGOL_grid.step().
+# After a step, changed_columns is the set of columns in which the new frame differs from the current one, or None if that isn't known. The renderer uses it to repaint only those columns, and the grid to update the population, bounding box and hash of the new frame without reading all of it.
+
+# The width of the strips of columns that the numpy and bitwise engines skip when nothing near them changed. See tile_tracker
+TILE_SIZE = 16
+
+# Splits the board into tiles, which are strips of tile_size columns, and works out which tiles an engine has to compute, from the tiles that changed in the steps before.
+# If nothing near a tile changed last generation, it's copied forward from the current frame. If nothing near it changed compared to two generations ago, it's oscillating with period 2 (blinkers, mostly) and is copied from the previous frame.
+# The engine keeps the previous frame, only writes the columns of the tiles it computes or copies from the previous frame, and reports which of them changed. See update()
+class tile_tracker:
+	def __init__(self, tile_size=TILE_SIZE):
+		self.tile_size = tile_size
+		
+		# The sets of tiles that differ from 1 and 2 generations ago, as of the last step.
+		self.changed = None
+		self.changed2 = None
+		
+		# The tiles that the current step carries forward from the current frame.
+		self.still = None
+		
+		# The (frame index, grid revision, width, height, is_periodic) that the last step produced.
+		self.key = None
+		
+		# The number of consecutive steps since the change sets were last discarded. After one, the engine's previous frame is usable.
+		self.streak = 0
+	
+	# Get the set of tiles that are within one tile of any in tiles.
+	def near(self, tiles, count, is_periodic):
+		near = set()
+		for t in tiles:
+			for a in (t-1, t, t+1):
+				if is_periodic:
+					near.add(a % count)
+				elif 0 <= a < count:
+					near.add(a)
+		
+		return near
+	
+	# Returns (runs, previous), the runs of columns to compute and the runs to copy from the previous frame, each as (x0, x1). Every other column is copied from the current frame.
+	# The number of tiles, and of tiles computed, go to the counters "tiles" and "active_tiles" of the grid's instrumentation.
+	def plan(self, cgol, is_periodic):
+		width = cgol.width
+		size = self.tile_size
+		count = (width + size - 1) // size
+		
+		# Anything could have happened since the last step, so compute everything.
+		if self.key != (cgol.current, cgol.revision, width, cgol.height, is_periodic):
+			self.streak = 0
+		
+		everything = set(range(count))
+		active = self.near(self.changed, count, is_periodic) if self.streak >= 1 else everything
+		active2 = self.near(self.changed2, count, is_periodic) if self.streak >= 2 else everything
+		
+		self.still = everything - active
+		
+		if cgol.stats.enabled:
+			cgol.stats.count("tiles", count)
+			cgol.stats.count("active_tiles", len(active & active2))
+		
+		return self.runs(active & active2, width), self.runs(active - active2, width)
+	
+	# Merge neighboring tiles into runs of columns.
+	def runs(self, tiles, width):
+		runs = []
+		for t in sorted(tiles):
+			x0, x1 = t * self.tile_size, min((t+1) * self.tile_size, width)
+			
+			if runs and runs[-1][1] == x0:
+				runs[-1] = (runs[-1][0], x1)
+			else:
+				runs.append((x0, x1))
+		
+		return runs
+	
+	# Called after a step into frame target, with the columns that differ from the current frame, and the computed columns that differ from the previous frame, or None if there wasn't one.
+	# A tile carried forward from the current frame differs from the previous one if it changed last step. One copied from the previous frame doesn't.
+	def update(self, cgol, target, is_periodic, changed, changed2):
+		still_changed = self.still & self.changed if self.streak >= 1 else set()
+		
+		self.changed = {x // self.tile_size for x in changed}
+		self.changed2 = None if changed2 is None else {x // self.tile_size for x in changed2} | still_changed
+		
+		self.key = (target, cgol.revision, cgol.width, cgol.height, is_periodic)
+		self.streak = self.streak + 1 if changed2 is not None else 1
+	
+	# Forget the change sets, e.g. because a step was aborted.
+	def reset(self):
+		self.key = None
+		self.streak = 0
+
+# The original engine. Visits every cell in pure Python.
+class python_engine:
+	name = "python"
+	changed_columns = None
+	
+	def step(self, cgol, window, is_periodic):
+		current = cgol.get_current()
+		target = cgol.get_target()
+		
+		width = cgol.width
+		height = cgol.height
+		
+		# Unpack the current frame to one byte per cell, and build each new column the same way.
+		src = [cgol.get_cells(current, x) for x in range(width)]
+		dst = bytearray(height)
+		
+		self.changed_columns = set()
+		
+		# Separate loops for periodic vs finite grids helps performance
+		if is_periodic:
+			# For each tile...
+			for x in range(width):
+				
+				# In between columns, check if we should abort
+				if window.is_halting:
+					print("Halting simulation thread.")
+					window.is_halting = False
+					return False
+				
+				for y in range(height):
+					neighbors = 0
+					
+					# For each neighbor of this tile...
+					for a in range(x-1, x+2):
+						for b in range(y-1, y+2):
+							# Don't count this cell as its own neighbor.
+							if (a == x and b == y):
+								continue
+							
+							# Count the neighbors
+							if src[a % width][b % height]:
+								neighbors+=1
+								
+								if neighbors > 3:
+									break
+						
+						if neighbors > 3:
+							break
+					
+					# Apply CGoL rules
+					if neighbors < 2 or neighbors > 3 or (neighbors == 2 and not src[x][y]):
+						dst[y] = 0
+					
+					else:
+						dst[y] = 1
+				
+				cgol.set_cells(target, x, dst)
+				
+				if dst != src[x]:
+					self.changed_columns.add(x)
+		
+		else:
+			# For each tile...
+			for x in range(width):
+				
+				# In between columns, check if we should abort
+				if window.is_halting:
+					print("Halting simulation thread.")
+					window.is_halting = False
+					return False
+				
+				for y in range(height):
+					neighbors = 0
+					
+					# For each neighbor of this tile...
+					for a in range(max(x-1, 0), min(x+2, width)):
+						for b in range(max(y-1, 0), min(y+2, height)):
+							# Don't count this cell as its own neighbor.
+							if (a == x and b == y):
+								continue
+							
+							# Count the neighbors
+							if src[a][b]:
+								neighbors+=1
+								
+								if neighbors > 3:
+									break
+						
+						if neighbors > 3:
+							break
+					
+					# Apply CGoL rules
+					if neighbors < 2 or neighbors > 3 or (neighbors == 2 and not src[x][y]):
+						dst[y] = 0
+					
+					else:
+						dst[y] = 1
+				
+				cgol.set_cells(target, x, dst)
+				
+				if dst != src[x]:
+					self.changed_columns.add(x)
+		
+		return True
+
+# Computes each generation with whole-array neighbor sums.
+# The most recently generated frame is kept as a NumPy array, so consecutive steps only pay for unpacking the history ring when the grid has been edited in between.
+# Only the tiles where something is happening are computed. See tile_tracker
+class numpy_engine:
+	name = "numpy"
+	changed_columns = None
+	
+	def __init__(self, tile_size=TILE_SIZE):
+		# The cached frame, as a width x height array of 0s and 1s, and the frame before it, or None.
+		self.frame = None
+		self.previous = None
+		
+		# The (frame index, grid revision) that the cached frame corresponds to.
+		self.frame_key = None
+		
+		self.tiles = tile_tracker(tile_size)
+	
+	# Unpack the currently rendered frame from the history ring.
+	def get_frame(self, cgol):
+		if self.frame_key == (cgol.current, cgol.revision) and self.frame.shape == (cgol.width, cgol.height):
+			return self.frame
+		
+		packed = np.frombuffer(cgol.frames, np.uint8, cgol.frame_bytes, cgol.frame_offset(cgol.get_current())).reshape(cgol.width, cgol.col_bytes)
+		
+		return np.unpackbits(packed, axis=1, count=cgol.height, bitorder="little")
+	
+	# Count the live neighbors of every cell of a block of columns, whose first and last columns are only there as neighbors. The result is two columns narrower.
+	def count_neighbors(self, block, is_periodic):
+		if is_periodic:
+			# Sum the rows above and below, then sum that with its left and right neighbors.
+			vert = block + np.roll(block, 1, axis=1) + np.roll(block, -1, axis=1)
+		
+		else:
+			# Everything beyond the edge of the grid is dead.
+			padded = np.pad(block, ((0, 0), (1, 1)))
+			vert = padded[:, :-2] + padded[:, 1:-1] + padded[:, 2:]
+		
+		return vert[:-2] + vert[1:-1] + vert[2:] - block[1:-1]
+	
+	# Returns columns x0 to x1 of a frame, with the column on either side, which is the one on the other side of the grid or dead beyond its edges.
+	def get_block(self, frame, x0, x1, is_periodic):
+		if is_periodic:
+			return frame.take(range(x0 - 1, x1 + 1), axis=0, mode="wrap")
+		
+		block = frame[max(x0 - 1, 0):x1 + 1]
+		if x0 == 0 or x1 == len(frame):
+			block = np.pad(block, ((int(x0 == 0), int(x1 == len(frame))), (0, 0)))
+		
+		return block
+	
+	def step(self, cgol, window, is_periodic):
+		current = cgol.get_current()
+		target = cgol.get_target()
+		
+		frame = self.get_frame(cgol)
+		runs, copies = self.tiles.plan(cgol, is_periodic)
+		
+		# Start from the current frame, and fill in the tiles that change.
+		nxt = frame.copy()
+		
+		for x0, x1 in copies:
+			nxt[x0:x1] = self.previous[x0:x1]
+		
+		for x0, x1 in runs:
+			block = self.get_block(frame, x0, x1, is_periodic)
+			neighbors = self.count_neighbors(block, is_periodic)
+			
+			# Apply CGoL rules
+			nxt[x0:x1] = (neighbors == 3) | ((neighbors == 2) & (block[1:-1] == 1))
+		
+		# Check if we should abort before anything is written to the history ring.
+		if window.is_halting:
+			print("Halting simulation thread.")
+			window.is_halting = False
+			self.tiles.reset()
+			return False
+		
+		# The target frame starts as a copy of the current one, then the columns that were computed or copied are packed into it.
+		# Columns may have room for more rows than the grid has. See CGOL_grid.reserve()
+		cgol.frames[cgol.frame_slice(target)] = cgol.frames[cgol.frame_slice(current)]
+		
+		self.changed_columns = set()
+		changed2 = [] if self.tiles.streak >= 1 else None
+		
+		for x0, x1 in sorted(runs + copies):
+			packed = np.packbits(nxt[x0:x1], axis=1, bitorder="little")
+			if packed.shape[1] < cgol.col_bytes:
+				packed = np.pad(packed, ((0, 0), (0, cgol.col_bytes - packed.shape[1])))
+			
+			offset = cgol.frame_offset(target) + x0 * cgol.col_bytes
+			cgol.frames[offset:offset + packed.size] = packed.tobytes()
+			
+			self.changed_columns.update((x0 + np.flatnonzero((nxt[x0:x1] != frame[x0:x1]).any(axis=1))).tolist())
+		
+		# The previous frame is only known if the current one was cached from the last step.
+		if changed2 is not None:
+			for x0, x1 in runs:
+				changed2 += (x0 + np.flatnonzero((nxt[x0:x1] != self.previous[x0:x1]).any(axis=1))).tolist()
+		
+		self.tiles.update(cgol, target, is_periodic, self.changed_columns, changed2)
+		
+		# The new frame will be the current frame once the mainloop advances to it.
+		self.previous = frame
+		self.frame = nxt
+		self.frame_key = (target, cgol.revision)
+		
+		return True
+
+# Reads each column of the board as a single Python integer, with bit y holding cell y, and computes whole columns at once with bit-sliced adders.
+# Needs nothing beyond the standard library. Only the tiles where something is happening are computed. See tile_tracker
+class bitwise_engine:
+	name = "bitwise"
+	changed_columns = None
+	
+	def __init__(self, tile_size=TILE_SIZE):
+		# The cached frame as a list of packed columns, the frame before it, and the (frame index, grid revision) the cached frame corresponds to.
+		self.columns = None
+		self.previous = None
+		self.columns_key = None
+		
+		self.tiles = tile_tracker(tile_size)
+	
+	# Read the currently rendered frame as one integer per column.
+	def get_columns(self, cgol):
+		if self.columns_key == (cgol.current, cgol.revision) and len(self.columns) == cgol.width:
+			return self.columns
+		
+		return cgol.get_columns(cgol.get_current())
+	
+	def step(self, cgol, window, is_periodic):
+		target = cgol.get_target()
+		
+		width = cgol.width
+		height = cgol.height
+		
+		columns = self.get_columns(cgol)
+		runs, copies = self.tiles.plan(cgol, is_periodic)
+		
+		# Surround the columns with the ones that neighbor them.
+		if is_periodic:
+			padded = [columns[-1]] + columns + [columns[0]]
+		else:
+			padded = [0] + columns + [0]
+		
+		# Start from the current frame, and fill in the tiles that change.
+		new_columns = list(columns)
+		
+		for x0, x1 in copies:
+			new_columns[x0:x1] = self.previous[x0:x1]
+		
+		for x0, x1 in runs:
+			for x in range(x0, x1, 64):
+				# In between strips of columns, check if we should abort
+				if window.is_halting:
+					print("Halting simulation thread.")
+					window.is_halting = False
+					self.tiles.reset()
+					return False
+				
+				new_columns[x:min(x+64, x1)] = step_columns(padded[x:min(x+64, x1) + 2], height, is_periodic)
+		
+		# The columns are stored in the history ring in the same form. The target frame starts as a copy of the current one, and only the columns that were computed or copied are written.
+		cgol.frames[cgol.frame_slice(target)] = cgol.frames[cgol.frame_slice(cgol.get_current())]
+		
+		self.changed_columns = set()
+		for x0, x1 in runs + copies:
+			cgol.set_columns(target, new_columns[x0:x1], x0)
+			self.changed_columns.update(x for x in range(x0, x1) if new_columns[x] != columns[x])
+		
+		# The previous frame is only known if the current one was cached from the last step.
+		changed2 = None
+		if self.tiles.streak >= 1:
+			changed2 = [x for x0, x1 in runs for x in range(x0, x1) if new_columns[x] != self.previous[x]]
+		
+		self.tiles.update(cgol, target, is_periodic, self.changed_columns, changed2)
+		
+		self.previous = columns
+		self.columns = new_columns
+		self.columns_key = (target, cgol.revision)
+		
+		return True
+
+# Translation tables between bytes holding one cell each, and the characters of a binary number.
+CELLS_TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+DIGITS_TO_CELLS = bytes.maketrans(b"01", b"\x00\x01")
+
+# The eight cells held by each byte of the history ring, lowest bit first, as bytes holding one cell each. See CGOL_grid.get_cells()
+BYTE_TO_CELLS = [bytes([(b >> i) & 1 for i in range(8)]) for b in range(256)]
+
+# Compute the next generation of a strip of packed columns, as stored by the bitwise engine.
+# The first and last columns are only used as neighbors, so the result is two columns shorter.
+def step_columns(columns, height, is_periodic):
+	full = (1 << height) - 1
+	
+	# For every column, sum each cell with the cells above and below it. The sum of 3 bits is stored as a 2-bit number (ones, twos).
+	ones = []
+	twos = []
+	for c in columns:
+		if is_periodic:
+			up = ((c << 1) | (c >> (height-1))) & full
+			down = ((c >> 1) | (c << (height-1))) & full
+		else:
+			up = (c << 1) & full
+			down = c >> 1
+		
+		x = up ^ c
+		ones.append(x ^ down)
+		twos.append((up & c) | (x & down))
+	
+	new_columns = []
+	for x in range(1, len(columns)-1):
+		o_l, t_l = ones[x-1], twos[x-1]
+		o_c, t_c = ones[x], twos[x]
+		o_r, t_r = ones[x+1], twos[x+1]
+		
+		# Sum the 3x3 block, including the cell itself. First add the ones bits...
+		x1 = o_l ^ o_c
+		total_ones = x1 ^ o_r
+		carry = (o_l & o_c) | (x1 & o_r)
+		
+		# ...then count the four weight-2 bits.
+		a = t_l ^ t_c
+		b = t_r ^ carry
+		low = a ^ b
+		high = (t_l & t_c) ^ (t_r & carry) ^ (a & b)
+		any_high = (t_l & t_c) | (t_r & carry) | (a & b)
+		
+		# A cell lives if the block sums to 3, or to 4 and the cell was already alive.
+		three = total_ones & low & ~any_high
+		four = ~total_ones & ~low & high
+		
+		new_columns.append((three | (four & columns[x])) & full)
+	
+	return new_columns
+
+# Shared memory blocks opened by this worker process, by name.
+worker_buffers = {}
+
+# Runs in a worker process of the parallel engine. Steps the columns x0 to x1 of the frame in one shared buffer, writing the result into another.
+# The halo columns on either side are read straight out of the shared frame, so no exchange between workers is needed.
+def parallel_worker(args):
+	src_name, dst_name, width, height, x0, x1, is_periodic = args
+	
+	for name in (src_name, dst_name):
+		if name not in worker_buffers:
+			worker_buffers[name] = shared_memory.SharedMemory(name=name)
+	
+	src = worker_buffers[src_name].buf
+	dst = worker_buffers[dst_name].buf
+	
+	columns = []
+	for x in range(x0-1, x1+1):
+		if is_periodic:
+			x %= width
+		elif x < 0 or x >= width:
+			columns.append(0)
+			continue
+		
+		columns.append(int(bytes(src[x*height:(x+1)*height]).translate(CELLS_TO_DIGITS)[::-1], 2))
+	
+	for x, c in enumerate(step_columns(columns, height, is_periodic), x0):
+		dst[x*height:(x+1)*height] = bin(c)[2:].zfill(height)[::-1].encode().translate(DIGITS_TO_CELLS)
+	
+	return x1 - x0
+
+# Splits the board into strips of columns and steps them in a pool of worker processes, which sidesteps the GIL.
+# Frames are passed through two shared memory buffers holding one byte per cell, which swap roles after every step.
+class parallel_engine:
+	name = "parallel"
+	changed_columns = None
+	
+	def __init__(self, workers=None):
+		# The number of worker processes. Defaults to one per core.
+		self.workers = workers or os.cpu_count() or 1
+		
+		self.pool = None
+		
+		# The source and destination shared memory buffers.
+		self.buffers = None
+		
+		# The (frame index, grid revision, width, height) of the frame held in the source buffer.
+		self.frame_key = None
+		
+		atexit.register(self.close)
+	
+	# Shut down the workers and free the shared memory. The engine can't be used afterwards.
+	def close(self):
+		atexit.unregister(self.close)
+		
+		if self.pool is not None:
+			self.pool.terminate()
+			self.pool = None
+		
+		if self.buffers is not None:
+			for buf in self.buffers:
+				buf.close()
+				buf.unlink()
+			
+			self.buffers = None
+	
+	# Change the number of worker processes. Takes effect at the next step.
+	def set_workers(self, workers):
+		if self.pool is not None:
+			self.pool.terminate()
+			self.pool = None
+		
+		self.workers = workers
+	
+	def step(self, cgol, window, is_periodic):
+		current = cgol.get_current()
+		target = cgol.get_target()
+		
+		width = cgol.width
+		height = cgol.height
+		
+		# (Re)allocate the buffers if the grid changed size.
+		if self.buffers is None or self.buffers[0].size < width * height:
+			if self.buffers is not None:
+				for buf in self.buffers:
+					buf.close()
+					buf.unlink()
+			
+			self.buffers = [shared_memory.SharedMemory(create=True, size=width * height) for i in range(2)]
+			self.frame_key = None
+		
+		# The pool is started after the buffers exist, so the workers share this process's resource tracker rather than starting their own, which would unlink the buffers when they exit.
+		if self.pool is None:
+			self.pool = multiprocessing.Pool(self.workers)
+		
+		src, dst = self.buffers
+		
+		# Unless the source buffer already holds the current frame from the last step, copy it in.
+		if self.frame_key != (cgol.current, cgol.revision, width, height):
+			for x in range(width):
+				src.buf[x*height:(x+1)*height] = cgol.get_cells(current, x)
+		
+		# Use a few strips per worker, so an uneven strip doesn't leave the others idle.
+		strips = min(self.workers * 4, width)
+		bounds = [width * i // strips for i in range(strips + 1)]
+		
+		jobs = [(src.name, dst.name, width, height, bounds[i], bounds[i+1], is_periodic) for i in range(strips)]
+		self.pool.map(parallel_worker, jobs)
+		
+		# Check if we should abort before anything is written to the history ring.
+		if window.is_halting:
+			print("Halting simulation thread.")
+			window.is_halting = False
+			return False
+		
+		# Pack the new generation into the target frame.
+		for x in range(width):
+			cgol.set_cells(target, x, dst.buf[x*height:(x+1)*height])
+		
+		self.changed_columns = {x for x in range(width) if src.buf[x*height:(x+1)*height] != dst.buf[x*height:(x+1)*height]}
+		
+		# The destination now holds the frame the next step will start from.
+		self.buffers = [dst, src]
+		self.frame_key = (target, cgol.revision, width, height)
+		
+		return True
+
+# A node of the HashLife quadtree. Nodes are immutable and canonical, so two nodes are equal only if they are the same object.
+# Level 0 nodes are single cells. A node of level k is a 2^k x 2^k square made of four level k-1 quadrants.
+class hashlife_node:
+	__slots__ = ("nw", "ne", "sw", "se", "level", "population")
+	
+	def __init__(self, nw, ne, sw, se, level, population):
+		self.nw = nw
+		self.ne = ne
+		self.sw = sw
+		self.se = se
+		self.level = level
+		self.population = population
+
+# Memoized quadtree engine. Advances a pattern by 2^k generations per call of successor(), reusing the results for any square it has seen before.
+# Unlike the other engines, HashLife treats the board as part of an unbounded plane. Cells that leave the board are discarded when the result is written back.
+class hashlife_engine:
+	name = "hashlife"
+	changed_columns = None
+	
+	def __init__(self, max_nodes=1000000):
+		# Once the node cache grows past this many nodes, everything not reachable from the current pattern is evicted.
+		self.max_nodes = max_nodes
+		
+		self.off = hashlife_node(None, None, None, None, 0, 0)
+		self.on = hashlife_node(None, None, None, None, 0, 1)
+		
+		self.reset()
+	
+	# Drop every cached node and result.
+	def reset(self):
+		# Maps the four quadrants of a node to the canonical node.
+		self.nodes = {}
+		
+		# Maps (node, j) to the center of node advanced by 2^j generations.
+		self.results = {}
+		
+		# The canonical empty node of each level.
+		self.empty_nodes = [self.off]
+	
+	# Get the canonical node with these quadrants.
+	def join(self, nw, ne, sw, se):
+		key = (nw, ne, sw, se)
+		
+		node = self.nodes.get(key)
+		if node is None:
+			node = hashlife_node(nw, ne, sw, se, nw.level + 1, nw.population + ne.population + sw.population + se.population)
+			self.nodes[key] = node
+		
+		return node
+	
+	# Get the canonical empty node of this level.
+	def empty(self, level):
+		while len(self.empty_nodes) <= level:
+			e = self.empty_nodes[-1]
+			self.empty_nodes.append(self.join(e, e, e, e))
+		
+		return self.empty_nodes[level]
+	
+	# Surround a node with empty space, returning a node one level higher with the same center.
+	def expand(self, node):
+		e = self.empty(node.level - 1)
+		
+		return self.join(
+			self.join(e, e, e, node.nw),
+			self.join(e, e, node.ne, e),
+			self.join(e, node.sw, e, e),
+			self.join(node.se, e, e, e)
+		)
+	
+	# Get the center quarter of a node.
+	def center(self, node):
+		return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+	
+	# Get the center of a level 2 node after one generation, computed directly.
+	def base_case(self, node):
+		cells = []
+		for row in ((node.nw, node.ne), (node.sw, node.se)):
+			for half in ("top", "bottom"):
+				line = []
+				for quad in row:
+					if half == "top":
+						line += [quad.nw.population, quad.ne.population]
+					else:
+						line += [quad.sw.population, quad.se.population]
+				
+				cells.append(line)
+		
+		result = []
+		for y in (1, 2):
+			for x in (1, 2):
+				neighbors = 0
+				for b in range(y-1, y+2):
+					for a in range(x-1, x+2):
+						neighbors += cells[b][a]
+				
+				neighbors -= cells[y][x]
+				
+				if neighbors == 3 or (neighbors == 2 and cells[y][x]):
+					result.append(self.on)
+				else:
+					result.append(self.off)
+		
+		return self.join(*result)
+	
+	# Get the center of a level k node after 2^j generations, where j <= k-2.
+	def successor(self, node, j):
+		if node.population == 0:
+			return self.empty(node.level - 1)
+		
+		key = (node, j)
+		result = self.results.get(key)
+		if result is not None:
+			return result
+		
+		if node.level == 2:
+			result = self.base_case(node)
+		
+		else:
+			nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+			
+			# Nine overlapping level k-1 squares covering the node.
+			n00 = nw
+			n01 = self.join(nw.ne, ne.nw, nw.se, ne.sw)
+			n02 = ne
+			n10 = self.join(nw.sw, nw.se, sw.nw, sw.ne)
+			n11 = self.center(node)
+			n12 = self.join(ne.sw, ne.se, se.nw, se.ne)
+			n20 = sw
+			n21 = self.join(sw.ne, se.nw, sw.se, se.sw)
+			n22 = se
+			
+			squares = (n00, n01, n02, n10, n11, n12, n20, n21, n22)
+			
+			# At full speed, both halves of the jump advance 2^(k-3) generations. Otherwise the first half just takes the centers and the second does all of the advancing.
+			if j == node.level - 2:
+				r = [self.successor(n, j-1) for n in squares]
+				inner = j-1
+			else:
+				r = [self.center(n) for n in squares]
+				inner = j
+			
+			result = self.join(
+				self.successor(self.join(r[0], r[1], r[3], r[4]), inner),
+				self.successor(self.join(r[1], r[2], r[4], r[5]), inner),
+				self.successor(self.join(r[3], r[4], r[6], r[7]), inner),
+				self.successor(self.join(r[4], r[5], r[7], r[8]), inner)
+			)
+		
+		self.results[key] = result
+		
+		return result
+	
+	# Build a node of the given level whose top-left corner is (x0, y0) from a list of live cell coordinates inside it.
+	def build(self, level, x0, y0, cells):
+		if not cells:
+			return self.empty(level)
+		
+		if level == 0:
+			return self.on
+		
+		half = 1 << (level - 1)
+		quads = ([], [], [], [])
+		for x, y in cells:
+			quads[(2 if y >= y0 + half else 0) + (1 if x >= x0 + half else 0)].append((x, y))
+		
+		return self.join(
+			self.build(level-1, x0, y0, quads[0]),
+			self.build(level-1, x0 + half, y0, quads[1]),
+			self.build(level-1, x0, y0 + half, quads[2]),
+			self.build(level-1, x0 + half, y0 + half, quads[3])
+		)
+	
+	# Append the coordinates of every live cell in a node whose top-left corner is (x0, y0) to cells.
+	def cells(self, node, x0, y0, cells):
+		if node.population == 0:
+			return
+		
+		if node.level == 0:
+			cells.append((x0, y0))
+			return
+		
+		half = 1 << (node.level - 1)
+		self.cells(node.nw, x0, y0, cells)
+		self.cells(node.ne, x0 + half, y0, cells)
+		self.cells(node.sw, x0, y0 + half, cells)
+		self.cells(node.se, x0 + half, y0 + half, cells)
+	
+	# Evict everything not reachable from the root, if the cache has grown too big.
+	def collect(self, root):
+		if len(self.nodes) <= self.max_nodes:
+			return root
+		
+		print("HashLife cache full (%d nodes), evicting." % len(self.nodes))
+		
+		cells = []
+		level = root.level
+		self.cells(root, 0, 0, cells)
+		
+		self.reset()
+		
+		return self.build(level, 0, 0, cells)
+	
+	# Advance a node by n generations. The node keeps its center, but may grow.
+	# Returns None if the window requested a halt.
+	def advance_node(self, root, n, window):
+		j = 0
+		while n > 0:
+			if n & 1:
+				# Pad the pattern until it sits inside the center of the root and the root is big enough for a 2^j jump, then pad once more so nothing escapes during it.
+				while root.level < max(j + 2, 3) or self.center(self.center(root)).population != root.population:
+					root = self.expand(root)
+				
+				root = self.successor(self.expand(root), j)
+				root = self.collect(root)
+				
+				if window.is_halting:
+					print("Halting simulation thread.")
+					window.is_halting = False
+					return None
+			
+			n >>= 1
+			j += 1
+		
+		return root
+	
+	# Advance a list of live cell coordinates by n generations, returning the new list.
+	# Returns None if halted.
+	def advance_cells(self, live, n, window):
+		if not live:
+			return []
+		
+		left = min(x for x, y in live)
+		top = min(y for x, y in live)
+		size = max(max(x for x, y in live) - left, max(y for x, y in live) - top) + 1
+		
+		level = 1
+		while (1 << level) < size:
+			level += 1
+		
+		root = self.build(level, left, top, live)
+		
+		center_x = left + (1 << (level - 1))
+		center_y = top + (1 << (level - 1))
+		
+		root = self.advance_node(root, n, window)
+		
+		if root is None:
+			return None
+		
+		# The node grew around the same center.
+		cells = []
+		self.cells(root, center_x - (1 << (root.level - 1)), center_y - (1 << (root.level - 1)), cells)
+		
+		return cells
+	
+	# Read the current frame of the grid, advance it n generations and write the result into the target frame.
+	# Returns False if halted.
+	def advance(self, cgol, window, n):
+		current = cgol.get_current()
+		
+		live = []
+		for x in range(cgol.width):
+			for y, alive in enumerate(cgol.get_cells(current, x)):
+				if alive:
+					live.append((x, y))
+		
+		cells = self.advance_cells(live, n, window)
+		
+		if cells is None:
+			return False
+		
+		columns = [0] * cgol.width
+		
+		lost = 0
+		for x, y in cells:
+			if 0 <= x < cgol.width and 0 <= y < cgol.height:
+				columns[x] |= 1 << y
+			else:
+				lost += 1
+		
+		cgol.set_columns(cgol.get_target(), columns)
+		
+		if lost > 0:
+			print("%d cells left the board and were discarded." % lost)
+		
+		return True
+
+# Steps grids that store each frame as a set of live cell coordinates, rather than a dense array. See CGOL_sparse_grid.
+# The cost of a step depends only on the population, and the universe has no edges, so is_periodic is ignored.
+class sparse_engine:
+	name = "sparse"
+	changed_columns = None
+	
+	def step(self, cgol, window, is_periodic):
+		target = cgol.get_target()
+		
+		live = cgol.grids[cgol.get_current()]
+		
+		# Count the live neighbors of every cell that has any.
+		counts = {}
+		for i, (x, y) in enumerate(live):
+			# Every so often, check if we should abort
+			if i & 0xfff == 0 and window.is_halting:
+				print("Halting simulation thread.")
+				window.is_halting = False
+				return False
+			
+			for a in (x-1, x, x+1):
+				for b in (y-1, y, y+1):
+					if a != x or b != y:
+						counts[(a, b)] = counts.get((a, b), 0) + 1
+		
+		# Apply CGoL rules
+		cgol.grids[target] = {cell for cell, n in counts.items() if n == 3 or (n == 2 and cell in live)}
+		
+		self.changed_columns = {x for x, y in live ^ cgol.grids[target]}
+		
+		return True
+
+# All engines, in order of preference.
+engine_types = [numpy_engine, bitwise_engine, parallel_engine, python_engine]
+
+# Returns a list of the names of engines that can be used in this environment.
+def available_engines():
+	names = []
+	for engine_type in engine_types:
+		if engine_type is numpy_engine and np is None:
+			continue
+		
+		names.append(engine_type.name)
+	
+	return names
+
+# Create an engine by name. If name is None, the fastest available engine is created.
+# Any options are passed on to the engine, e.g. workers for the parallel engine.
+def create_engine(name=None, **options):
+	available = available_engines()
+	
+	if name is None:
+		name = available[0]
+	
+	if name not in available:
+		print("Engine \"%s\" is unavailable, using \"%s\" instead." % (name, available[0]))
+		name = available[0]
+		options = {}
+	
+	for engine_type in engine_types:
+		if engine_type.name == name:
+			return engine_type(**options)
@@ -1,17 +1,88 @@
 from PyQt5 import QtGui
-from PyQt5.QtCore import QSize, Qt, QUrl, QTimer, QPoint
-from PyQt5.QtWidgets import QApplication, QWidget, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, QMenu, QMenuBar, QLabel, QAction, QFileDialog, QDialog, QLineEdit
+from PyQt5.QtCore import QSize, Qt, QUrl, QTimer, QPoint, QObject, QEvent, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QWidget, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, QMenu, QMenuBar, QLabel, QAction, QFileDialog, QDialog, QLineEdit, QDockWidget, QListWidget, QListWidgetItem
 
 import math
 import os
 import time
 import threading
 
+import CGOL_Engines
+import CGOL_History
+import CGOL_Patterns
+import CGOL_Render
+
+# The file types offered by the open and save dialogs.
+PATTERN_FILTER = "Pattern Files (%s);;All Files (*)" % " ".join("*" + ext for ext in CGOL_Patterns.EXTENSIONS)
+SNAPSHOT_FILTER = "Snapshots (*.cgol);;All Files (*)"
+
+# Events from the user, after which the mainloop runs in case they queued something. See loop_scheduler
+INPUT_EVENTS = {QEvent.MouseButtonPress, QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick, QEvent.MouseMove, QEvent.Wheel, QEvent.KeyPress, QEvent.KeyRelease, QEvent.Resize}
+
+# How often the mainloop runs to show the progress of a batch of steps, in seconds.
+PROGRESS_INTERVAL = 0.1
+
 # Dummy thread for initializing variables for which is_alive() will be called.
 class dummy_thread():
 	def is_alive(self):
 		return False
 
+# A thread that wakes the mainloop when it's done. See loop_scheduler
+# It counts as finished as soon as its target returns, so the mainloop can start the next thread when woken, without waiting for this one to exit.
+class loop_thread(threading.Thread):
+	def __init__(self, window, target, args=()):
+		super().__init__(target=target, args=args)
+		
+		self.window = window
+		self.finished = False
+	
+	def run(self):
+		try:
+			super().run()
+		finally:
+			self.finished = True
+			self.window.wake()
+	
+	def is_alive(self):
+		return not self.finished and super().is_alive()
+
+# Runs the mainloop only when there's something for it to do, instead of polling.
+# It's woken by finished threads, by input events, and by anything that calls CGOL_Window.wake(). The mainloop returns how long until it next needs to run, or None to sleep until woken.
+class loop_scheduler(QObject):
+	# Emitted to run the mainloop soon. It may be emitted from any thread, and Qt delivers it to the GUI thread.
+	woken = pyqtSignal()
+	
+	def __init__(self, loop):
+		super().__init__()
+		
+		self.loop = loop
+		
+		self.timer = QTimer(self)
+		self.timer.setSingleShot(True)
+		self.timer.timeout.connect(self.run)
+		
+		self.woken.connect(self.run_soon)
+	
+	def wake(self):
+		self.woken.emit()
+	
+	def run_soon(self):
+		self.timer.start(0)
+	
+	def run(self):
+		delay = self.loop()
+		
+		# If the mainloop woke itself up, it runs again straight away.
+		if delay is not None and not self.timer.isActive():
+			self.timer.start(math.ceil(max(delay, 0) * 1000))
+	
+	# Installed on the application, to see every event.
+	def eventFilter(self, obj, event):
+		if event.type() in INPUT_EVENTS:
+			self.run_soon()
+		
+		return False
+
 # Defines a label widget with overloaded event handlers
 class click_labal(QLabel):
 	def __init__(self, parent):
@@ -39,8 +110,13 @@ class click_labal(QLabel):
 		w2 = rect.width() / 2 / parent.cam.s
 		h2 = rect.height() / 2 / parent.cam.s
 		
-		x = min(max(math.floor(x / parent.cam.s + parent.cam.x - w2), 0), parent.cgol.width-1)
-		y = min(max(math.floor(y / parent.cam.s + parent.cam.y - h2), 0), parent.cgol.height-1)
+		x = math.floor(x / parent.cam.s + parent.cam.x - w2)
+		y = math.floor(y / parent.cam.s + parent.cam.y - h2)
+		
+		# Clamp to the edges of the grid, if it has any.
+		if not parent.cgol.is_unbounded:
+			x = min(max(x, 0), parent.cgol.width-1)
+			y = min(max(y, 0), parent.cgol.height-1)
 		
 		return x, y
 	
@@ -157,7 +233,8 @@ class click_labal(QLabel):
 		else:
 			parent.proxy_cam.s *= 1 / 0.9
 		
-		parent.proxy_cam.s = min(max(parent.proxy_cam.s, 5), 30)
+		# Beyond one pixel per square, each pixel shows a block of squares.
+		parent.proxy_cam.s = min(max(parent.proxy_cam.s, 1 / CGOL_Render.MAX_BLOCK_SIZE), 30)
 		
 		parent.render_queued = True
 
@@ -279,6 +356,141 @@ class resize_diag(QDialog):
 		print("Canceling Resize.")
 		self.setParent(None)
 
+# Defines the dialog used to ask for a number of generations to simulate, or a generation to go to.
+# The number is stored in the grid attribute named by queue, for the mainloop to pick up. It must be at least minimum.
+class generations_diag(QDialog):
+	def __init__(self, parent, title, whats_this, queue, minimum=1, label="Generations:"):
+		super().__init__(parent)
+		
+		self.queue = queue
+		self.minimum = minimum
+		
+		self.setModal(False)
+		
+		self.setWindowTitle(title)
+		self.setMinimumSize(QSize(200, 100))
+		self.setWhatsThis(whats_this)
+		
+		layout = QVBoxLayout()
+		
+		# Generations layout
+		gens_layout = QHBoxLayout()
+		
+		gens_label = QLabel(label)
+		self.gens_text = QLineEdit()
+		
+		gens_layout.addWidget(gens_label)
+		gens_layout.addWidget(self.gens_text)
+		
+		# Return buttons layout
+		finish_layout = QHBoxLayout()
+		
+		okay = QPushButton("Okay")
+		okay.clicked.connect(self.okay)
+		
+		cancel = QPushButton("Cancel")
+		cancel.clicked.connect(self.cancel)
+		
+		finish_layout.addStretch()
+		finish_layout.addWidget(okay)
+		finish_layout.addWidget(cancel)
+		
+		layout.addLayout(gens_layout)
+		layout.addStretch()
+		layout.addLayout(finish_layout)
+		
+		self.setLayout(layout)
+	
+	def okay(self):
+		try:
+			gens = int(self.gens_text.text().strip())
+		
+		except ValueError:
+			print("Canceling %s: Entry must be an integer." % self.windowTitle())
+			self.setParent(None)
+			return
+		
+		if gens < self.minimum:
+			print("Canceling %s: Entry must be at least %d." % (self.windowTitle(), self.minimum))
+			self.setParent(None)
+			return
+		
+		parent = self.parentWidget()
+		setattr(parent.cgol, self.queue, gens)
+		
+		self.setParent(None)
+	
+	def cancel(self):
+		print("Canceling %s." % self.windowTitle())
+		self.setParent(None)
+
+# A pane listing the patterns in the library, with a thumbnail of each, that can be searched by name and folder.
+# Activating a pattern starts placing it, just like opening its file.
+class library_pane(QDockWidget):
+	def __init__(self, parent, library):
+		super().__init__("Pattern Library", parent)
+		
+		self.library = library
+		
+		widget = QWidget()
+		layout = QVBoxLayout()
+		
+		self.search = QLineEdit()
+		self.search.setPlaceholderText("Search")
+		self.search.textChanged.connect(self.update_list)
+		
+		self.list = QListWidget()
+		self.list.setIconSize(QSize(48, 48))
+		self.list.itemActivated.connect(self.place)
+		
+		layout.addWidget(self.search)
+		layout.addWidget(self.list)
+		
+		widget.setLayout(layout)
+		self.setWidget(widget)
+		
+		# Thumbnails are drawn once per content hash.
+		self.icons = {}
+		
+		self.refresh()
+	
+	# Rescan the library for new or changed files, and list them.
+	def refresh(self):
+		parsed = self.library.refresh()
+		print("Indexed %d patterns, %d of them just now." % (len(self.library.entries), parsed))
+		
+		self.update_list()
+	
+	# List the patterns that match the search.
+	def update_list(self):
+		self.list.clear()
+		
+		for entry in self.library.search(self.search.text()):
+			item = QListWidgetItem(self.icon(entry), "%s\n%dx%d, %d cells" % (entry["path"], entry["width"], entry["height"], entry["population"]))
+			item.setData(Qt.UserRole, entry["path"])
+			self.list.addItem(item)
+	
+	def icon(self, entry):
+		if entry["hash"] not in self.icons:
+			k, width, height, counts = entry["thumbnail"]
+			
+			image = QtGui.QImage(counts, height, width, CGOL_Render.stride(0, height), QtGui.QImage.Format_Indexed8)
+			image.setColorTable(CGOL_Render.density_colors(k))
+			
+			# Rows of the thumbnail are columns of the pattern.
+			image = image.transformed(QtGui.QTransform(0, 1, 1, 0, 0, 0))
+			
+			self.icons[entry["hash"]] = QtGui.QIcon(QtGui.QPixmap.fromImage(image.scaled(48, 48, Qt.KeepAspectRatio)))
+		
+		return self.icons[entry["hash"]]
+	
+	def place(self, item):
+		path = item.data(Qt.UserRole)
+		
+		print("Opening " + path + "...")
+		
+		self.parentWidget().cgol.open(path, self.library)
+
 # Defines the application window and GUI layout
 # Interfaces with the CGOL_grid class
 class CGOL_Window(QMainWindow):
@@ -297,6 +509,12 @@ class CGOL_Window(QMainWindow):
 		# Where the pattern will be saved.
 		self.savename = None
 		
+		# The patterns bundled in Patterns/, which are also cached when opened from anywhere else.
+		self.library = CGOL_Patterns.pattern_library()
+		
+		# The library pane, created when it's first shown.
+		self.library_pane = None
+		
 		# The time that the last resize event occurred at. When this passes a second, it's set to None and the resize is handled.
 		self.last_resize = None
 		
@@ -308,9 +526,15 @@ class CGOL_Window(QMainWindow):
 		# This will be a 4-tuple of ints when it is set by resize_grid()
 		self.resize_queued = None
 		
+		# Set to ("save", filename) or ("load", filename) to save or load a snapshot of the grid. The mainloop will do it at the next opportunity and set this back to None.
+		self.snapshot_queued = None
+		
 		# Whether we're actively generating frames
 		self.is_playing = False
 		
+		# Whether to stop playing once the board repeats. See CGOL_History.cycle_detector
+		self.pause_on_cycle = False
+		
 		# Set to True to halt an ongoing simulation thread. The thread will set it back to False
 		self.is_halting = False
 		
@@ -326,6 +550,12 @@ class CGOL_Window(QMainWindow):
 		# The minimum delay between renders in seconds
 		self.render_delay = 0.05
 		
+		# When the stats are enabled, the time at which a render was first requested and not yet started.
+		self.render_requested_time = None
+		
+		# The time the performance overlay was last refreshed.
+		self.last_overlay_time = time.time()
+		
 		# Whether the grid is periodic or finite
 		self.is_periodic = True
 		
@@ -337,6 +567,12 @@ class CGOL_Window(QMainWindow):
 		# When set to an active thread, no further threads will be launched for rendering.
 		self.render_thread = dummy_thread()
 		
+		# When the stats are enabled, the time at which the frame being viewed was ready, until it has been rendered.
+		self.unshown_frame_time = None
+		
+		# Runs the mainloop. Set by main.py once the loop exists.
+		self.scheduler = None
+		
 		# Create Window
 		self.setWindowTitle("Conway's Game of Life")
 		self.setMinimumSize(QSize(400, 300))
@@ -350,6 +586,12 @@ class CGOL_Window(QMainWindow):
 		
 		self.create_canvas()
 		
+		# The performance overlay, drawn over the top left of the canvas.
+		self.overlay = QLabel(self.label)
+		self.overlay.setStyleSheet("QLabel { color: rgb(230, 230, 230); background-color: rgba(0, 0, 0, 160); padding: 4px; font-family: monospace; }")
+		self.overlay.move(8, 8)
+		self.overlay.hide()
+		
 		# Create the menu bar.
 		self.create_options()
 	
@@ -383,6 +625,20 @@ class CGOL_Window(QMainWindow):
 		open.triggered.connect(self.open)
 		file_menu.addAction(open)
 		
+		library = QAction("Pattern &Library", file_menu)
+		library.setToolTip("Browse and search the bundled patterns.")
+		library.triggered.connect(self.show_library)
+		file_menu.addAction(library)
+		
+		save_snapshot = QAction("Save Snapshot", file_menu)
+		save_snapshot.setToolTip("Save the whole grid, including its history, to be loaded again later.")
+		save_snapshot.triggered.connect(self.save_snapshot)
+		file_menu.addAction(save_snapshot)
+		
+		load_snapshot = QAction("Load Snapshot", file_menu)
+		load_snapshot.triggered.connect(self.load_snapshot)
+		file_menu.addAction(load_snapshot)
+		
 		# Action menu
 		actn_menu = QMenu("&Action", menu_bar);
 		actn_menu.setToolTipsVisible(True)
@@ -391,8 +647,20 @@ class CGOL_Window(QMainWindow):
 		resz.triggered.connect(self.resize_grid)
 		actn_menu.addAction(resz)
 		
+		run = QAction("Run Generations", actn_menu)
+		run.triggered.connect(self.run_generations)
+		actn_menu.addAction(run)
+		
+		fast = QAction("Fast Forward", actn_menu)
+		fast.triggered.connect(self.fast_forward)
+		actn_menu.addAction(fast)
+		
+		goto = QAction("Go To Generation", actn_menu)
+		goto.triggered.connect(self.go_to_generation)
+		actn_menu.addAction(goto)
+		
 		rand = QAction("Randomize", actn_menu)
-		rand.triggered.connect(self.cgol.randomize)
+		rand.triggered.connect(lambda checked: self.cgol.randomize())
 		actn_menu.addAction(rand)
 		
 		clear = QAction("Clear", actn_menu)
@@ -408,6 +676,31 @@ class CGOL_Window(QMainWindow):
 		self.period.triggered.connect(self.toggle_period)
 		optn_menu.addAction(self.period)
 		
+		# Performance overlay option
+		self.overlay_toggle = QAction("Show Performance", optn_menu)
+		self.overlay_toggle.setToolTip("Measure and show step and render times.")
+		self.overlay_toggle.triggered.connect(self.toggle_overlay)
+		optn_menu.addAction(self.overlay_toggle)
+		
+		# Long history option
+		self.long_history_toggle = QAction("Keep Long History", optn_menu)
+		self.long_history_toggle.setToolTip("Keep frames that fall out of the history as compressed deltas, so they can still be rewound to.")
+		self.long_history_toggle.triggered.connect(self.toggle_long_history)
+		optn_menu.addAction(self.long_history_toggle)
+		
+		# Cycle option
+		self.cycle_toggle = QAction("Pause On Repeat", optn_menu)
+		self.cycle_toggle.setToolTip("Stop playing once the board returns to a state it has already been in.")
+		self.cycle_toggle.triggered.connect(self.toggle_pause_on_cycle)
+		optn_menu.addAction(self.cycle_toggle)
+		
+		# Engine selection
+		engn_menu = optn_menu.addMenu("Engine")
+		for name in CGOL_Engines.available_engines():
+			engn = QAction(name, engn_menu)
+			engn.triggered.connect(lambda checked, name=name: setattr(self.cgol, "engine_queued", name))
+			engn_menu.addAction(engn)
+		
 		# Prev button
 		self.prev = QAction("Prev", menu_bar)
 		self.prev.triggered.connect(self.cgol.undo)
@@ -437,6 +730,36 @@ class CGOL_Window(QMainWindow):
 		diag = resize_diag(self)
 		diag.show()
 	
+	# Skip ahead many generations
+	def fast_forward(self):
+		diag = generations_diag(self, "Fast Forward", "Please specify the generation to skip ahead to, counted from the last randomize or clear. The pattern is simulated as though the grid were unbounded, so cells that leave the grid are discarded. Periodic grids can't be fast-forwarded.", "fast_forward_queued", 1, "Generation:")
+		diag.show()
+	
+	# Simulate many generations without showing each one
+	def run_generations(self):
+		diag = generations_diag(self, "Run Generations", "Please specify the number of generations to simulate. Only the result is shown, but the last few generations can still be rewound to.", "step_n_queued")
+		diag.show()
+	
+	# Go to any earlier or later generation
+	def go_to_generation(self):
+		diag = generations_diag(self, "Go To Generation", "Please specify the generation to go to, counted from the last randomize or clear. It is recomputed from the nearest saved checkpoint before it, using the fastest engine.", "seek_queued", 0, "Generation:")
+		diag.show()
+	
+	# Show the generation being viewed in the title bar, along with the progress of a batch of steps if progress isn't None.
+	def show_progress(self, progress):
+		if progress is None:
+			title = "Conway's Game of Life (generation %d)" % self.cgol.get_generation()
+			
+			# If the frame being viewed is the last one stepped into, and the board has been found to repeat, show its period too.
+			cycles = self.cgol.cycles
+			if cycles.cycle is not None and cycles.last[:2] == (self.cgol.get_generation(), self.cgol.revision):
+				title = "Conway's Game of Life (generation %d, period %d since %d)" % (self.cgol.get_generation(), cycles.cycle[1], cycles.cycle[0])
+		else:
+			title = "Conway's Game of Life (%d/%d)" % progress
+		
+		if title != self.windowTitle():
+			self.setWindowTitle(title)
+	
 	# File operations
 	def save(self):
 		# If the savename is not set, call save_as to get one.
@@ -449,7 +772,7 @@ class CGOL_Window(QMainWindow):
 	
 	def save_as(self):
 		# Get the file to save as
-		fn, fil = QFileDialog.getSaveFileUrl(filter="Pattern Files (*.pat);;All Files (*)")
+		fn, fil = QFileDialog.getSaveFileUrl(filter=PATTERN_FILTER)
 		fn = fn.path()
 		
 		ext = os.path.splitext(fn)[-1].lower()
@@ -469,7 +792,7 @@ class CGOL_Window(QMainWindow):
 		self.save()
 	
 	def open(self):
-		fn, fil = QFileDialog.getOpenFileUrl(filter="Pattern Files (*.pat);;All Files (*)")
+		fn, fil = QFileDialog.getOpenFileUrl(filter=PATTERN_FILTER)
 		fn = fn.path()
 		
 		ext = os.path.splitext(fn)[-1].lower()
@@ -481,7 +804,39 @@ class CGOL_Window(QMainWindow):
 		
 		print("Opening " + fn + "...")
 		
-		self.cgol.open(fn)
+		self.cgol.open(fn, self.library)
+	
+	def save_snapshot(self):
+		fn, fil = QFileDialog.getSaveFileUrl(filter=SNAPSHOT_FILTER)
+		fn = fn.path()
+		
+		if (fn == ""):
+			print("Canceling save operation.")
+			return
+		
+		self.snapshot_queued = ("save", fn)
+	
+	def load_snapshot(self):
+		fn, fil = QFileDialog.getOpenFileUrl(filter=SNAPSHOT_FILTER)
+		fn = fn.path()
+		
+		if (fn == ""):
+			print("Canceling open operation.")
+			return
+		
+		print("Loading " + fn + "...")
+		
+		self.snapshot_queued = ("load", fn)
+	
+	# Show the library pane, rescanning the library if it was already open.
+	def show_library(self):
+		if self.library_pane is None:
+			self.library_pane = library_pane(self, self.library)
+			self.addDockWidget(Qt.LeftDockWidgetArea, self.library_pane)
+		
+		else:
+			self.library_pane.refresh()
+			self.library_pane.show()
 	
 	def toggle_play(self):
 		if self.play.text() == "Play":
@@ -491,6 +846,67 @@ class CGOL_Window(QMainWindow):
 		elif self.play.text() == "Pause":
 			self.play.setText("Play")
 			self.is_playing = False
+		
+		self.wake()
+	
+	# Ask the mainloop to run soon, after changing something it acts on from outside an input event, e.g. from a timer or another thread. See loop_scheduler
+	def wake(self):
+		if self.scheduler is not None:
+			self.scheduler.wake()
+	
+	# Turn the performance overlay, and the measurements behind it, on or off.
+	def toggle_overlay(self):
+		if self.overlay_toggle.text() == "Show Performance":
+			self.overlay_toggle.setText("Hide Performance")
+			self.cgol.stats.enabled = True
+			self.overlay.setText("Measuring...")
+			self.overlay.adjustSize()
+			self.overlay.show()
+		
+		elif self.overlay_toggle.text() == "Hide Performance":
+			self.overlay_toggle.setText("Show Performance")
+			self.overlay.hide()
+			
+			# Keep measuring if a trace file is being written.
+			if self.cgol.stats.trace is None:
+				self.cgol.stats.enabled = False
+				self.cgol.stats.reset()
+	
+	# Turn the long history on or off. Turning it off forgets everything beyond the history ring.
+	def toggle_long_history(self):
+		if self.long_history_toggle.text() == "Keep Long History":
+			self.long_history_toggle.setText("Drop Long History")
+			self.cgol.set_long_history(CGOL_History.ARCHIVE_BUDGET)
+		
+		elif self.long_history_toggle.text() == "Drop Long History":
+			self.long_history_toggle.setText("Keep Long History")
+			self.cgol.set_long_history(None)
+	
+	def toggle_pause_on_cycle(self):
+		if self.cycle_toggle.text() == "Pause On Repeat":
+			self.cycle_toggle.setText("Play Through Repeats")
+			self.pause_on_cycle = True
+		
+		elif self.cycle_toggle.text() == "Play Through Repeats":
+			self.cycle_toggle.setText("Pause On Repeat")
+			self.pause_on_cycle = False
+	
+	# Refresh the text of the performance overlay.
+	def update_overlay(self):
+		self.last_overlay_time = time.time()
+		
+		if self.overlay.isVisible():
+			lines = [self.cgol.stats.summary() or "Measuring..."]
+			
+			# The frame being viewed, which isn't necessarily the last one stepped.
+			lines.append("Population: %d" % self.cgol.get_population())
+			
+			box = self.cgol.bounding_box()
+			if box is not None:
+				lines.append("Bounding box: %dx%d at (%d, %d)" % (box[2] - box[0], box[3] - box[1], box[0], box[1]))
+			
+			self.overlay.setText("\n".join(lines))
+			self.overlay.adjustSize()
 	
 	def toggle_period(self):
 		if self.period.text() == "Periodic":
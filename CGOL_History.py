@@ -0,0 +1,325 @@
+import collections
+import re
+import struct
+
+# The default number of bytes of deltas a long history may hold, on top of the history ring.
+ARCHIVE_BUDGET = 64 * 1024 * 1024
+
+# The generation of a frame in the history ring of a grid that has never been written to. Such frames are never rewound onto.
+UNWRITTEN = -1
+
+# The fixed cost of storing one delta, as a bytes object, beyond the length of its contents.
+DELTA_OVERHEAD = 33
+
+# The default number of bytes of checkpoints to keep, and the number of generations between them to start with.
+CHECKPOINT_BUDGET = 64 * 1024 * 1024
+CHECKPOINT_INTERVAL = 64
+
+# The number of recent generations whose hashes are remembered for detecting cycles, which is also the longest period that can be detected.
+CYCLE_TABLE_SIZE = 1024
+
+# Runs of nonzero bytes. Runs separated by up to 8 zero bytes are joined, since a run header costs 8 bytes.
+RUNS = re.compile(rb"[^\x00]+(?:\x00{1,8}[^\x00]+)*")
+
+# Encode bytes that are mostly zero, such as the XOR of two similar frames, as a list of runs.
+# Each run is its offset and length as two little-endian 32 bit integers, followed by its contents.
+def encode_runs(data):
+	return b"".join([struct.pack("<II", m.start(), m.end() - m.start()) + m.group() for m in RUNS.finditer(data)])
+
+# Decode the output of encode_runs() back into size bytes.
+def decode_runs(delta, size):
+	data = bytearray(size)
+	
+	pos = 0
+	while pos < len(delta):
+		offset, length = struct.unpack_from("<II", delta, pos)
+		pos += 8
+		
+		data[offset:offset + length] = delta[pos:pos + length]
+		pos += length
+	
+	return data
+
+# Extends the history ring of a grid with the frames that fall out of it, each stored as a delta against the frame after it.
+# So rewinding thousands of generations costs memory in proportion to how much changed, rather than to the area of the board.
+# The grid provides frame_delta() and apply_delta(), and calls before_write(), rewind() and advance() at the edges of the ring. See CGOL_grid.dec_current()
+# Each delta is stored along with the generation of the frame it restores.
+class delta_history:
+	def __init__(self, budget=None):
+		# The number of bytes of deltas to keep. The oldest ones are dropped beyond it.
+		self.budget = ARCHIVE_BUDGET if budget is None else budget
+		
+		# Deltas of the frames older than the ring, newest last. The last one turns the frame at the anchor into the one before it.
+		self.past = collections.deque()
+		
+		# Deltas of the frames newer than the latest one, nearest last, which were pushed out of the ring by rewinding. The last one turns the latest frame into the one after it.
+		self.future = collections.deque()
+		
+		# The frame in the ring that the last delta of past applies to, which is the oldest one that's still part of the history. None until the first write.
+		self.anchor = None
+		
+		# The number of bytes the deltas take up.
+		self.size = 0
+		
+		# The number of frames that have been dropped to stay within the budget.
+		self.dropped = 0
+	
+	# The number of frames that can be rewound to beyond the ring, and forward again.
+	def __len__(self):
+		return len(self.past) + len(self.future)
+	
+	# Forget every delta, e.g. because the grid was resized and they no longer fit it.
+	def reset(self):
+		self.past.clear()
+		self.future.clear()
+		self.anchor = None
+		self.size = 0
+	
+	def push(self, deltas, generation, delta):
+		deltas.append((generation, delta))
+		self.size += len(delta) + DELTA_OVERHEAD
+		
+		# Drop the oldest frames first, then the furthest ahead.
+		while self.size > self.budget and (self.past or self.future):
+			generation, dropped = self.past.popleft() if self.past else self.future.popleft()
+			
+			self.size -= len(dropped) + DELTA_OVERHEAD
+			self.dropped += 1
+	
+	def pop(self, deltas):
+		generation, delta = deltas.pop()
+		self.size -= len(delta) + DELTA_OVERHEAD
+		
+		return generation, delta
+	
+	# If the frame after the latest one is the anchor, store it as a delta so it can be overwritten. Frames that were never written aren't worth keeping.
+	def make_room(self, cgol):
+		target = (cgol.latest + 1) % cgol.depth
+		
+		if self.anchor is None:
+			self.anchor = target
+		
+		if target == self.anchor:
+			nxt = (target + 1) % cgol.depth
+			
+			if cgol.generations[target] != UNWRITTEN:
+				self.push(self.past, cgol.generations[target], cgol.frame_delta(nxt, target))
+			
+			self.anchor = nxt
+	
+	# Called before a new frame is written into the frame after the current one.
+	# Anything ahead of the current frame is discarded, just like the frames in the ring after it.
+	def before_write(self, cgol):
+		while self.future:
+			self.pop(self.future)
+		
+		if cgol.current == cgol.latest:
+			self.make_room(cgol)
+	
+	# Rewind from the anchor to the frame before it, restoring it from its delta. Returns False if there's nothing to rewind to.
+	def rewind(self, cgol):
+		if cgol.current != self.anchor or not self.past or self.past[-1][0] == UNWRITTEN:
+			return False
+		
+		prev = (cgol.current - 1) % cgol.depth
+		generation, delta = self.pop(self.past)
+		
+		# If the ring is full, store the latest frame as a delta to make room.
+		if prev == cgol.latest:
+			self.push(self.future, cgol.generations[prev], cgol.frame_delta((prev - 1) % cgol.depth, prev))
+			cgol.latest = (prev - 1) % cgol.depth
+		
+		cgol.apply_delta(cgol.current, prev, delta)
+		cgol.generations[prev] = generation
+		
+		self.anchor = prev
+		cgol.current = prev
+		
+		return True
+	
+	# Advance from the latest frame to the one after it, restoring it from its delta. Returns False if there's nothing to advance to.
+	def advance(self, cgol):
+		if cgol.current != cgol.latest or not self.future:
+			return False
+		
+		self.make_room(cgol)
+		
+		target = (cgol.latest + 1) % cgol.depth
+		generation, delta = self.pop(self.future)
+		
+		cgol.apply_delta(cgol.latest, target, delta)
+		cgol.generations[target] = generation
+		
+		cgol.latest = target
+		cgol.current = target
+		
+		return True
+
+# Keeps a snapshot of every so many generations of a grid, so that any generation since can be recomputed from the nearest one before it. See CGOL_grid.seek()
+# Only runs of plain steps can be recomputed, so a snapshot is also taken wherever a run starts: after an edit, a fast-forward, a change of boundary mode, or a step from a rewound frame.
+# When the snapshots outgrow the budget, the interval between them is doubled and the ones in between are dropped.
+class checkpoint_store:
+	def __init__(self, budget=None, interval=CHECKPOINT_INTERVAL):
+		self.budget = CHECKPOINT_BUDGET if budget is None else budget
+		self.interval = interval
+		
+		# Maps each generation with a snapshot to (snapshot, is_periodic, starts_run), where is_periodic is the boundary mode to step onwards from it with.
+		# Snapshots that start a run can't be dropped without losing the generations up to the next one.
+		self.checkpoints = {}
+		
+		# The number of bytes the snapshots take up.
+		self.size = 0
+		
+		# The (generation, grid revision, is_periodic) of the last frame stepped into. A step that doesn't continue from it starts a new run.
+		self.last = None
+	
+	# Forget every snapshot, e.g. because the grid was resized and they no longer fit it.
+	def reset(self):
+		self.checkpoints = {}
+		self.size = 0
+		self.last = None
+	
+	def add(self, generation, snapshot, is_periodic, starts_run):
+		self.remove(generation)
+		
+		self.checkpoints[generation] = (snapshot, is_periodic, starts_run)
+		self.size += len(snapshot)
+		
+		while self.size > self.budget and len(self.checkpoints) > 1:
+			self.interval *= 2
+			
+			thinned = [g for g, (s, p, starts) in self.checkpoints.items() if not starts and g % self.interval != 0]
+			
+			# Once only the starts of runs are left, the oldest ones have to go.
+			if not thinned:
+				thinned = [min(self.checkpoints)]
+			
+			for g in thinned:
+				self.remove(g)
+	
+	def remove(self, generation):
+		if generation in self.checkpoints:
+			self.size -= len(self.checkpoints.pop(generation)[0])
+	
+	# Called after a step from frame source into frame target of a grid.
+	def after_step(self, cgol, source, target, is_periodic):
+		generation = cgol.generations[source]
+		
+		# The step started a new run. Whatever came after it before is no longer part of the history.
+		if self.last != (generation, cgol.revision, is_periodic):
+			for g in [g for g in self.checkpoints if g > generation]:
+				self.remove(g)
+			
+			self.add(generation, cgol.snapshot_frame(source), is_periodic, True)
+		
+		generation = cgol.generations[target]
+		if generation % self.interval == 0:
+			self.add(generation, cgol.snapshot_frame(target), is_periodic, False)
+		
+		self.last = (generation, cgol.revision, is_periodic)
+	
+	# Returns (generation, snapshot, is_periodic) of the latest snapshot at or before the given generation, or None.
+	def find(self, generation):
+		found = [g for g in self.checkpoints if g <= generation]
+		if not found:
+			return None
+		
+		g = max(found)
+		snapshot, is_periodic, starts_run = self.checkpoints[g]
+		
+		return g, snapshot, is_periodic
+	
+	# Returns the snapshot of exactly the given generation, or None.
+	def get(self, generation):
+		found = self.checkpoints.get(generation)
+		
+		return None if found is None else found[0]
+
+# Detects when a grid returns to a board it has already been in, from the hashes of its frames. See CGOL_grid.update_hash()
+# Only the hashes of the most recent frames are remembered, so longer periods go unnoticed. Like the checkpoints, the table starts over whenever a run of plain steps is broken.
+class cycle_detector:
+	def __init__(self, size=CYCLE_TABLE_SIZE):
+		self.size = size
+		
+		# Maps the hash of each recent frame to its generation, and lists the hashes oldest first.
+		self.seen = {}
+		self.order = collections.deque()
+		
+		# The (generation, grid revision, is_periodic) of the last frame stepped into.
+		self.last = None
+		
+		# (start, period) once the board is found to repeat, where start is the generation at which the repeating boards began. Otherwise None.
+		self.cycle = None
+		
+		# True if the repeat was confirmed by comparing the boards themselves, rather than only their hashes. Only then are whole periods skipped. See period()
+		self.checked = False
+	
+	def reset(self):
+		self.seen = {}
+		self.order.clear()
+		self.cycle = None
+		self.checked = False
+	
+	def add(self, h, generation):
+		if h in self.seen:
+			return
+		
+		self.seen[h] = generation
+		self.order.append(h)
+		
+		if len(self.order) > self.size:
+			del self.seen[self.order.popleft()]
+	
+	# Called after a step from frame source into frame target of a grid. Returns (start, period) if the step revealed a cycle, or None.
+	def after_step(self, cgol, source, target, is_periodic):
+		generation = cgol.generations[source]
+		
+		if self.last != (generation, cgol.revision, is_periodic):
+			self.reset()
+			self.add(cgol.get_hash(source), generation)
+		
+		generation = cgol.generations[target]
+		self.last = (generation, cgol.revision, is_periodic)
+		
+		h = cgol.get_hash(target)
+		if self.cycle is None and h in self.seen:
+			start = self.seen[h]
+			period = generation - start
+			
+			# Hashes can collide, so make sure if possible.
+			checked = self.check(cgol, target, start, period)
+			if checked is False:
+				return None
+			
+			self.cycle = (start, period)
+			self.checked = checked
+			return self.cycle
+		
+		self.add(h, generation)
+		
+		return None
+	
+	# Compares frame target of a grid with the board of generation start, period generations before it: from the ring if it's still there, or else from a checkpoint.
+	# Returns whether they're equal, or None if neither is available.
+	def check(self, cgol, target, start, period):
+		earlier = (target - period) % cgol.depth
+		if period < cgol.depth and cgol.generations[earlier] == start:
+			return cgol.frames_equal(earlier, target)
+		
+		snapshot = cgol.checkpoints.get(start)
+		if snapshot is not None:
+			return cgol.frame_equals_snapshot(target, snapshot)
+		
+		return None
+	
+	# Returns the period of the cycle, if it has been checked and a step from the given generation with the given revision and boundary mode would continue it. Otherwise None.
+	def period(self, generation, revision, is_periodic):
+		if self.cycle is None or not self.checked or self.last != (generation, revision, is_periodic):
+			return None
+		
+		return self.cycle[1]
+	
+	# Note that whole periods have been skipped, so the last frame is the given number of generations later than it seems.
+	def skip(self, generations):
+		generation, revision, is_periodic = self.last
+		self.last = (generation + generations, revision, is_periodic)
@@ -0,0 +1,483 @@
+import collections
+import hashlib
+import math
+import os
+import re
+
+# Reads and writes pattern files. Besides this program's own .pat format, the formats of the standard pattern collections are supported:
+# RLE (.rle), Life 1.06 (.lif, .life) and Golly's macrocell format (.mc).
+# Every reader produces the live cells as horizontal runs of (x, y, length), which are decoded straight into a pattern: a list of columns, each a bytearray holding 1 for every live cell and 0 for every dead one.
+# Every writer is given the live cells a row at a time, as (y, xs), and writes them out as it goes.
+
+# The extensions of the supported formats, and the format each one is read and written as.
+EXTENSIONS = {
+	".pat": "pat",
+	".rle": "rle",
+	".lif": "life",
+	".life": "life",
+	".mc": "macrocell",
+}
+
+# The directory of bundled patterns, which the library indexes by default.
+PATTERN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Patterns")
+
+# Thumbnails are scaled down to fit in this many cells on each side, each showing the number of live cells in a block of the pattern.
+THUMBNAIL_SIZE = 32
+
+# The number of bytes of parsed patterns the library keeps in memory.
+LIBRARY_CACHE_BUDGET = 16 * 1024 * 1024
+
+# The longest line an RLE file should have.
+RLE_LINE_LENGTH = 70
+
+# A run of RLE cells, or the end of a run of lines, with an optional count.
+RLE_TOKEN = re.compile(rb"(\d*)([^\d\s])")
+
+# Returns the format of a file, from its extension, or else from its first line.
+def find_format(fn, fin=None):
+	ext = os.path.splitext(fn)[-1].lower()
+	if ext in EXTENSIONS:
+		return EXTENSIONS[ext]
+	
+	if fin is None:
+		return "pat"
+	
+	first = fin.readline()
+	fin.seek(0)
+	
+	if first.startswith(b"#Life 1.06"):
+		return "life"
+	if first.startswith(b"[M2]"):
+		return "macrocell"
+	if first.startswith(b"#") or first.lstrip().startswith(b"x"):
+		return "rle"
+	
+	return "pat"
+
+# Read a pattern file into a list of columns. Raises ValueError if the file can't be read.
+def read(fn):
+	with open(fn, "rb") as fin:
+		fmt = find_format(fn, fin)
+		
+		if fmt == "pat":
+			width, height, runs = read_pat(fin)
+		elif fmt == "rle":
+			width, height, runs = read_rle(fin)
+		elif fmt == "life":
+			width, height, runs = read_life(fin)
+		else:
+			width, height, runs = read_macrocell(fin)
+		
+		# Formats without a size are collected first, then moved so the pattern starts at (0, 0).
+		if width is None:
+			runs = list(runs)
+			if not runs:
+				raise ValueError("no live cells")
+			
+			left = min(x for x, y, n in runs)
+			top = min(y for x, y, n in runs)
+			width = max(x + n for x, y, n in runs) - left
+			height = max(y for x, y, n in runs) + 1 - top
+			
+			runs = [(x - left, y - top, n) for x, y, n in runs]
+		
+		if width < 1 or height < 1:
+			raise ValueError("empty pattern")
+		
+		pattern = [bytearray(height) for x in range(width)]
+		
+		try:
+			for x, y, n in runs:
+				for a in range(x, x + n):
+					pattern[a][y] = 1
+		
+		except IndexError:
+			raise ValueError("cells outside the pattern")
+	
+	return pattern
+
+# Write a pattern file in the format given by its extension, with .pat for anything else.
+# rows gives the live cells of each row that has any, as (y, xs), in order of y, with every coordinate between 0 and the width or height.
+def write(fn, width, height, rows):
+	fmt = EXTENSIONS.get(os.path.splitext(fn)[-1].lower(), "pat")
+	
+	with open(fn, "w") as fout:
+		if fmt == "pat":
+			write_pat(fout, width, height, rows)
+		elif fmt == "rle":
+			write_rle(fout, width, height, rows)
+		elif fmt == "life":
+			write_life(fout, rows)
+		else:
+			write_macrocell(fout, rows)
+
+# This program's own format: the width and height, then a 0 or 1 for each cell, row by row.
+def read_pat(fin):
+	# The header is read a byte at a time, so the rows can be read whole after it.
+	header = []
+	while len(header) < 2:
+		token = b""
+		
+		c = fin.read(1)
+		while c.isspace():
+			c = fin.read(1)
+		
+		while c and not c.isspace():
+			token += c
+			c = fin.read(1)
+		
+		header.append(int(token))
+	
+	width, height = header
+	
+	def runs():
+		for y in range(height):
+			row = fin.read(width)
+			if len(row) < width:
+				raise ValueError("pattern ends early")
+			
+			for m in re.finditer(b"1+", row):
+				yield m.start(), y, m.end() - m.start()
+	
+	return width, height, runs()
+
+def write_pat(fout, width, height, rows):
+	fout.write("%d %d " % (width, height))
+	
+	empty = "0" * width
+	
+	y = 0
+	for row_y, xs in rows:
+		for y in range(y, row_y):
+			fout.write(empty)
+		
+		row = bytearray(b"0" * width)
+		for x in xs:
+			row[x] = 49
+		
+		fout.write(row.decode())
+		y = row_y + 1
+	
+	for y in range(y, height):
+		fout.write(empty)
+
+# Run length encoded, e.g. "x = 3, y = 3\nbo$2bo$3o!" for a glider. b is a dead cell, any other letter is a live one, and $ ends a row.
+def read_rle(fin):
+	line = fin.readline()
+	while line.startswith(b"#") or not line.strip():
+		if not line:
+			raise ValueError("no header")
+		
+		line = fin.readline()
+	
+	# x = m, y = n, rule = B3/S23
+	header = {}
+	for item in line.split(b","):
+		key, eq, value = item.partition(b"=")
+		header[key.strip()] = value.strip()
+	
+	width = int(header[b"x"])
+	height = int(header[b"y"])
+	
+	def runs():
+		x = 0
+		y = 0
+		
+		# A count may be split from its tag by a line break.
+		count = b""
+		
+		for line in fin:
+			for m in RLE_TOKEN.finditer(line):
+				n = int(count + m.group(1)) if count or m.group(1) else 1
+				count = b""
+				tag = m.group(2)
+				
+				if tag == b"!":
+					return
+				
+				elif tag == b"$":
+					x = 0
+					y += n
+				
+				elif tag in b"b.":
+					x += n
+				
+				else:
+					yield x, y, n
+					x += n
+			
+			trailing = re.search(rb"\d+\s*$", line)
+			if trailing is not None:
+				count = trailing.group().strip()
+	
+	return width, height, runs()
+
+def write_rle(fout, width, height, rows):
+	fout.write("x = %d, y = %d, rule = B3/S23\n" % (width, height))
+	
+	# Tokens are written one at a time, wrapping lines before they get too long.
+	length = 0
+	def token(n, tag):
+		nonlocal length
+		
+		text = tag if n == 1 else "%d%s" % (n, tag)
+		if length + len(text) > RLE_LINE_LENGTH:
+			fout.write("\n")
+			length = 0
+		
+		fout.write(text)
+		length += len(text)
+	
+	y = 0
+	for row_y, xs in rows:
+		if row_y > y:
+			token(row_y - y, "$")
+		
+		# Runs of live cells, and the dead cells between them. Dead cells at the end of the row are left out.
+		x = 0
+		start = None
+		for a in xs:
+			if start is not None and a != x:
+				token(x - start, "o")
+				start = None
+			
+			if start is None:
+				if a > x:
+					token(a - x, "b")
+				
+				start = a
+			
+			x = a + 1
+		
+		if start is not None:
+			token(x - start, "o")
+		
+		y = row_y
+	
+	token(1, "!")
+	fout.write("\n")
+
+# A header, then the x and y of each live cell on a line of its own.
+def read_life(fin):
+	def runs():
+		for line in fin:
+			if line.startswith(b"#") or not line.strip():
+				continue
+			
+			x, y = line.split()
+			yield int(x), int(y), 1
+	
+	return None, None, runs()
+
+def write_life(fout, rows):
+	fout.write("#Life 1.06\n")
+	
+	for y, xs in rows:
+		for x in xs:
+			fout.write("%d %d\n" % (x, y))
+
+# Golly's macrocell format, a quadtree with every distinct node written once.
+# Each 8x8 leaf is a line of . for dead and * for live cells, with $ after each row, leaving out trailing dead cells and rows.
+# Every other node is a line "k nw ne sw se" giving its size as 2^k and its children by their line number among the nodes, or 0 if empty. The last node is the root.
+def read_macrocell(fin):
+	# Each node is a list of runs relative to its top left corner, or (k, nw, ne, sw, se) for a node that isn't a leaf.
+	nodes = [None]
+	
+	for line in fin:
+		line = line.strip()
+		if not line or line.startswith(b"#") or line.startswith(b"["):
+			continue
+		
+		if line[0] in b".*$":
+			leaf = []
+			for y, row in enumerate(line.split(b"$")):
+				for m in re.finditer(rb"\*+", row):
+					leaf.append((m.start(), y, m.end() - m.start()))
+			
+			nodes.append(leaf)
+		
+		else:
+			k, nw, ne, sw, se = map(int, line.split())
+			nodes.append((k, nw, ne, sw, se))
+	
+	if len(nodes) == 1:
+		raise ValueError("no nodes")
+	
+	def runs(node, x, y):
+		if node == 0:
+			return
+		
+		if isinstance(nodes[node], list):
+			for a, b, n in nodes[node]:
+				yield x + a, y + b, n
+			
+			return
+		
+		k, nw, ne, sw, se = nodes[node]
+		half = 1 << (k - 1)
+		
+		yield from runs(nw, x, y)
+		yield from runs(ne, x + half, y)
+		yield from runs(sw, x, y + half)
+		yield from runs(se, x + half, y + half)
+	
+	return None, None, runs(len(nodes) - 1, 0, 0)
+
+def write_macrocell(fout, rows):
+	fout.write("[M2] (py-cgol)\n#R B3/S23\n")
+	
+	# Group the live cells into 8x8 leaves, each keyed by its position in leaves and held as a list of its rows' bits.
+	leaves = {}
+	for y, xs in rows:
+		for x in xs:
+			leaf = leaves.setdefault((x >> 3, y >> 3), [0] * 8)
+			leaf[y & 7] |= 1 << (x & 7)
+	
+	# The number of the line each distinct node was written on, keyed by its contents.
+	written = {}
+	
+	def write_node(key, line):
+		if key not in written:
+			fout.write(line)
+			written[key] = len(written) + 1
+		
+		return written[key]
+	
+	# Build each level of the tree from the one below it, writing every node the first time it's seen.
+	level = {}
+	for pos, bits in leaves.items():
+		line = "$".join("".join("*" if row >> i & 1 else "." for i in range(row.bit_length())) for row in bits).rstrip("$") + "$\n"
+		level[pos] = write_node(tuple(bits), line)
+	
+	# Until there's a single root, with its top left corner at the origin.
+	k = 3
+	while level:
+		k += 1
+		
+		parents = {}
+		for bx, by in level:
+			parents.setdefault((bx >> 1, by >> 1), None)
+		
+		for px, py in parents:
+			children = tuple(level.get((px * 2 + dx, py * 2 + dy), 0) for dy in (0, 1) for dx in (0, 1))
+			parents[(px, py)] = write_node((k,) + children, "%d %d %d %d %d\n" % ((k,) + children))
+		
+		level = parents
+		
+		if list(level) == [(0, 0)]:
+			break
+
+# Returns (k, width, height, counts) of a thumbnail of a pattern, where each cell of the thumbnail counts the live cells in a k x k block of the pattern, up to 255.
+# The counts are held a column at a time, with each column padded to a multiple of 4 bytes, like the buffers drawn by CGOL_Render.
+def thumbnail(pattern):
+	k = max(math.ceil(max(len(pattern), len(pattern[0])) / THUMBNAIL_SIZE), 1)
+	
+	width = math.ceil(len(pattern) / k)
+	height = math.ceil(len(pattern[0]) / k)
+	stride = (height + 3) & ~3
+	
+	counts = bytearray(stride * width)
+	for x, column in enumerate(pattern):
+		for m in re.finditer(b"\x01+", column):
+			for y in range(m.start(), m.end()):
+				i = x // k * stride + y // k
+				counts[i] = min(counts[i] + 1, 255)
+	
+	return k, width, height, bytes(counts)
+
+# An index of every pattern file under a directory, with the size, population, content hash and a thumbnail of each, and a cache of the most recently used patterns.
+# Files are only parsed when they're new or their modification time changes. See refresh()
+class pattern_library:
+	def __init__(self, dn=PATTERN_DIR, budget=LIBRARY_CACHE_BUDGET):
+		self.dn = dn
+		self.budget = budget
+		
+		# Maps the path of each pattern file, relative to dn, to a dict of what's known about it.
+		self.entries = {}
+		
+		# Parsed patterns by absolute path, least recently used first, each with the modification time it was read at. And the number of cells they hold.
+		self.patterns = collections.OrderedDict()
+		self.size = 0
+	
+	# Scan the directory, indexing any pattern files that are new or have changed since the last scan, and forgetting any that are gone.
+	# Returns the number of files that had to be parsed.
+	def refresh(self):
+		found = {}
+		for root, dirs, files in os.walk(self.dn):
+			# Visit directories in a stable order.
+			dirs.sort()
+			
+			for fn in files:
+				if os.path.splitext(fn)[-1].lower() in EXTENSIONS:
+					path = os.path.join(root, fn)
+					found[os.path.relpath(path, self.dn)] = path
+		
+		parsed = 0
+		entries = {}
+		for rel, path in sorted(found.items()):
+			try:
+				mtime = os.stat(path).st_mtime_ns
+			except OSError:
+				continue
+			
+			entry = self.entries.get(rel)
+			if entry is None or entry["mtime"] != mtime:
+				try:
+					pattern = self.load(path)
+				except (OSError, ValueError, KeyError):
+					continue
+				
+				k, width, height, counts = thumbnail(pattern)
+				
+				entry = {
+					"path": rel,
+					"name": os.path.splitext(os.path.basename(rel))[0],
+					"mtime": mtime,
+					"width": len(pattern),
+					"height": len(pattern[0]),
+					"population": sum(column.count(1) for column in pattern),
+					"hash": hashlib.blake2b(b"%d %d " % (len(pattern), len(pattern[0])) + b"".join(pattern), digest_size=8).hexdigest(),
+					"thumbnail": (k, width, height, counts),
+				}
+				parsed += 1
+			
+			entries[rel] = entry
+		
+		self.entries = entries
+		
+		return parsed
+	
+	# Returns the entries whose path contains every word of the query, ignoring case, sorted by path.
+	def search(self, query=""):
+		words = query.lower().split()
+		
+		return [e for rel, e in sorted(self.entries.items()) if all(w in rel.lower() for w in words)]
+	
+	# Returns the parsed pattern in a file, reading it only if it isn't cached or has changed since.
+	# A relative path is looked up from the working directory first, then from the library's directory.
+	# Raises ValueError if the file can't be read. The pattern is shared with the cache, so it mustn't be modified.
+	def load(self, path):
+		if not os.path.isabs(path) and not os.path.exists(path):
+			path = os.path.join(self.dn, path)
+		
+		path = os.path.abspath(path)
+		mtime = os.stat(path).st_mtime_ns
+		
+		cached = self.patterns.get(path)
+		if cached is not None and cached[0] == mtime:
+			self.patterns.move_to_end(path)
+			return cached[1]
+		
+		pattern = read(path)
+		
+		if cached is not None:
+			self.size -= len(cached[1]) * len(cached[1][0])
+		
+		self.patterns[path] = (mtime, pattern)
+		self.size += len(pattern) * len(pattern[0])
+		
+		while self.size > self.budget and len(self.patterns) > 1:
+			old_path, (old_mtime, old) = self.patterns.popitem(last=False)
+			self.size -= len(old) * len(old[0])
+		
+		return pattern
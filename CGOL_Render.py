@@ -0,0 +1,361 @@
+import collections
+import math
+
+# Colors used to draw the board, as (r, g, b).
+OUTSIDE_COLOR = (10, 10, 10)
+DEAD_COLOR = (25, 25, 25)
+LIVE_COLOR = (230, 230, 230)
+PREVIEW_COLOR = (210, 230, 210)
+
+# Values of the cells in the image buffer. These index the image's color table.
+DEAD = 0
+LIVE = 1
+
+# When zoomed out, each pixel shows a block of squares, and the image buffer holds how many squares of each block are alive, up to MAX_COUNT.
+MAX_COUNT = 255
+
+# The furthest the camera can zoom out, as the number of squares across each pixel.
+MAX_BLOCK_SIZE = 16
+
+# Frames are drawn in tiles of about this many pixels across, which are cached so panning only draws the tiles that come into view.
+TILE_PIXELS = 256
+
+# Round a camera scale to one that can be drawn exactly: a whole number of pixels per square, or a whole number of squares per pixel.
+def snap_scale(s):
+	if s >= 1:
+		return round(s)
+	
+	return 1 / round(1 / s)
+
+# Returns the region of the grid visible through the camera on a pixmap with the given size.
+# left and top are the (fractional) grid coordinates of the pixmap's top-left corner. x0, y0, x1 and y1 bound the squares that are at least partly visible.
+def visible_region(cam, width, height):
+	w2 = width / 2 / cam.s
+	h2 = height / 2 / cam.s
+	
+	left = cam.x - w2
+	top = cam.y - h2
+	right = cam.x + w2 + 1
+	bottom = cam.y + h2 + 1
+	
+	return left, top, math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom)
+
+# Returns the runs of consecutive columns in x0 to x1 that are in the given set, as (first, last + 1).
+def column_runs(columns, x0, x1):
+	runs = []
+	for x in sorted(columns):
+		if x < x0 or x >= x1:
+			continue
+		
+		if runs and runs[-1][1] == x:
+			runs[-1][1] = x + 1
+		else:
+			runs.append([x, x + 1])
+	
+	return runs
+
+# The length in bytes of each column in an image buffer holding rows y0 to y1. Image rows must be a multiple of 4 bytes long.
+def stride(y0, y1):
+	return (y1 - y0 + 3) & ~3
+
+# Rendered tiles, least recently used first. Once they take up more than budget bytes, the least recently used are dropped.
+class tile_cache:
+	def __init__(self, budget=32 * 1024 * 1024):
+		self.budget = budget
+		
+		# The images, by (frame, tile x, tile y, scale), and the total size of them in bytes.
+		self.tiles = collections.OrderedDict()
+		self.size = 0
+	
+	# Returns the tile with this key, or None.
+	def get(self, key):
+		tile = self.tiles.get(key)
+		if tile is not None:
+			self.tiles.move_to_end(key)
+		
+		return tile
+	
+	def put(self, key, tile):
+		if key in self.tiles:
+			self.size -= self.tiles[key].sizeInBytes()
+		
+		self.tiles[key] = tile
+		self.size += tile.sizeInBytes()
+		
+		while self.size > self.budget and len(self.tiles) > 1:
+			old_key, old_tile = self.tiles.popitem(last=False)
+			self.size -= old_tile.sizeInBytes()
+	
+	def clear(self):
+		self.tiles.clear()
+		self.size = 0
+
+# Returns the color table for zoomed out views where each pixel shows k x k squares, indexed by the number of them that are alive.
+def density_colors(k):
+	from PyQt5 import QtGui
+	
+	table = [QtGui.qRgb(*DEAD_COLOR)]
+	for count in range(1, MAX_COUNT + 1):
+		# Even a single live square should stand out from an empty block.
+		f = 0.25 + 0.75 * min(count / (k * k), 1)
+		
+		table.append(QtGui.qRgb(*[round(d + (l - d) * f) for d, l in zip(DEAD_COLOR, LIVE_COLOR)]))
+	
+	return table
+
+# Draws a frame by writing the visible squares into a one-byte-per-cell image and scaling it onto the pixmap in one call.
+# The grid provides the image through cell_buffer(), so only one bulk operation per column is done in Python, rather than one Qt call per live cell.
+# If nothing but the frame has changed since the last render, only the columns that the engine reported changing since the last drawn frame are repainted. See CGOL_grid.changed_columns_since()
+# Otherwise, the frame is drawn in tiles, which are cached so that panning only needs to draw the tiles that come into view.
+# Below one pixel per square, each pixel shows the density of a block of squares instead. See CGOL_grid.block_counts()
+class image_renderer:
+	name = "image"
+	
+	def __init__(self, tile_budget=32 * 1024 * 1024):
+		self.color_table = None
+		self.preview_table = None
+		
+		# Rendered tiles of recent frames. See draw_tiles()
+		self.tiles = tile_cache(tile_budget)
+		
+		# Everything that decides where squares end up on the pixmap, as of the last render. If any of it changes, the whole pixmap is redrawn.
+		self.view = None
+		
+		# The pixmap's cacheKey() after the last render. It changes whenever the pixmap is replaced or painted on by anything else.
+		self.pixmap_key = None
+		
+		# The frame drawn by the last render, and the grid's frames_written at the time.
+		self.frame = None
+		self.frames_written = None
+		
+		# Whether the last render drew the placement preview, which has to be erased by a full redraw.
+		self.drew_preview = False
+		
+		# Color tables for zoomed out views, by block size.
+		self.density_tables = {}
+		
+		# The image of block densities made by the last zoomed out render, and what it was made from.
+		self.density_image = None
+		self.density_key = None
+		
+		# The bounding box of the pattern in the frame last drawn zoomed out, for unbounded grids, and the frame it's for.
+		self.box = None
+		self.box_key = None
+	
+	def render(self, cgol, window, cam, elem):
+		from PyQt5 import QtGui
+		
+		if self.color_table is None:
+			self.color_table = [QtGui.qRgb(*DEAD_COLOR), QtGui.qRgb(*LIVE_COLOR)]
+			self.preview_table = [QtGui.qRgba(0, 0, 0, 0), QtGui.qRgb(*PREVIEW_COLOR)]
+		
+		pix = elem.pixmap()
+		
+		rect = pix.rect()
+		left, top, x0, y0, x1, y1 = visible_region(cam, rect.width(), rect.height())
+		
+		# Bounded grids only cover part of the view.
+		if not cgol.is_unbounded:
+			x0, y0 = max(x0, 0), max(y0, 0)
+			x1, y1 = min(x1, cgol.width), min(y1, cgol.height)
+		
+		# Zoomed out views are drawn entirely differently.
+		if cam.s < 1:
+			painter = QtGui.QPainter(pix)
+			
+			painter.fillRect(0, 0, rect.width(), rect.height(), QtGui.QColor.fromRgb(*OUTSIDE_COLOR))
+			self.render_density(cgol, window, cam, painter, left, top, x0, y0, x1, y1)
+			
+			elem.update()
+			painter.end()
+			
+			# The next render at a normal zoom must start over.
+			self.view = None
+			
+			return
+		
+		view = (id(cgol), cgol.revision, cgol.width, cgol.height, cam.x, cam.y, cam.s, rect.width(), rect.height())
+		
+		# Find the columns that changed since the last render, if the last drawn frame hasn't been overwritten in the history ring.
+		columns = None
+		if view == self.view and pix.cacheKey() == self.pixmap_key and not cgol.is_placing and not self.drew_preview and cgol.frames_written - self.frames_written < cgol.depth - 1:
+			columns = cgol.changed_columns_since(self.frame)
+		
+		painter = QtGui.QPainter(pix)
+		
+		if columns is None:
+			# Clear the pixmap. Everything inside the grid is covered by the image below.
+			painter.fillRect(0, 0, rect.width(), rect.height(), QtGui.QColor.fromRgb(*OUTSIDE_COLOR))
+			
+			if x1 > x0 and y1 > y0:
+				self.draw_tiles(cgol, cam, painter, left, top, x0, y0, x1, y1)
+				
+				if cgol.is_placing:
+					self.draw_preview(cgol, window, cam, painter, left, top, x0, y0, x1, y1)
+		
+		elif y1 > y0:
+			# Repaint each run of neighboring changed columns that is in view.
+			for a, b in column_runs(columns, x0, x1):
+				self.draw_buffer(painter, cam, cgol.cell_buffer(a, y0, b, y1, stride(y0, y1)), self.color_table, left, top, a, y0, b, y1)
+		
+		elem.update()
+		painter.end()
+		
+		self.view = view
+		self.pixmap_key = pix.cacheKey()
+		self.frame = cgol.current
+		self.frames_written = cgol.frames_written
+		self.drew_preview = cgol.is_placing
+		
+		if cgol.stats.enabled:
+			cgol.stats.count("full_renders" if columns is None else "partial_renders")
+	
+	# Returns an image of the squares in columns x0 to x1 and rows y0 to y1, given as a buffer like the one returned by cell_buffer(), at one pixel per square.
+	def make_image(self, buf, color_table, x0, y0, x1, y1):
+		from PyQt5 import QtGui
+		
+		# The image doesn't copy its data, so it must be kept alive until it's transformed into a new image.
+		data = bytes(buf)
+		
+		# Each row of the image is one column of the grid.
+		image = QtGui.QImage(data, y1 - y0, x1 - x0, stride(y0, y1), QtGui.QImage.Format_Indexed8)
+		image.setColorTable(color_table)
+		
+		# Transpose the image so its rows become columns again. This is cheap while the image is still one pixel per square.
+		return image.transformed(QtGui.QTransform(0, 1, 1, 0, 0, 0))
+	
+	# Scale the squares in columns x0 to x1 and rows y0 to y1, given as a buffer like the one returned by cell_buffer(), onto the pixmap.
+	def draw_buffer(self, painter, cam, buf, color_table, left, top, x0, y0, x1, y1):
+		from PyQt5 import QtCore
+		
+		painter.drawImage(QtCore.QRectF((x0 - left) * cam.s, (y0 - top) * cam.s, (x1 - x0) * cam.s, (y1 - y0) * cam.s), self.make_image(buf, color_table, x0, y0, x1, y1))
+	
+	# Draw the squares in columns x0 to x1 and rows y0 to y1 from cached tiles, rendering any that aren't cached.
+	# Tiles are squares of whole cells, lined up with the grid's origin, so the same tiles can be reused wherever the camera is.
+	def draw_tiles(self, cgol, cam, painter, left, top, x0, y0, x1, y1):
+		from PyQt5 import QtCore
+		
+		size = max(TILE_PIXELS // cam.s, 1)
+		
+		# A frame's contents only change if it's edited, or overwritten by a new frame.
+		frame = (id(cgol), cgol.current, cgol.revision, cgol.frames_written, cgol.width, cgol.height)
+		
+		hits = 0
+		misses = 0
+		for tx in range(x0 // size, -(-x1 // size)):
+			for ty in range(y0 // size, -(-y1 // size)):
+				key = (frame, tx, ty, cam.s)
+				
+				tile = self.tiles.get(key)
+				if tile is None:
+					a0, b0 = tx * size, ty * size
+					a1, b1 = a0 + size, b0 + size
+					
+					if not cgol.is_unbounded:
+						a1, b1 = min(a1, cgol.width), min(b1, cgol.height)
+					
+					image = self.make_image(cgol.cell_buffer(a0, b0, a1, b1, stride(b0, b1)), self.color_table, a0, b0, a1, b1)
+					tile = image.scaled((a1 - a0) * cam.s, (b1 - b0) * cam.s)
+					
+					self.tiles.put(key, tile)
+					misses += 1
+				
+				else:
+					hits += 1
+				
+				painter.drawImage(QtCore.QPointF((tx * size - left) * cam.s, (ty * size - top) * cam.s), tile)
+		
+		if cgol.stats.enabled:
+			cgol.stats.count("tile_cache_hits", hits)
+			cgol.stats.count("tile_cache_misses", misses)
+	
+	# Draw each block of squares as one pixel, shaded by how many of its squares are alive.
+	# The image of the blocks is kept until the frame changes, so panning and zooming around a paused simulation only costs a blit.
+	def render_density(self, cgol, window, cam, painter, left, top, x0, y0, x1, y1):
+		from PyQt5 import QtCore, QtGui
+		
+		k = round(1 / cam.s)
+		
+		# The whole grid is counted up at once, so the image can be reused while panning.
+		if not cgol.is_unbounded:
+			bx0, by0 = 0, 0
+			bx1, by1 = -(-cgol.width // k), -(-cgol.height // k)
+		
+		# Unbounded grids are counted up within the bounding box of the pattern, unless that's much bigger than the view.
+		else:
+			frame_key = (id(cgol), cgol.current, cgol.revision, cgol.frames_written)
+			if frame_key != self.box_key:
+				self.box = cgol.bounding_box()
+				self.box_key = frame_key
+			
+			if self.box is not None and (self.box[2] - self.box[0]) * (self.box[3] - self.box[1]) <= 4 * (x1 - x0) * (y1 - y0):
+				x0, y0, x1, y1 = self.box
+			
+			bx0, by0 = x0 // k, y0 // k
+			bx1, by1 = -(-x1 // k), -(-y1 // k)
+		
+		if bx1 <= bx0 or by1 <= by0:
+			return
+		
+		key = (id(cgol), cgol.current, cgol.revision, cgol.frames_written, cgol.width, cgol.height, k, bx0, by0, bx1, by1)
+		if key != self.density_key:
+			if k not in self.density_tables:
+				self.density_tables[k] = density_colors(k)
+			
+			# The image doesn't copy its data, so it must be kept alive until it's transformed into a new image.
+			data = bytes(cgol.block_counts(k, bx0, by0, bx1, by1, stride(by0, by1)))
+			
+			image = QtGui.QImage(data, by1 - by0, bx1 - bx0, stride(by0, by1), QtGui.QImage.Format_Indexed8)
+			image.setColorTable(self.density_tables[k])
+			
+			self.density_image = image.transformed(QtGui.QTransform(0, 1, 1, 0, 0, 0))
+			self.density_key = key
+		
+		image = self.density_image
+		
+		# The transformed image is no longer indexed, so the preview is drawn in with its actual color.
+		if cgol.is_placing:
+			image = image.copy()
+			
+			pattern = cgol.pattern
+			
+			x = math.floor(left + window.label.mouse_x / cam.s)
+			y = math.floor(top + (window.label.mouse_y + 10) / cam.s)
+			
+			for a in range(len(pattern)):
+				for b in range(len(pattern[a])):
+					if pattern[a][b]:
+						bx, by = (x + a) // k - bx0, (y + b) // k - by0
+						if 0 <= bx < bx1 - bx0 and 0 <= by < by1 - by0:
+							image.setPixel(bx, by, QtGui.qRgb(*PREVIEW_COLOR))
+		
+		painter.drawImage(QtCore.QRectF((bx0 * k - left) * cam.s, (by0 * k - top) * cam.s, (bx1 - bx0) * k * cam.s, (by1 - by0) * k * cam.s), image)
+	
+	# Draw the pattern being placed over the frame, at the same position as CGOL_grid.render_cells() draws it.
+	def draw_preview(self, cgol, window, cam, painter, left, top, x0, y0, x1, y1):
+		pattern = cgol.pattern
+		
+		x = math.floor(left + window.label.mouse_x / int(cam.s))
+		y = math.floor(top + (window.label.mouse_y + 10) / int(cam.s))
+		
+		if not cgol.is_unbounded:
+			x, y = max(x, 0), max(y, 0)
+		
+		# The part of the pattern that's in view
+		a0, b0 = max(x, x0), max(y, y0)
+		a1, b1 = min(x + len(pattern), x1), min(y + len(pattern[0]), y1)
+		
+		if a1 <= a0 or b1 <= b0:
+			return
+		
+		# Everything but the pattern's live cells is transparent. See preview_table.
+		buf = bytearray(stride(b0, b1) * (a1 - a0))
+		for a in range(a0, a1):
+			column = pattern[a - x]
+			offset = (a - a0) * stride(b0, b1) - b0
+			
+			for b in range(b0, b1):
+				if column[b - y]:
+					buf[offset + b] = LIVE
+		
+		self.draw_buffer(painter, cam, buf, self.preview_table, left, top, a0, b0, a1, b1)
@@ -0,0 +1,121 @@
+import collections
+import json
+import threading
+import time
+
+# Collects timings and counts from the hot paths (step, render and the mainloop) for the performance overlay and trace files.
+# Call sites check enabled before measuring anything, so a disabled instance costs one attribute lookup per step or render.
+class instrumentation:
+	def __init__(self, window_size=60):
+		# Whether anything should be measured at all.
+		self.enabled = False
+		
+		# The most recent window_size samples of each measurement, by name.
+		self.window_size = window_size
+		self.samples = {}
+		
+		# The most recent value of each measurement, with any extra fields it was recorded with.
+		self.latest = {}
+		
+		# Running totals, by name.
+		self.counters = {}
+		
+		# An open file that every sample is also written to as a line of JSON, or None.
+		self.trace = None
+		self.trace_lock = threading.Lock()
+		
+		self.start_time = time.perf_counter()
+	
+	# Record one sample of a measurement, e.g. record("step", 0.012, frame=4, population=210).
+	# Safe to call from the simulation and render threads at the same time.
+	def record(self, name, value, **fields):
+		samples = self.samples.get(name)
+		if samples is None:
+			samples = self.samples.setdefault(name, collections.deque(maxlen=self.window_size))
+		
+		samples.append(value)
+		self.latest[name] = (value, fields)
+		
+		if self.trace is not None:
+			line = json.dumps({"event": name, "t": time.perf_counter() - self.start_time, "value": value, **fields})
+			
+			with self.trace_lock:
+				if self.trace is not None:
+					self.trace.write(line + "\n")
+	
+	# Add to a running total.
+	def count(self, name, n=1):
+		self.counters[name] = self.counters.get(name, 0) + n
+	
+	# The average of the recent samples of a measurement, or None if there are none.
+	def mean(self, name):
+		samples = self.samples.get(name)
+		if not samples:
+			return None
+		
+		return sum(samples) / len(samples)
+	
+	# The most recent value of a field recorded with a measurement, or None.
+	def last(self, name, field=None):
+		if name not in self.latest:
+			return None
+		
+		value, fields = self.latest[name]
+		
+		return value if field is None else fields.get(field)
+	
+	# Start writing every sample to a file, one JSON object per line.
+	def open_trace(self, fn):
+		self.close_trace()
+		
+		with self.trace_lock:
+			self.trace = open(fn, "w")
+	
+	def close_trace(self):
+		with self.trace_lock:
+			if self.trace is not None:
+				self.trace.close()
+				self.trace = None
+	
+	# Forget all samples and counters.
+	def reset(self):
+		self.samples = {}
+		self.latest = {}
+		self.counters = {}
+	
+	# A few lines describing recent performance, for the overlay.
+	def summary(self):
+		lines = []
+		
+		step = self.mean("step")
+		if step is not None:
+			lines.append("Step: %.2f ms (%.1f gens/s)" % (step * 1000, 1 / step if step > 0 else 0))
+		
+		render = self.mean("render")
+		if render is not None:
+			lines.append("Render: %.2f ms" % (render * 1000))
+		
+		frame_latency = self.mean("frame_latency")
+		if frame_latency is not None:
+			lines.append("Frame latency: %.2f ms" % (frame_latency * 1000))
+		
+		render_latency = self.mean("render_latency")
+		if render_latency is not None:
+			lines.append("Render latency: %.2f ms" % (render_latency * 1000))
+		
+		display_latency = self.mean("display_latency")
+		if display_latency is not None:
+			lines.append("Display latency: %.2f ms" % (display_latency * 1000))
+		
+		population = self.last("step", "population")
+		if population is not None:
+			lines.append("Live cells: %d" % population)
+		
+		frame = self.last("step", "frame")
+		if frame is not None:
+			lines.append("Frame: %d" % frame)
+		
+		for name in sorted(self.counters):
+			lines.append("%s: %d" % (name.replace("_", " ").capitalize(), self.counters[name]))
+		
+		return "\n".join(lines)
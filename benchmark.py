@@ -0,0 +1,375 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from CGOL import CGOL_grid, CGOL_sparse_grid, camera, headless_window
+import CGOL_Engines
+import CGOL_Patterns
+
+# Times the given engine on a random soup. Returns the average time per generation in seconds.
+def time_engine(name, width, height, generations, is_periodic, seed=0):
+	random.seed(seed)
+	
+	cgol = CGOL_grid(width, height, engine=name)
+	cgol.randomize()
+	cgol.inc_current()
+	
+	window = headless_window()
+	
+	try:
+		# Keep the per-step log line off the terminal.
+		with contextlib.redirect_stdout(io.StringIO()):
+			# The first step fills the engine's caches and starts any worker processes, which isn't what's being measured.
+			cgol.step(window, is_periodic)
+			cgol.inc_current()
+			
+			start = time.perf_counter()
+			for i in range(generations):
+				cgol.step(window, is_periodic)
+				cgol.inc_current()
+			
+			elapsed = time.perf_counter() - start
+	
+	finally:
+		if hasattr(cgol.engine, "close"):
+			cgol.engine.close()
+	
+	return elapsed / generations
+
+# Compare every available engine against the original pure Python loops.
+def compare_engines(sizes, generations):
+	for width, height in sizes:
+		for is_periodic in (True, False):
+			print("%dx%d, %s:" % (width, height, "periodic" if is_periodic else "finite"))
+			
+			baseline = None
+			for name in reversed(CGOL_Engines.available_engines()):
+				t = time_engine(name, width, height, generations, is_periodic)
+				
+				if baseline is None:
+					baseline = t
+				
+				print("\t%-10s %9.3f ms/gen  %7.1fx" % (name, t * 1000, baseline / t))
+
+# Let a random soup settle, then compare each engine with and without skipping the tiles that can't change, and report how many tiles it had to recompute.
+def compare_settled(width, height, warmup, generations, seed=0):
+	print("%dx%d soup after %d generations:" % (width, height, warmup))
+	
+	for name in ("numpy", "bitwise"):
+		if name not in CGOL_Engines.available_engines():
+			continue
+		
+		# A single tile as wide as any grid means every column is recomputed every step.
+		for label, options in ((name, {}), (name + " (all)", {"tile_size": 10**6})):
+			random.seed(seed)
+			
+			cgol = CGOL_grid(width, height, engine="numpy" if "numpy" in CGOL_Engines.available_engines() else "bitwise")
+			cgol.randomize()
+			cgol.inc_current()
+			
+			window = headless_window()
+			
+			with contextlib.redirect_stdout(io.StringIO()):
+				for i in range(warmup):
+					cgol.step(window, True)
+					cgol.inc_current()
+				
+				cgol.set_engine(name, **options)
+				
+				# One untimed step lets the engine cache the frame it starts from.
+				cgol.step(window, True)
+				cgol.inc_current()
+				
+				cgol.stats.enabled = True
+				cgol.stats.reset()
+				
+				start = time.perf_counter()
+				for i in range(generations):
+					cgol.step(window, True)
+					cgol.inc_current()
+				
+				elapsed = time.perf_counter() - start
+			
+			counters = cgol.stats.counters
+			print("\t%-14s %9.3f ms/gen  %5.1f%% of tiles active" % (label, elapsed / generations * 1000, counters["active_tiles"] / counters["tiles"] * 100))
+
+# Time the parallel engine with 1 to max_workers worker processes.
+def compare_workers(sizes, max_workers, generations, seed=0):
+	for width, height in sizes:
+		print("%dx%d, parallel engine:" % (width, height))
+		
+		baseline = None
+		for workers in range(1, max_workers + 1):
+			random.seed(seed)
+			
+			cgol = CGOL_grid(width, height, engine="python")
+			cgol.randomize()
+			cgol.inc_current()
+			
+			window = headless_window()
+			
+			try:
+				with contextlib.redirect_stdout(io.StringIO()):
+					cgol.set_engine("parallel", workers=workers)
+					
+					# The first step starts the pool, which isn't what's being measured.
+					cgol.step(window, True)
+					cgol.inc_current()
+					
+					start = time.perf_counter()
+					for i in range(generations):
+						cgol.step(window, True)
+						cgol.inc_current()
+					
+					elapsed = (time.perf_counter() - start) / generations
+			
+			finally:
+				cgol.engine.close()
+			
+			if baseline is None:
+				baseline = elapsed
+			
+			print("\t%2d workers %9.3f ms/gen  %7.1fx" % (workers, elapsed * 1000, baseline / elapsed))
+
+# The directory of bundled patterns.
+PATTERN_DIR = CGOL_Patterns.PATTERN_DIR
+
+# Stands in for the label that render() draws to.
+class bench_label:
+	def __init__(self, width, height):
+		from PyQt5 import QtGui
+		
+		self.pix = QtGui.QPixmap(width, height)
+		self.mouse_x = 0
+		self.mouse_y = 0
+	
+	def pixmap(self):
+		return self.pix
+	
+	def update(self):
+		pass
+
+# Stands in for the window while rendering.
+class bench_render_window(headless_window):
+	def __init__(self, label):
+		super().__init__()
+		self.label = label
+
+# Returns a list of the pattern files under dn, relative to it.
+def find_patterns(dn=PATTERN_DIR):
+	found = []
+	for root, dirs, files in os.walk(dn):
+		for fn in files:
+			if os.path.splitext(fn)[-1].lower() in CGOL_Patterns.EXTENSIONS:
+				found.append(os.path.relpath(os.path.join(root, fn), dn))
+	
+	return sorted(found)
+
+# Returns the average time taken to render the current frame, centered, at a scale of 5 pixels per square.
+def time_render(cgol, width, height, repeats=3):
+	label = bench_label(800, 600)
+	cam = camera(width / 2, height / 2, 5)
+	
+	start = time.perf_counter()
+	for i in range(repeats):
+		cgol.render(bench_render_window(label), cam, label)
+	
+	return (time.perf_counter() - start) / repeats
+
+# Create a grid for a benchmark case, with the given history budget in bytes, and fill its first frame.
+# engine may also be "sparse" for an unbounded grid, or "hashlife" to fast-forward instead of stepping.
+def make_grid(engine, width, height, pattern, seed, budget):
+	if engine == "sparse":
+		cgol = CGOL_sparse_grid(width, height)
+	else:
+		cgol = CGOL_grid(width, height, budget, None if engine == "hashlife" else engine)
+	
+	random.seed(seed)
+	
+	if pattern is None:
+		cgol.randomize()
+	else:
+		cgol.open(os.path.join(PATTERN_DIR, pattern))
+		cgol.is_placing = False
+		cgol.place((width - len(cgol.pattern)) // 2, (height - len(cgol.pattern[0])) // 2, True)
+	
+	cgol.inc_current()
+	cgol.frame_ready = False
+	
+	return cgol
+
+# Run one benchmark case and return its measurements.
+def run_case(engine, width, height, generations, pattern=None, seed=0, is_periodic=True, budget=None, render=True):
+	window = headless_window()
+	
+	with contextlib.redirect_stdout(io.StringIO()):
+		# Memory is measured on a separate short run, since tracing allocations slows everything down.
+		tracemalloc.start()
+		cgol = make_grid(engine, width, height, pattern, seed, budget)
+		
+		# What the grid holds before stepping, which is mostly its history.
+		grid_memory = tracemalloc.get_traced_memory()[0]
+		
+		if engine == "hashlife":
+			cgol.fast_forward(window, cgol.get_generation() + min(generations, 8), is_periodic)
+		else:
+			cgol.step_n(window, min(generations, 8), is_periodic)
+		
+		peak_memory = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+		
+		del cgol
+		
+		# Timed run
+		cgol = make_grid(engine, width, height, pattern, seed, budget)
+		
+		start = time.perf_counter()
+		
+		if engine == "hashlife":
+			cgol.fast_forward(window, cgol.get_generation() + generations, is_periodic)
+		else:
+			cgol.step_n(window, generations, is_periodic)
+		
+		elapsed = time.perf_counter() - start
+		
+		cgol.inc_current()
+		
+		# Render the final frame at a scale of 5, with the image renderer and with the original one cell at a time renderer.
+		render_time = None
+		cell_render_time = None
+		if render:
+			render_time = time_render(cgol, width, height)
+			
+			renderer = cgol.renderer
+			cgol.renderer = None
+			
+			cell_render_time = time_render(cgol, width, height)
+			
+			cgol.renderer = renderer
+		
+		if hasattr(cgol.engine, "close"):
+			cgol.engine.close()
+	
+	return {
+		"engine": engine,
+		"pattern": pattern,
+		"seed": seed if pattern is None else None,
+		"width": width,
+		"height": height,
+		"periodic": is_periodic,
+		"generations": generations,
+		"seconds": elapsed,
+		"generations_per_second": generations / elapsed,
+		"cells_per_second": width * height * generations / elapsed,
+		"peak_memory_bytes": peak_memory,
+		"grid_memory_bytes": grid_memory,
+		"history_frames": cgol.depth,
+		"render_seconds": render_time,
+		"cell_render_seconds": cell_render_time,
+	}
+
+# Run every combination of engine, board size and generation count, on every bundled pattern and on seeded random soups.
+def run_suite(engines, sizes, generation_counts, soups=3, patterns=None, budget=None, render=True):
+	if patterns is None:
+		patterns = find_patterns()
+	
+	if render:
+		# Rendering needs a Qt application, but not a display.
+		os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+		
+		from PyQt5.QtWidgets import QApplication
+		app = QApplication.instance() or QApplication([])
+	
+	cases = [(None, seed) for seed in range(soups)] + [(pattern, None) for pattern in patterns]
+	
+	results = []
+	for engine in engines:
+		for width, height in sizes:
+			for generations in generation_counts:
+				for pattern, seed in cases:
+					# HashLife can't wrap around the edges, and unbounded grids have none.
+					result = run_case(engine, width, height, generations, pattern, seed, engine not in ("sparse", "hashlife"), budget, render)
+					results.append(result)
+					
+					print("%-8s %4dx%-4d %6d gens  %-45s %10.1f gens/s %12.0f cells/s %8.1f KiB%s" % (
+						engine, width, height, generations, pattern or "soup %d" % seed,
+						result["generations_per_second"], result["cells_per_second"], result["peak_memory_bytes"] / 1024,
+						"" if result["render_seconds"] is None else "  render %.1f ms (one call per cell %.1f ms)" % (result["render_seconds"] * 1000, result["cell_render_seconds"] * 1000)
+					))
+	
+	return results
+
+# Describe the environment and code the results came from, so runs can be compared across commits.
+def describe_run(settings):
+	try:
+		commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+	except OSError:
+		commit = None
+	
+	return {
+		"commit": commit,
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"numpy": CGOL_Engines.np.__version__ if CGOL_Engines.np is not None else None,
+		"platform": platform.platform(),
+		"cpus": os.cpu_count(),
+		"settings": settings,
+	}
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description="Benchmark the simulation engines.")
+	
+	parser.add_argument("--suite", action="store_true", help="Run the full suite over the bundled patterns and random soups, instead of the quick engine comparison.")
+	parser.add_argument("-n", "--generations", default="10", help="Comma separated generation counts. The quick comparison only uses the first.")
+	parser.add_argument("-e", "--engines", default=None, help="Comma separated engines to run in the suite. Besides the step engines, sparse and hashlife are accepted. Defaults to the fastest available.")
+	parser.add_argument("-S", "--sizes", default="64,256", help="Comma separated board sizes for the suite, as N or WxH.")
+	parser.add_argument("--soups", type=int, default=3, help="Number of seeded random soups in the suite.")
+	parser.add_argument("--history-budget", type=int, default=None, help="Bytes of history to keep for each bounded grid. Defaults to CGOL.HISTORY_BUDGET.")
+	parser.add_argument("--no-render", action="store_true", help="Don't time render(), e.g. if PyQt5 isn't installed.")
+	parser.add_argument("-o", "--output", default=None, help="File to write the suite's results to, as JSON.")
+	
+	return parser.parse_args(argv)
+
+if __name__ == "__main__":
+	args = parse_args(sys.argv[1:])
+	
+	generation_counts = [int(n) for n in args.generations.split(",")]
+	
+	if not args.suite:
+		generations = generation_counts[0]
+		
+		compare_engines([(64, 64), (256, 256), (512, 512)], generations)
+		compare_settled(256, 256, 1000, generations)
+		compare_workers([(512, 512), (1024, 1024)], os.cpu_count() or 1, generations)
+	
+	else:
+		engines = args.engines.split(",") if args.engines else [CGOL_Engines.available_engines()[0]]
+		
+		sizes = []
+		for size in args.sizes.split(","):
+			width, x, height = size.partition("x")
+			sizes.append((int(width), int(height or width)))
+		
+		settings = {
+			"engines": engines,
+			"sizes": sizes,
+			"generations": generation_counts,
+			"soups": args.soups,
+			"history_budget": args.history_budget,
+		}
+		
+		results = run_suite(engines, sizes, generation_counts, args.soups, None, args.history_budget, not args.no_render)
+		
+		if args.output is not None:
+			with open(args.output, "w") as fout:
+				json.dump({"run": describe_run(settings), "results": results}, fout, indent="\t")
+			
+			print("Wrote %d results to %s" % (len(results), args.output))
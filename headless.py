@@ -0,0 +1,202 @@
+import argparse
+import json
+import signal
+import sys
+import time
+
+from CGOL import CGOL_grid, CGOL_sparse_grid, RANDOM_DENSITY, SNAPSHOT_HEADER, SNAPSHOT_UNBOUNDED, headless_window
+import CGOL_Engines
+
+# Runs a simulation from the command line, without Qt.
+# Loads a pattern file or a random soup, runs it for some number of generations, then saves the final pattern and some statistics.
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description="Run Conway's Game of Life without a GUI.")
+	
+	parser.add_argument("pattern", nargs="?", help="Pattern file to start from. If omitted, a random soup is used.")
+	parser.add_argument("-r", "--resume", default=None, help="Snapshot to continue from, as saved by the GUI or --snapshot. Its size and boundary mode are used.")
+	parser.add_argument("-n", "--generations", type=int, default=100, help="Number of generations to run.")
+	parser.add_argument("-W", "--width", type=int, default=None, help="Grid width. Defaults to 256, or the pattern's width plus a margin.")
+	parser.add_argument("-H", "--height", type=int, default=None, help="Grid height. Defaults to 256, or the pattern's height plus a margin.")
+	parser.add_argument("-e", "--engine", default=None, choices=CGOL_Engines.available_engines() + ["hashlife"], help="Engine to step with. Defaults to the fastest available. hashlife jumps straight to the last generation, and only simulates an unbounded grid.")
+	parser.add_argument("-b", "--boundary", default=None, choices=["periodic", "finite", "unbounded"], help="What happens at the edges of the grid. Defaults to periodic, or unbounded with -e hashlife.")
+	parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes for the parallel engine.")
+	parser.add_argument("-s", "--seed", type=int, default=None, help="Seed for the random soup.")
+	parser.add_argument("-d", "--density", type=float, default=RANDOM_DENSITY, help="Fraction of the cells of the random soup that start alive. Defaults to a third.")
+	parser.add_argument("-o", "--output", default=None, help="File to save the final pattern to.")
+	parser.add_argument("--snapshot", default=None, help="File to save a snapshot of the whole grid to at the end, which can be resumed from.")
+	parser.add_argument("--stats", default=None, help="File to write statistics to, as JSON. Use - for stdout.")
+	parser.add_argument("--trace", default=None, help="File to write the time taken by every step to, one JSON object per line.")
+	
+	args = parser.parse_args(argv)
+	
+	if args.generations < 1:
+		parser.error("the number of generations must be positive")
+	
+	if not 0 <= args.density <= 1:
+		parser.error("the density must be between 0 and 1")
+	
+	# HashLife works on an unbounded universe, so any other boundary would be reported but not simulated.
+	if args.engine == "hashlife":
+		if args.boundary not in (None, "unbounded"):
+			parser.error("-e hashlife only supports -b unbounded")
+		
+		args.boundary = "unbounded"
+	
+	elif args.boundary is None:
+		args.boundary = "periodic"
+	
+	return args
+
+def run(args):
+	width = args.width
+	height = args.height
+	
+	# Continue from a snapshot, which decides the size and boundary mode of the grid.
+	if args.resume is not None:
+		with open(args.resume, "rb") as fin:
+			header = fin.read(SNAPSHOT_HEADER.size)
+		
+		if len(header) == SNAPSHOT_HEADER.size and SNAPSHOT_HEADER.unpack(header)[2] & SNAPSHOT_UNBOUNDED:
+			cgol = CGOL_sparse_grid(1, 1)
+		else:
+			cgol = CGOL_grid(4, 4, engine=None if args.engine == "hashlife" else args.engine)
+		
+		is_periodic = cgol.load_snapshot(args.resume)
+		if is_periodic is None:
+			return 1
+		
+		if cgol.is_unbounded:
+			args.boundary = "unbounded"
+		
+		elif args.engine == "hashlife":
+			print("Can't resume %s with -e hashlife; it's a snapshot of a bounded grid." % args.resume)
+			return 1
+		
+		else:
+			args.boundary = "periodic" if is_periodic else "finite"
+		
+		if args.workers is not None and cgol.engine.name == "parallel":
+			cgol.set_engine("parallel", workers=args.workers)
+		
+		width = cgol.width
+		height = cgol.height
+	
+	else:
+		# Read the pattern first, so the grid can be sized around it.
+		pattern = None
+		if args.pattern is not None:
+			# open() only reads the file into the grid's pattern, so a tiny grid will do.
+			loader = CGOL_sparse_grid(1, 1)
+			loader.open(args.pattern)
+			
+			if not loader.pattern or not loader.pattern[0]:
+				print("Could not read a pattern from %s" % args.pattern)
+				return 1
+			
+			pattern = loader.pattern
+			
+			if width is None:
+				width = len(pattern) + 64
+			if height is None:
+				height = len(pattern[0]) + 64
+		
+		if width is None:
+			width = 256
+		if height is None:
+			height = 256
+		
+		# Create the grid
+		if args.boundary == "unbounded":
+			cgol = CGOL_sparse_grid(width, height)
+		else:
+			cgol = CGOL_grid(width, height, engine=args.engine)
+			
+			if args.workers is not None and cgol.engine.name == "parallel":
+				cgol.set_engine("parallel", workers=args.workers)
+		
+		# Fill the first frame
+		if pattern is not None:
+			cgol.pattern = pattern
+			cgol.place((width - len(pattern)) // 2, (height - len(pattern[0])) // 2, True)
+		else:
+			cgol.randomize(args.density, args.seed)
+		
+		cgol.inc_current()
+		cgol.frame_ready = False
+	
+	# The engines' counters are only kept while the stats are enabled.
+	if args.stats is not None or args.trace is not None:
+		cgol.stats.enabled = True
+	
+	if args.trace is not None:
+		cgol.stats.open_trace(args.trace)
+	
+	start_population = cgol.get_population()
+	
+	# Ctrl-C stops the run early, and whatever has been simulated so far is still saved.
+	window = headless_window()
+	
+	def interrupt(signum, frame):
+		print("Stopping...")
+		window.is_halting = True
+	
+	signal.signal(signal.SIGINT, interrupt)
+	
+	start = time.perf_counter()
+	
+	if args.engine == "hashlife":
+		cgol.fast_forward(window, cgol.get_generation() + args.generations, False)
+	else:
+		cgol.step_n(window, args.generations, args.boundary == "periodic")
+	
+	elapsed = time.perf_counter() - start
+	
+	cgol.stats.close_trace()
+	
+	completed = cgol.frame_ready
+	if completed:
+		cgol.inc_current()
+	
+	end_population = cgol.get_population()
+	
+	if args.output is not None:
+		cgol.save(args.output)
+	
+	if args.snapshot is not None:
+		cgol.save_snapshot(args.snapshot, args.boundary == "periodic")
+	
+	stats = {
+		"pattern": args.pattern,
+		"seed": args.seed,
+		"density": args.density,
+		"width": width,
+		"height": height,
+		"boundary": args.boundary,
+		"engine": "hashlife" if args.engine == "hashlife" else cgol.engine.name,
+		"generations": args.generations,
+		"completed": completed,
+		"seconds": elapsed,
+		"generations_per_second": args.generations / elapsed if completed and elapsed > 0 else None,
+		"start_population": start_population,
+		"end_population": end_population,
+		"bounding_box": cgol.bounding_box(),
+		"cycle_start": None if cgol.cycles.cycle is None else cgol.cycles.cycle[0],
+		"cycle_period": None if cgol.cycles.cycle is None else cgol.cycles.cycle[1],
+		"counters": dict(cgol.stats.counters),
+	}
+	
+	if args.stats == "-":
+		print(json.dumps(stats, indent="\t"))
+	
+	elif args.stats is not None:
+		with open(args.stats, "w") as fout:
+			json.dump(stats, fout, indent="\t")
+	
+	else:
+		print("Ran %d generations in %.3f seconds. Population %d -> %d." % (args.generations, elapsed, start_population, end_population))
+	
+	return 0 if completed else 2
+
+if __name__ == "__main__":
+	sys.exit(run(parse_args(sys.argv[1:])))
@@ -3,14 +3,24 @@ from PyQt5.QtWidgets import QMainWindow, QApplication
 from CGOL import *
 from CGOL_Gui import *
 
-# PyQt will call this as quickly as it can while the app is running.
+# Render the current frame, then note how long it took to show since it was ready. Run on the render thread.
+def render(ready_time):
+	cgol.render(window, cam, window.label)
+	
+	if ready_time is not None:
+		cgol.stats.record("display_latency", time.perf_counter() - ready_time)
+
+# The loop_scheduler calls this whenever a thread finishes, the user does something, or the time it asked for comes.
+# Returns the number of seconds until it has something to do again, or None if it only needs to be woken.
 def mainloop():
 	global window
 	global cgol
 	global cam
 	
+	now = time.time()
+	
 	# Check if we should recreate the canvas
-	if window.last_resize is not None and time.time() - window.last_resize > 0.05:
+	if window.last_resize is not None and now - window.last_resize > 0.05:
 		window.last_resize = None
 		window.create_canvas()
 	
@@ -18,79 +28,187 @@ def mainloop():
 	if cgol.frame_ready:
 		cgol.inc_current()
 		
+		# Measure how long the frame waited to be picked up, and remember when it was ready until it's shown.
+		if cgol.stats.enabled and cgol.frame_ready_time is not None:
+			cgol.stats.record("frame_latency", time.perf_counter() - cgol.frame_ready_time, frame=cgol.current)
+			window.unshown_frame_time = cgol.frame_ready_time
+			cgol.frame_ready_time = None
+		
 		# Increment the viewed frame and queue a render.
 		cgol.frame_ready = False
 		window.render_queued = True
 	
+	# Stop playing once the board repeats, if asked to.
+	if cgol.cycle_found:
+		cgol.cycle_found = False
+		
+		if window.pause_on_cycle and window.is_playing:
+			window.toggle_play()
+	
 	# Always render while placing.
 	if cgol.is_placing:
 		window.render_queued = True
 	
-	# In between renders, check if a resize is queued
-	if (window.resize_queued is not None or cgol.resize_queued is not None) and not window.render_thread.is_alive() and not window.simulation_thread.is_alive():
-		resize = None
-		if window.resize_queued is not None:
-			resize = window.resize_queued
-		else:
-			resize = cgol.resize_queued
-		
+	# While not simulating a frame, check if a resize is queued. Most resizes can happen during a render, which just draws the grid again afterwards. See CGOL_grid.can_resize_during_render()
+	resize = window.resize_queued if window.resize_queued is not None else cgol.resize_queued
+	if resize is not None and not window.simulation_thread.is_alive() and (not window.render_thread.is_alive() or cgol.can_resize_during_render(*resize)):
 		# Adjust the camera's position
-		window.proxy_cam.x += resize[0]
-		window.proxy_cam.y += resize[1]
-		
-		cgol.resize(*resize)
+		if cgol.resize(*resize):
+			window.proxy_cam.x += resize[0]
+			window.proxy_cam.y += resize[1]
 		
 		window.resize_queued = None
 		cgol.resize_queued = None
 	
+	# In between renders and frames, check if a snapshot should be saved or loaded.
+	if window.snapshot_queued is not None and not window.render_thread.is_alive() and not window.simulation_thread.is_alive():
+		action, fn = window.snapshot_queued
+		
+		if action == "save":
+			cgol.save_snapshot(fn, window.is_periodic)
+		
+		else:
+			is_periodic = cgol.load_snapshot(fn)
+			
+			# Continue with the boundary mode the snapshot was saved with.
+			if is_periodic is not None and is_periodic != window.is_periodic:
+				window.toggle_period()
+		
+		window.snapshot_queued = None
+	
 	# While not simulating a frame, check if a place is queued.
 	if cgol.place_queued is not None and not window.simulation_thread.is_alive():
 		cgol.place(*cgol.place_queued)
 		cgol.place_queued = None
 	
+	# While not simulating a frame, check if a fast-forward is queued.
+	if cgol.fast_forward_queued is not None and not window.simulation_thread.is_alive():
+		window.simulation_thread = loop_thread(window, cgol.fast_forward, (window, cgol.fast_forward_queued, window.is_periodic))
+		window.simulation_thread.start()
+		
+		cgol.fast_forward_queued = None
+	
+	# While not simulating a frame, check if a seek is queued.
+	if cgol.seek_queued is not None and not window.simulation_thread.is_alive():
+		window.simulation_thread = loop_thread(window, cgol.seek, (window, cgol.seek_queued))
+		window.simulation_thread.start()
+		
+		cgol.seek_queued = None
+	
+	# While not simulating a frame, check if a batch of steps is queued.
+	if cgol.step_n_queued is not None and not window.simulation_thread.is_alive():
+		window.simulation_thread = loop_thread(window, cgol.step_n, (window, cgol.step_n_queued, window.is_periodic))
+		window.simulation_thread.start()
+		
+		cgol.step_n_queued = None
+	
+	# While not simulating a frame, check if an engine change is queued.
+	if cgol.engine_queued is not None and not window.simulation_thread.is_alive():
+		cgol.set_engine(cgol.engine_queued)
+		cgol.engine_queued = None
+	
+	# Show the progress of a batch of steps in the title bar.
+	window.show_progress(cgol.progress)
+	
+	# Note when a render was first requested, to measure how long it waits to be started.
+	if cgol.stats.enabled and window.render_requested_time is None and (window.render_queued or cgol.render_queued):
+		window.render_requested_time = time.perf_counter()
+	
 	# If a new frame isn't ready, check if the application is requesting a render.
 	# If changes have been made and enough time has passed since the previous render AND we are not already rendering, launch another render thread.
-	if (window.render_queued or cgol.render_queued) and time.time() - window.last_render_time > window.render_delay and not window.render_thread.is_alive():
+	if (window.render_queued or cgol.render_queued) and now - window.last_render_time > window.render_delay and not window.render_thread.is_alive():
 		# Copy the proxy cam into the real cam
 		window.cam.x = window.proxy_cam.x
 		window.cam.y = window.proxy_cam.y
-		window.cam.s = round(window.proxy_cam.s) # The proxy camera must be able to have non-integer scales, but the real camera must not.
+		window.cam.s = CGOL_Render.snap_scale(window.proxy_cam.s) # The proxy camera must be able to have any scale, but the real camera must be drawable exactly.
 		
 		# Start the render thread
-		window.render_thread = threading.Thread(target=CGOL_grid.render, args=(cgol, window, cam, window.label))
+		window.render_thread = loop_thread(window, render, (window.unshown_frame_time,))
 		window.render_thread.start()
 		
+		window.unshown_frame_time = None
+		
+		if window.render_requested_time is not None:
+			cgol.stats.record("render_latency", time.perf_counter() - window.render_requested_time)
+			window.render_requested_time = None
+		
 		window.render_queued = False
 		cgol.render_queued = False
-		window.last_render_time = time.time()
+		window.last_render_time = now
 	
 	# Check if we should start generating a new frame.
-	if window.is_playing and time.time() - window.last_frame_time > window.frame_delay:
+	if window.is_playing and now - window.last_frame_time > window.frame_delay:
 		cgol.step_queued = True
 	
 	# launch a thread to render the next frame.
 	if cgol.step_queued and not window.simulation_thread.is_alive():
-		window.simulation_thread = threading.Thread(target=CGOL_grid.step, args=(cgol, window, window.is_periodic))
+		window.simulation_thread = loop_thread(window, cgol.step, (window, window.is_periodic))
 		window.simulation_thread.start()
 		
-		window.last_frame_time = time.time()
+		window.last_frame_time = now
 		cgol.step_queued = False
-		
-cgol = CGOL_grid(40, 20, 2)
-
-cam = camera(20, 10, 10)
-
-cgol.randomize()
-
-app = QApplication(sys.argv)
-
-window = CGOL_Window(cgol, cam)
-window.show()
-
-cgol_loop = QTimer()
-cgol_loop.timeout.connect(mainloop)
-cgol_loop.start()
-
-app.exec()
+	
+	# Refresh the performance overlay a few times a second.
+	if cgol.stats.enabled and now - window.last_overlay_time > 0.25:
+		window.update_overlay()
+	
+	# Work out when there's next something to do. Anything waiting on a thread is done when the thread wakes the loop.
+	deadlines = []
+	
+	if window.last_resize is not None:
+		deadlines.append(window.last_resize + 0.05)
+	
+	if (window.render_queued or cgol.render_queued) and not window.render_thread.is_alive():
+		deadlines.append(window.last_render_time + window.render_delay)
+	
+	if window.is_playing and not window.simulation_thread.is_alive():
+		deadlines.append(window.last_frame_time + window.frame_delay)
+	
+	if cgol.progress is not None:
+		deadlines.append(now + PROGRESS_INTERVAL)
+	
+	if cgol.stats.enabled:
+		deadlines.append(window.last_overlay_time + 0.25)
+	
+	if not deadlines:
+		return None
+	
+	return min(deadlines) - time.time()
 
-print("Goodbye!")
\ No newline at end of file
+# Worker processes (see the parallel engine) import this module on some platforms, so only start the application when run directly.
+if __name__ == "__main__":
+	# Pass --history-budget BYTES to change how much memory the history of a fixed-size grid may take up. See CGOL.HISTORY_BUDGET
+	budget = None
+	if "--history-budget" in sys.argv:
+		budget = int(sys.argv[sys.argv.index("--history-budget") + 1])
+	
+	# Pass --unbounded to simulate an infinite plane instead of a fixed-size grid.
+	if "--unbounded" in sys.argv:
+		cgol = CGOL_sparse_grid(40, 20)
+	else:
+		cgol = CGOL_grid(40, 20, budget)
+	
+	cam = camera(20, 10, 10)
+	
+	# Pass --trace FILE to write every measurement to FILE as JSON lines.
+	if "--trace" in sys.argv:
+		cgol.stats.enabled = True
+		cgol.stats.open_trace(sys.argv[sys.argv.index("--trace") + 1])
+	
+	cgol.randomize()
+	
+	app = QApplication(sys.argv)
+	
+	window = CGOL_Window(cgol, cam)
+	window.show()
+	
+	# Run the mainloop whenever something happens, rather than as often as possible.
+	window.scheduler = loop_scheduler(mainloop)
+	app.installEventFilter(window.scheduler)
+	window.wake()
+	
+	app.exec()
+	
+	cgol.stats.close_trace()
+	
+	print("Goodbye!")
\ No newline at end of file
@@ -0,0 +1,148 @@
+import contextlib
+import io
+import unittest
+
+from CGOL import CGOL_grid, headless_window
+import CGOL_Engines
+
+# Checks that every engine agrees with the reference python engine.
+# Run with "python -m unittest".
+
+class test_engines(unittest.TestCase):
+	# Steps twice, rewinds one generation, fast-forwards over the old future, then steps from the result.
+	# Engines that cache the current frame must notice that fast_forward rewrote it.
+	def run_fast_forward(self, engine):
+		window = headless_window()
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			cgol = CGOL_grid(30, 30, engine=engine)
+			cgol.randomize(seed=3)
+			cgol.inc_current()
+			
+			for i in range(2):
+				cgol.step(window, True)
+				cgol.inc_current()
+			
+			cgol.dec_current()
+			cgol.fast_forward(window, cgol.get_generation() + 7, False)
+			cgol.inc_current()
+			
+			cgol.step(window, True)
+			cgol.inc_current()
+		
+		return cgol.get_columns(cgol.current)
+	
+	def test_fast_forward(self):
+		expected = self.run_fast_forward("python")
+		
+		for engine in CGOL_Engines.available_engines():
+			with self.subTest(engine=engine):
+				self.assertEqual(self.run_fast_forward(engine), expected)
+	
+	# A glider that stays clear of the edges lands in the same place whether it is stepped or fast-forwarded to the same generation.
+	def test_fast_forward_to_generation(self):
+		window = headless_window()
+		grids = []
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			for i in range(2):
+				cgol = CGOL_grid(40, 40)
+				for x, y in ((1, 0), (2, 1), (0, 2), (1, 2), (2, 2)):
+					cgol.set(x + 2, y + 2, False)
+				
+				cgol.inc_current()
+				
+				if i == 0:
+					cgol.step_n(window, 40, False)
+				else:
+					cgol.fast_forward(window, 40, False)
+				
+				cgol.inc_current()
+				grids.append(cgol)
+		
+		self.assertEqual([cgol.get_generation() for cgol in grids], [40, 40])
+		self.assertEqual(grids[1].get_columns(grids[1].current), grids[0].get_columns(grids[0].current))
+	
+	# HashLife can't wrap cells around the edges, and can't go backwards.
+	def test_fast_forward_refused(self):
+		window = headless_window()
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			cgol = CGOL_grid(20, 20)
+			cgol.randomize(seed=1)
+			cgol.inc_current()
+			
+			cgol.step(window, False)
+			cgol.inc_current()
+			
+			latest = cgol.latest
+			
+			cgol.fast_forward(window, 10, True)
+			cgol.fast_forward(window, 1, False)
+		
+		self.assertEqual((cgol.get_generation(), cgol.latest), (1, latest))
+	
+	# Every engine reports the columns it changed, so the population, bounding box and hash of each frame can be updated from those alone.
+	def test_changed_columns(self):
+		window = headless_window()
+		
+		for engine in CGOL_Engines.available_engines():
+			for is_periodic in (True, False):
+				with self.subTest(engine=engine, is_periodic=is_periodic), contextlib.redirect_stdout(io.StringIO()):
+					cgol = CGOL_grid(40, 30, engine=engine)
+					cgol.randomize(seed=5)
+					cgol.inc_current()
+					
+					for i in range(5):
+						before = cgol.get_columns(cgol.current)
+						
+						cgol.step(window, is_periodic)
+						cgol.inc_current()
+						
+						after = cgol.get_columns(cgol.current)
+						
+						self.assertEqual(cgol.engine.changed_columns, {x for x in range(cgol.width) if before[x] != after[x]})
+					
+					if hasattr(cgol.engine, "close"):
+						cgol.engine.close()
+	
+	# Runs a glider across a grid mostly made of still tiles, with an edit and a rewind partway through, and returns every generation.
+	def run_sparse_activity(self, engine, is_periodic):
+		window = headless_window()
+		frames = []
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			cgol = CGOL_grid(70, 50, engine=engine)
+			for x, y in ((1, 0), (2, 1), (0, 2), (1, 2), (2, 2), (40, 20), (40, 21), (41, 20), (41, 21)):
+				cgol.set(x, y, False)
+			
+			cgol.inc_current()
+			
+			for i in range(150):
+				if i == 60:
+					cgol.flip(60, 40)
+					cgol.flip(61, 40)
+					cgol.flip(62, 40)
+				
+				if i == 100:
+					cgol.dec_current()
+				
+				cgol.step(window, is_periodic)
+				cgol.inc_current()
+				frames.append(cgol.get_columns(cgol.current))
+		
+		return frames
+	
+	def test_active_tiles(self):
+		for is_periodic in (True, False):
+			expected = self.run_sparse_activity("python", is_periodic)
+			
+			for engine in ("numpy", "bitwise"):
+				if engine not in CGOL_Engines.available_engines():
+					continue
+				
+				with self.subTest(engine=engine, is_periodic=is_periodic):
+					self.assertEqual(self.run_sparse_activity(engine, is_periodic), expected)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,185 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from CGOL import CGOL_grid, CGOL_sparse_grid, headless_window
+
+# Checks the operations that fill or change a whole grid.
+# Run with "python -m unittest".
+
+# Returns the set of live cells of the current frame of a grid.
+def live_cells(cgol):
+	return {(x, y) for x in range(cgol.width) for y in range(cgol.height) if cgol.get(x, y)}
+
+class test_randomize(unittest.TestCase):
+	def randomized(self, cgol, seed):
+		with contextlib.redirect_stdout(io.StringIO()):
+			cgol.randomize(seed=seed)
+			cgol.inc_current()
+		
+		return cgol
+	
+	def test_same_seed(self):
+		a = self.randomized(CGOL_grid(40, 20), 7)
+		b = self.randomized(CGOL_grid(40, 20), 7)
+		c = self.randomized(CGOL_grid(40, 20), 8)
+		
+		self.assertEqual(live_cells(a), live_cells(b))
+		self.assertNotEqual(live_cells(a), live_cells(c))
+	
+	# A grid that was shrunk keeps its wider columns, which mustn't change what a seed gives.
+	def test_seed_after_resize(self):
+		resized = CGOL_grid(40, 30)
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			resized.resize(0, 0, 0, -10)
+		
+		fresh = self.randomized(CGOL_grid(40, 20), 7)
+		resized = self.randomized(resized, 7)
+		
+		self.assertNotEqual(fresh.col_bytes, resized.col_bytes)
+		self.assertEqual(live_cells(fresh), live_cells(resized))
+	
+	# Unbounded grids draw the cells in the same order.
+	def test_seed_unbounded(self):
+		dense = self.randomized(CGOL_grid(40, 20), 7)
+		sparse = self.randomized(CGOL_sparse_grid(40, 20), 7)
+		
+		self.assertEqual(live_cells(dense), sparse.grids[sparse.current])
+	
+	def test_density(self):
+		cgol = self.randomized(CGOL_grid(200, 200), 1)
+		
+		self.assertAlmostEqual(cgol.get_population() / 200 / 200, 1 / 3, delta=0.02)
+	
+	# Only the region is changed.
+	def test_region(self):
+		cgol = self.randomized(CGOL_grid(30, 30), 2)
+		before = live_cells(cgol)
+		
+		cgol.randomize_region(cgol.current, 5, 7, 12, 13, 1.0)
+		
+		region = {(x, y) for x in range(5, 12) for y in range(7, 13)}
+		self.assertEqual(live_cells(cgol), before - region | region)
+
+class test_snapshots(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.fn = os.path.join(self.tmp.name, "grid.snap")
+	
+	def tearDown(self):
+		self.tmp.cleanup()
+	
+	# Randomizes a grid and steps it a few times.
+	def stepped(self, cgol, is_periodic):
+		window = headless_window()
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			cgol.randomize(seed=4)
+			cgol.inc_current()
+			
+			for i in range(5):
+				cgol.step(window, is_periodic)
+				cgol.inc_current()
+		
+		return cgol
+	
+	# Steps a grid once more.
+	def stepped_on(self, cgol, is_periodic):
+		with contextlib.redirect_stdout(io.StringIO()):
+			cgol.step(headless_window(), is_periodic)
+			cgol.inc_current()
+		
+		return cgol
+	
+	def loaded(self, cgol):
+		with contextlib.redirect_stdout(io.StringIO()):
+			return cgol.load_snapshot(self.fn)
+	
+	def test_round_trip(self):
+		for is_periodic in (True, False):
+			with self.subTest(is_periodic=is_periodic):
+				saved = self.stepped(CGOL_grid(30, 20), is_periodic)
+				
+				with contextlib.redirect_stdout(io.StringIO()):
+					saved.save_snapshot(self.fn, is_periodic)
+				
+				cgol = CGOL_grid(4, 4)
+				self.assertEqual(self.loaded(cgol), is_periodic)
+				
+				self.assertEqual((cgol.width, cgol.height, cgol.current, cgol.latest), (saved.width, saved.height, saved.current, saved.latest))
+				self.assertEqual(cgol.generations, saved.generations)
+				
+				for frame in range(cgol.depth):
+					self.assertEqual(cgol.get_columns(frame), saved.get_columns(frame))
+				
+				# The loaded grid carries on from where the saved one was.
+				self.assertEqual(live_cells(self.stepped_on(cgol, is_periodic)), live_cells(self.stepped_on(saved, is_periodic)))
+	
+	# A grid shrunk in place is saved without the room it kept, and loads as if it had never been larger.
+	def test_resized(self):
+		saved = self.stepped(CGOL_grid(30, 30), True)
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			saved.resize(-3, -12, 0, 0)
+			saved.save_snapshot(self.fn, True)
+		
+		cgol = CGOL_grid(4, 4)
+		self.loaded(cgol)
+		
+		self.assertEqual((cgol.width, cgol.height, cgol.col_bytes), (27, 18, 3))
+		self.assertEqual(live_cells(cgol), live_cells(saved))
+	
+	def test_unbounded(self):
+		saved = self.stepped(CGOL_sparse_grid(30, 20), False)
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			saved.save_snapshot(self.fn, False)
+		
+		cgol = CGOL_sparse_grid(1, 1)
+		self.loaded(cgol)
+		
+		self.assertEqual(cgol.generations, saved.generations)
+		self.assertEqual(cgol.grids, saved.grids)
+		
+		# Neither kind of grid loads the other's snapshots.
+		self.assertIsNone(self.loaded(CGOL_grid(4, 4)))
+	
+	# A snapshot that can't be loaded leaves the grid as it was.
+	def test_invalid(self):
+		saved = self.stepped(CGOL_grid(30, 20), True)
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			saved.save_snapshot(self.fn, True)
+		
+		with open(self.fn, "rb") as fin:
+			data = fin.read()
+		
+		cases = {
+			"missing": None,
+			"empty": b"",
+			"not a snapshot": b"x" * len(data),
+			"truncated": data[:-8],
+			"header only": data[:100],
+		}
+		
+		for name, contents in cases.items():
+			with self.subTest(name=name):
+				if os.path.exists(self.fn):
+					os.remove(self.fn)
+				
+				if contents is not None:
+					with open(self.fn, "wb") as fout:
+						fout.write(contents)
+				
+				cgol = self.stepped(CGOL_grid(10, 10), True)
+				before = live_cells(cgol)
+				
+				self.assertIsNone(self.loaded(cgol))
+				self.assertEqual((cgol.width, cgol.height), (10, 10))
+				self.assertEqual(live_cells(cgol), before)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,149 @@
+import contextlib
+import io
+import unittest
+
+from CGOL import CGOL_grid, headless_window
+
+# Checks the history of a grid: rewinding through it, seeking to any generation, and detecting when the board repeats.
+# Run with "python -m unittest".
+
+# A glider, and a lightweight spaceship that moves up half a row per generation, as (x, y) cells.
+GLIDER = [(1, 0), (2, 1), (0, 2), (1, 2), (2, 2)]
+LWSS = [(0, 1), (0, 4), (1, 0), (2, 0), (2, 4), (3, 0), (3, 1), (3, 2), (3, 3)]
+
+# Returns a grid of the given size holding the given cells, with room for only 8 frames of history.
+def make_grid(width, height, cells, left, top):
+	cgol = CGOL_grid(width, height, width * ((height + 7) // 8) * 8)
+	
+	for x, y in cells:
+		cgol.set(x + left, y + top, False)
+	
+	return cgol
+
+# Steps a grid n times, one step at a time, or all at once with step_n().
+def run(cgol, n, is_periodic, batch=False):
+	window = headless_window()
+	
+	with contextlib.redirect_stdout(io.StringIO()):
+		cgol.inc_current()
+		
+		if batch:
+			cgol.step_n(window, n, is_periodic)
+			cgol.inc_current()
+		
+		else:
+			for i in range(n):
+				cgol.step(window, is_periodic)
+				cgol.inc_current()
+	
+	return cgol
+
+# Rewinds a grid as far as it goes, and returns the generation of every frame on the way.
+def rewind_all(cgol):
+	generations = [cgol.get_generation()]
+	while cgol.dec_current(False):
+		generations.append(cgol.get_generation())
+	
+	return generations
+
+class test_rewind(unittest.TestCase):
+	# Rewinding a fresh grid stops at the frame it started with, however much room the ring has left.
+	def test_fresh_grid(self):
+		cgol = run(make_grid(20, 20, GLIDER, 3, 3), 5, False)
+		
+		self.assertEqual(rewind_all(cgol), [5, 4, 3, 2, 1, 0])
+	
+	def test_fresh_grid_with_long_history(self):
+		cgol = make_grid(20, 20, GLIDER, 3, 3)
+		cgol.set_long_history(1024 * 1024)
+		
+		run(cgol, 5, False)
+		
+		self.assertEqual(rewind_all(cgol), [5, 4, 3, 2, 1, 0])
+	
+	# Frames that fell out of the ring are restored from the long history, all the way back to the start, and forward again.
+	def test_long_history(self):
+		cgol = make_grid(20, 20, GLIDER, 3, 3)
+		cgol.set_long_history(1024 * 1024)
+		
+		run(cgol, 30, False)
+		columns = cgol.get_columns(cgol.current)
+		
+		self.assertEqual(rewind_all(cgol), list(range(30, -1, -1)))
+		
+		with contextlib.redirect_stdout(io.StringIO()):
+			for i in range(30):
+				cgol.inc_current(False)
+		
+		self.assertEqual(cgol.get_generation(), 30)
+		self.assertEqual(cgol.get_columns(cgol.current), columns)
+	
+	# Without a long history, only as many frames as fit in the ring can be rewound to.
+	def test_ring(self):
+		cgol = run(make_grid(20, 20, GLIDER, 3, 3), 30, False)
+		
+		self.assertEqual(rewind_all(cgol), list(range(30, 30 - cgol.depth, -1)))
+
+class test_seek(unittest.TestCase):
+	def seek(self, cgol, generation):
+		with contextlib.redirect_stdout(io.StringIO()):
+			cgol.seek(headless_window(), generation)
+			cgol.inc_current()
+		
+		return cgol
+	
+	# Going back past the ring, and forward again past the last generation, lands on the same boards as stepping there.
+	def test_seek(self):
+		cgol = run(make_grid(40, 40, LWSS, 10, 30), 200, True)
+		
+		for generation in (130, 70, 64, 0, 260):
+			with self.subTest(generation=generation):
+				stepped = run(make_grid(40, 40, LWSS, 10, 30), generation, True)
+				
+				self.seek(cgol, generation)
+				
+				self.assertEqual(cgol.get_generation(), generation)
+				self.assertEqual(cgol.get_columns(cgol.current), stepped.get_columns(stepped.current))
+	
+	# An edit starts a new run, and seeking follows it rather than the boards from before.
+	def test_seek_after_edit(self):
+		cgol = run(make_grid(40, 40, LWSS, 10, 30), 100, True)
+		
+		self.seek(cgol, 50)
+		cgol.flip(0, 0)
+		run(cgol, 30, True)
+		
+		self.seek(cgol, 65)
+		
+		edited = run(make_grid(40, 40, LWSS, 10, 30), 50, True)
+		edited.flip(0, 0)
+		run(edited, 15, True)
+		
+		self.assertEqual(cgol.get_columns(cgol.current), edited.get_columns(edited.current))
+
+class test_cycles(unittest.TestCase):
+	# The spaceship never repeats, but boards shifted by 61 rows used to have the same hash.
+	def test_moving_spaceship(self):
+		single = run(make_grid(16, 400, LWSS, 6, 380), 600, False)
+		batch = run(make_grid(16, 400, LWSS, 6, 380), 600, False, True)
+		
+		self.assertIsNone(single.cycles.cycle)
+		self.assertIsNone(batch.cycles.cycle)
+		
+		self.assertEqual(batch.get_generation(), 600)
+		self.assertEqual(batch.bounding_box(), (6, 80, 10, 85))
+		self.assertEqual(batch.get_columns(batch.current), single.get_columns(single.current))
+	
+	# A glider crosses a 16x16 torus in 64 generations. That's longer than the ring, so the repeat is checked against a checkpoint before periods are skipped.
+	def test_glider_on_torus(self):
+		single = run(make_grid(16, 16, GLIDER, 3, 3), 1000, True)
+		batch = run(make_grid(16, 16, GLIDER, 3, 3), 1000, True, True)
+		
+		self.assertEqual(single.cycles.cycle, (0, 64))
+		self.assertTrue(batch.cycles.checked)
+		
+		self.assertEqual(batch.get_generation(), 1000)
+		self.assertEqual(batch.get_columns(batch.current), single.get_columns(single.current))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,164 @@
+import os
+import tempfile
+import unittest
+
+import CGOL_Patterns
+
+# Checks reading and writing pattern files, and the pattern library.
+# Run with "python -m unittest".
+
+# A glider, as the live cells of each row.
+GLIDER = [(0, [1]), (1, [2]), (2, [0, 1, 2])]
+
+# Returns the live cells of a pattern as a set of (x, y).
+def live_cells(pattern):
+	return {(x, y) for x, column in enumerate(pattern) for y, cell in enumerate(column) if cell}
+
+# Cells spread over several 8x8 blocks, with empty rows and columns between them, and one touching each edge of the box.
+SCATTERED = [(0, [3]), (1, [0, 1, 2, 9, 10]), (4, [20]), (9, [5, 6, 7, 8, 9, 10, 11, 12]), (17, [0, 17])]
+
+class test_formats(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+	
+	def tearDown(self):
+		self.tmp.cleanup()
+	
+	# Writes a file with the given contents and returns its path.
+	def file(self, name, contents):
+		path = os.path.join(self.tmp.name, name)
+		with open(path, "wb") as fout:
+			fout.write(contents)
+		
+		return path
+	
+	# Every format reads back the cells it was given. Formats without a size start the pattern at the top left live cell, which SCATTERED already does.
+	def test_round_trip(self):
+		expected = {(x, y) for y, xs in SCATTERED for x in xs}
+		
+		for ext in CGOL_Patterns.EXTENSIONS:
+			with self.subTest(ext=ext):
+				path = os.path.join(self.tmp.name, "scattered" + ext)
+				CGOL_Patterns.write(path, 21, 18, SCATTERED)
+				
+				pattern = CGOL_Patterns.read(path)
+				
+				self.assertEqual(live_cells(pattern), expected)
+				self.assertEqual((len(pattern), len(pattern[0])), (21, 18))
+	
+	# The formats with a size keep the dead space around the cells.
+	def test_round_trip_size(self):
+		for ext in (".pat", ".rle"):
+			with self.subTest(ext=ext):
+				path = os.path.join(self.tmp.name, "glider" + ext)
+				CGOL_Patterns.write(path, 10, 8, GLIDER)
+				
+				pattern = CGOL_Patterns.read(path)
+				self.assertEqual((len(pattern), len(pattern[0])), (10, 8))
+	
+	def test_rle(self):
+		# Comments before the header, a run of blank rows, and a count split from its tag by a line break.
+		path = self.file("test.rle", b"#N test\n#C a comment\nx = 4, y = 4, rule = B3/S23\n4o2$b2\no!\n")
+		
+		self.assertEqual(live_cells(CGOL_Patterns.read(path)), {(0, 0), (1, 0), (2, 0), (3, 0), (1, 2), (2, 2)})
+	
+	def test_rle_line_length(self):
+		path = os.path.join(self.tmp.name, "wide.rle")
+		CGOL_Patterns.write(path, 200, 1, [(0, list(range(0, 200, 2)))])
+		
+		with open(path) as fin:
+			self.assertTrue(all(len(line.rstrip("\n")) <= CGOL_Patterns.RLE_LINE_LENGTH for line in fin))
+		
+		self.assertEqual(live_cells(CGOL_Patterns.read(path)), {(x, 0) for x in range(0, 200, 2)})
+	
+	# Life 1.06 coordinates may be negative, and the pattern is moved to start at (0, 0).
+	def test_life(self):
+		path = self.file("test.lif", b"#Life 1.06\n-1 -1\n0 -1\n1 1\n")
+		
+		self.assertEqual(live_cells(CGOL_Patterns.read(path)), {(0, 0), (1, 0), (2, 2)})
+	
+	def test_macrocell(self):
+		# Two copies of the same leaf, at the top left and bottom right of a 16x16 node.
+		path = self.file("test.mc", b"[M2] (test)\n#R B3/S23\n.*$..*$***$\n4 1 0 0 1\n")
+		
+		glider = {(1, 0), (2, 1), (0, 2), (1, 2), (2, 2)}
+		self.assertEqual(live_cells(CGOL_Patterns.read(path)), glider | {(x + 8, y + 8) for x, y in glider})
+	
+	# Files with another extension are recognized by their first line.
+	def test_format_from_contents(self):
+		cases = {
+			"life.txt": b"#Life 1.06\n0 0\n1 0\n",
+			"rle.txt": b"x = 2, y = 1\n2o!\n",
+			"macrocell.txt": b"[M2]\n**$\n",
+			"pat.txt": b"2 1 11",
+		}
+		
+		for name, contents in cases.items():
+			with self.subTest(name=name):
+				self.assertEqual(live_cells(CGOL_Patterns.read(self.file(name, contents))), {(0, 0), (1, 0)})
+	
+	def test_invalid(self):
+		cases = {
+			"short.pat": b"3 3 010001",
+			"empty.lif": b"#Life 1.06\n",
+			"outside.rle": b"x = 2, y = 2\n3o!\n",
+			"headerless.rle": b"#C nothing else\n",
+			"empty.mc": b"[M2]\n",
+		}
+		
+		for name, contents in cases.items():
+			with self.subTest(name=name):
+				with self.assertRaises(ValueError):
+					CGOL_Patterns.read(self.file(name, contents))
+
+class test_library(unittest.TestCase):
+	def setUp(self):
+		self.cwd = os.getcwd()
+		self.tmp = tempfile.TemporaryDirectory()
+		
+		# A library directory, and a separate working directory.
+		self.dn = os.path.join(self.tmp.name, "library")
+		self.work = os.path.join(self.tmp.name, "work")
+		os.makedirs(os.path.join(self.dn, "Ships"))
+		os.makedirs(self.work)
+		
+		CGOL_Patterns.write(os.path.join(self.dn, "Ships", "glider.pat"), 3, 3, GLIDER)
+		CGOL_Patterns.write(os.path.join(self.dn, "block.pat"), 2, 2, [(0, [0, 1]), (1, [0, 1])])
+		
+		os.chdir(self.work)
+	
+	def tearDown(self):
+		os.chdir(self.cwd)
+		self.tmp.cleanup()
+	
+	def test_library_path(self):
+		library = CGOL_Patterns.pattern_library(self.dn)
+		
+		self.assertEqual(live_cells(library.load(os.path.join("Ships", "glider.pat"))), {(1, 0), (2, 1), (0, 2), (1, 2), (2, 2)})
+	
+	def test_working_directory_first(self):
+		library = CGOL_Patterns.pattern_library(self.dn)
+		
+		# A file of the same name in the working directory is the one that's meant.
+		CGOL_Patterns.write("block.pat", 3, 1, [(0, [0, 1, 2])])
+		self.assertEqual(live_cells(library.load("block.pat")), {(0, 0), (1, 0), (2, 0)})
+		
+		os.remove("block.pat")
+		self.assertEqual(live_cells(library.load("block.pat")), {(0, 0), (1, 0), (0, 1), (1, 1)})
+	
+	def test_absolute_path(self):
+		library = CGOL_Patterns.pattern_library(self.dn)
+		
+		path = os.path.join(self.tmp.name, "line.pat")
+		CGOL_Patterns.write(path, 1, 3, [(0, [0]), (1, [0]), (2, [0])])
+		
+		self.assertEqual(live_cells(library.load(path)), {(0, 0), (0, 1), (0, 2)})
+	
+	def test_missing(self):
+		library = CGOL_Patterns.pattern_library(self.dn)
+		
+		with self.assertRaises(OSError):
+			library.load("nothing.pat")
+
+if __name__ == "__main__":
+	unittest.main()